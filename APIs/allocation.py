@@ -0,0 +1,198 @@
+# allocation.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from nse_csv import CHANGE_365D, LTP, SYMBOL, normalize_market_watch, require_columns
+from response_formats import RECORDS, frame_to_columnar
+
+ONE_YEAR_CHANGE_COL = CHANGE_365D
+
+
+def round2(values: np.ndarray) -> np.ndarray:
+    """
+    Python's round(x, 2) on every element. np.round scales by 100 first and
+    can disagree on ties (e.g. 1.005), and the API output must not change.
+    """
+    return np.array([round(v, 2) for v in values.tolist()], dtype=float)
+
+
+def _next_affordable(ltp: np.ndarray, start: int, cash: float) -> int:
+    """Index of the first ltp[j] <= cash with j >= start, or -1."""
+    if start >= len(ltp):
+        return -1
+    hits = np.flatnonzero(ltp[start:] <= cash)
+    return start + int(hits[0]) if len(hits) else -1
+
+
+def allocate_equal_budget(
+    ltp: np.ndarray,
+    total_capital: float,
+    no_of_stocks: int,
+    ranked_order: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """
+    Three-pass allocation on arrays (all ltp > 0).
+
+    ltp          : prices, in portfolio row order
+    ranked_order : row positions in ranking order, used by passes 2 and 3
+
+    PASS 1: floor(investment_per_stock / LTP) shares each.
+    PASS 2: in rank order, 1 share for every zero-quantity stock we can afford.
+    PASS 3: in rank order, spend the leftover on as many shares as fit,
+            repeated until a full sweep buys nothing.
+
+    Returns (quantity, invested_amount, free_cash). Cash is updated with the
+    same sequence of float operations as the original row-by-row loops, so
+    results match them exactly.
+    """
+    ltp = np.asarray(ltp, dtype=float)
+    investment_per_stock = total_capital // no_of_stocks
+
+    # ---------- PASS 1: equal-budget buy ----------
+    qty = np.floor_divide(investment_per_stock, ltp).astype(np.int64)
+    invested = round2(qty * ltp)
+    free_cash = float(total_capital - float(invested.sum()))
+
+    ranked_ltp = ltp[ranked_order]
+
+    # ---------- PASS 2: at least 1 share where affordable ----------
+    zero = np.flatnonzero(qty[ranked_order] == 0)
+    if len(zero):
+        costs = ranked_ltp[zero]
+        start = _next_affordable(costs, 0, free_cash)
+        while start >= 0:
+            # running cash after buying each remaining candidate in turn
+            remaining = np.subtract.accumulate(
+                np.concatenate(([free_cash], costs[start:]))
+            )
+            short = np.flatnonzero(remaining[1:] < 0)
+            stop = start + (int(short[0]) if len(short) else len(costs) - start)
+            bought = ranked_order[zero[start:stop]]
+            qty[bought] += 1
+            invested[bought] += ltp[bought]
+            free_cash = float(remaining[stop - start])
+            # skip the one we could not afford and everything else too dear
+            start = _next_affordable(costs, stop + 1, free_cash)
+
+    # ---------- PASS 3: greedy leftover spend ----------
+    while True:
+        bought_any = False
+        pos = _next_affordable(ranked_ltp, 0, free_cash)
+        while pos >= 0:
+            price = float(ranked_ltp[pos])
+            extra_qty = int(free_cash // price)
+            if extra_qty > 0:
+                i = ranked_order[pos]
+                qty[i] += extra_qty
+                invested[i] += extra_qty * price
+                free_cash -= extra_qty * price
+                bought_any = True
+                if free_cash <= 0:
+                    break
+            pos = _next_affordable(ranked_ltp, pos + 1, free_cash)
+        if not bought_any:
+            break
+
+    return qty, invested, free_cash
+
+
+# ---------- Portfolio construction on a ranked index ----------
+def rank_index_by_one_year_return(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalise a market-watch frame (see nse_csv) and return all rows sorted
+    by 365 D % CHNG, best first. Independent of N and capital,
+    so one ranking can serve many scenarios.
+    """
+    df = normalize_market_watch(df)
+    require_columns(df, [SYMBOL, LTP, ONE_YEAR_CHANGE_COL])
+
+    # Rank by 1‑year return
+    return df.sort_values(by=ONE_YEAR_CHANGE_COL, ascending=False)
+
+
+def build_portfolio_from_ranked(
+    ranked: pd.DataFrame,
+    total_capital: float,
+    no_of_stocks: int,
+    purchase_date: Optional[str] = None,
+    layout: str = RECORDS,
+) -> Dict[str, Any]:
+    """
+    Top-N portfolio from rank_index_by_one_year_return output (not mutated).
+    layout "columnar" returns the portfolio as response_formats columns.
+    """
+    change_col = ONE_YEAR_CHANGE_COL
+    if purchase_date is None:
+        purchase_date = datetime.today().strftime("%Y-%m-%d")
+
+    df = ranked.head(no_of_stocks)
+
+    # Filter out rows without valid price
+    df = df[pd.notna(df["LTP"]) & (df["LTP"] > 0)].reset_index(drop=True)
+    if df.empty:
+        raise RuntimeError("No valid prices found to build portfolio")
+
+    # Ranking order for passes 2 and 3 (same sort call as the row-wise version,
+    # so ties land in the same order)
+    ranked_order = df.sort_values(by=change_col, ascending=False).index.to_numpy()
+
+    ltp = df["LTP"].to_numpy(dtype=float)
+    qty, invested, free_cash = allocate_equal_budget(
+        ltp, total_capital, no_of_stocks, ranked_order
+    )
+
+    change = df[change_col].to_numpy(dtype=float)
+    portfolio_df = pd.DataFrame(
+        {
+            "SYMBOL": df["SYMBOL"].to_numpy(),
+            "LTP": round2(ltp),
+            "QUANTITY": qty,
+            "INVESTED_AMOUNT": invested,
+            "ONE_YEAR_RETURN_PCT": round2(np.where(np.isnan(change), 0.0, change)),
+            "DATE_OF_PURCHASE": purchase_date,
+        }
+    )
+
+    portfolio_df["INVESTED_AMOUNT"] = portfolio_df["INVESTED_AMOUNT"].round(2)
+
+    portfolio_df = portfolio_df.sort_values(
+        by="ONE_YEAR_RETURN_PCT", ascending=False
+    ).reset_index(drop=True)
+
+    return {
+        "portfolio": (
+            portfolio_df.to_dict(orient="records")
+            if layout == RECORDS
+            else frame_to_columnar(portfolio_df)
+        ),
+        "total_invested": float(portfolio_df["INVESTED_AMOUNT"].sum()),
+        "free_cash": float(free_cash),
+    }
+
+
+def evaluate_scenarios(
+    ranked: pd.DataFrame,
+    scenarios: Sequence[Tuple[int, float]],
+    purchase_date: Optional[str] = None,
+    layout: str = RECORDS,
+) -> List[Dict[str, Any]]:
+    """
+    Run build_portfolio_from_ranked for every (no_of_stocks, total_capital)
+    against one ranked index. Top-level so it can run in a process pool.
+    A failing scenario is reported inline instead of failing the batch.
+    """
+    if purchase_date is None:
+        purchase_date = datetime.today().strftime("%Y-%m-%d")
+    results = []
+    for no_of_stocks, total_capital in scenarios:
+        try:
+            res = build_portfolio_from_ranked(
+                ranked, total_capital, no_of_stocks, purchase_date, layout
+            )
+            results.append({"success": True, **res})
+        except Exception as e:
+            results.append({"success": False, "detail": str(e)})
+    return results
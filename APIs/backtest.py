@@ -0,0 +1,348 @@
+# backtest.py
+"""
+Replay the portfolio strategies over the snapshot archive.
+
+A run starts like initialize_portfolio_from_index, taking the top N by
+365 D % CHNG and running the three-pass equal-budget allocation. Every
+`rebalance_days` it then repeats run_update_portfolio_logic: keep what is
+still in the top N by 30 D %CHNG, sell the rest, and split the cash over
+the new entries. With lookback_days > 0 both steps rank instead by
+price momentum over that many calendar days, computed from the archived
+LTPs.
+
+The archive is pivoted once into (dates x symbols) arrays. Signals for
+every date come from array ops. Between rebalances the equity curve is
+one matrix-vector product, so the per-config Python work is one small step
+per rebalance. Sweeps are spread over a process pool, and each worker
+receives the panel only once.
+
+    python backtest.py --index "NIFTY 50" --n 10,20,30 --capital 100000,1000000 \\
+        --lookback 0,90,180,365 --workers 4 --out sweep.csv
+
+Sold positions are valued at that day's LTP (the live job uses the
+holding's stored current_price, which mark_to_market keeps close).
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from allocation import allocate_equal_budget
+from nse_csv import CHANGE_30D, CHANGE_365D, LTP, SYMBOL
+from snapshot_archive import SOURCE_NSE, SOURCES, load_panel
+
+TRADING_DAYS_PER_YEAR = 252
+SWEEP_CHUNK_SIZE = 50
+
+# (no_of_stocks, total_capital, lookback_days, rebalance_days)
+Config = Tuple[int, float, int, int]
+
+
+# ---------- panel ----------
+class Panel:
+    """Archived snapshots of one index as aligned (dates x symbols) arrays."""
+
+    def __init__(self, long_df: pd.DataFrame):
+        if long_df.empty:
+            raise RuntimeError("No archived snapshots in the requested range")
+        df = long_df.drop_duplicates(subset=["DATE", SYMBOL], keep="last")
+        price = df.pivot(index="DATE", columns=SYMBOL, values=LTP).sort_index()
+
+        self.dates = price.index.to_numpy(dtype="datetime64[D]")
+        self.symbols = price.columns.to_numpy()
+        raw = price.to_numpy(dtype=float)
+        # in that day's snapshot at all (even with no usable price), as the
+        # live code ranks every row of the CSV
+        self.listed = (
+            df.assign(_row=1.0)
+            .pivot(index="DATE", columns=SYMBOL, values="_row")
+            .reindex(index=price.index, columns=price.columns)
+            .notna()
+            .to_numpy()
+        )
+        valid = np.isfinite(raw) & (raw > 0)
+        # last usable price, for valuing positions on days a symbol is missing
+        self.price = price.where(valid).ffill().to_numpy(dtype=float)
+        self.raw_price = np.where(valid, raw, np.nan)
+
+        def column(name):
+            if name not in df.columns:
+                return np.full(raw.shape, np.nan)
+            wide = df.pivot(index="DATE", columns=SYMBOL, values=name)
+            return wide.reindex(index=price.index, columns=price.columns).to_numpy(dtype=float)
+
+        self.chg30 = column(CHANGE_30D)
+        self.chg365 = column(CHANGE_365D)
+        self._momentum: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_archive(
+        cls, index_symbol: str, start=None, end=None, root: Optional[str] = None, source: str = SOURCE_NSE
+    ):
+        kwargs = {"root": root} if root else {}
+        return cls(load_panel(index_symbol, start, end, source=source, **kwargs))
+
+    def momentum(self, lookback_days: int) -> np.ndarray:
+        """Price change (%) over `lookback_days` calendar days, for every date at once."""
+        if lookback_days not in self._momentum:
+            target = self.dates - np.timedelta64(lookback_days, "D")
+            past = np.searchsorted(self.dates, target, side="right") - 1
+            base = self.price[np.clip(past, 0, None)]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mom = (self.price / base - 1.0) * 100.0
+            mom[past < 0] = np.nan
+            self._momentum[lookback_days] = mom
+        return self._momentum[lookback_days]
+
+    def signals(self, lookback_days: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(signal used to initialise, signal used to rebalance)."""
+        if lookback_days > 0:
+            mom = self.momentum(lookback_days)
+            return mom, mom
+        return self.chg365, self.chg30
+
+
+def _ranked(signal_t: np.ndarray, listed_t: np.ndarray) -> np.ndarray:
+    """Listed symbols by signal, best first, NaN last (like sort_values)."""
+    listed = np.flatnonzero(listed_t)
+    key = signal_t[listed]
+    order = np.argsort(np.where(np.isnan(key), np.inf, -key), kind="stable")
+    return listed[order]
+
+
+# ---------- strategy steps (same rules as the live code) ----------
+def initial_positions(
+    price_t: np.ndarray,
+    signal_t: np.ndarray,
+    listed_t: np.ndarray,
+    no_of_stocks: int,
+    total_capital: float,
+) -> Tuple[np.ndarray, np.ndarray, float]:
+    """build_portfolio_from_ranked on one date: (symbol idx, qty, free cash)."""
+    top = _ranked(signal_t, listed_t)[:no_of_stocks]
+    # rows without a valid price are dropped after the cut, as in the live code
+    top = top[np.isfinite(price_t[top]) & (price_t[top] > 0)]
+    if len(top) == 0:
+        raise RuntimeError("No valid prices found to build portfolio")
+    qty, _, free_cash = allocate_equal_budget(
+        price_t[top], total_capital, no_of_stocks, np.arange(len(top))
+    )
+    held = qty > 0
+    return top[held], qty[held].astype(np.int64), float(free_cash)
+
+
+def rebalance_positions(
+    price_t: np.ndarray,
+    signal_t: np.ndarray,
+    listed_t: np.ndarray,
+    held: np.ndarray,
+    qty: np.ndarray,
+    free_cash: float,
+    no_of_stocks: int,
+    last_price_t: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, float, int]:
+    """
+    run_update_portfolio_logic on one date: (symbol idx, qty, free cash, trades).
+    Buys use price_t; sells use last_price_t (last known price) when given,
+    since a holding may have dropped out of today's snapshot.
+    """
+    new_top = _ranked(signal_t, listed_t)[:no_of_stocks]
+    keep = np.isin(held, new_top)
+    sold = ~keep
+
+    sell_price = price_t if last_price_t is None else last_price_t
+    free_cash += float((qty[sold] * sell_price[held[sold]]).sum())
+
+    entries = new_top[~np.isin(new_top, held)]
+    bought_idx = np.empty(0, dtype=held.dtype)
+    bought_qty = np.empty(0, dtype=np.int64)
+    if len(entries):
+        cash_per_new = free_cash // len(entries)
+        ltp = price_t[entries]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ok = (ltp > 0) & (ltp <= cash_per_new)
+            buy = np.where(ok, np.floor_divide(cash_per_new, ltp), 0)
+        ok &= buy > 0
+        bought_idx = entries[ok]
+        bought_qty = buy[ok].astype(np.int64)
+        invested = bought_qty * ltp[ok]
+        free_cash = float(np.subtract.accumulate(np.concatenate(([free_cash], invested)))[-1])
+
+    # kept in new-ranking order, then buys, like the live frame
+    kept_idx = held[keep]
+    kept_qty = qty[keep]
+    rank_pos = {s: i for i, s in enumerate(new_top.tolist())}
+    order = np.argsort([rank_pos[s] for s in kept_idx.tolist()], kind="stable")
+    held = np.concatenate((kept_idx[order], bought_idx))
+    qty = np.concatenate((kept_qty[order], bought_qty))
+    return held, qty, free_cash, int(sold.sum() + len(bought_idx))
+
+
+# ---------- one configuration ----------
+def rebalance_dates(dates: np.ndarray, every_days: int) -> List[int]:
+    """Row positions of the first snapshot on/after each `every_days` step."""
+    out = [0]
+    step = np.timedelta64(every_days, "D")
+    while True:
+        nxt = int(np.searchsorted(dates, dates[out[-1]] + step, side="left"))
+        if nxt >= len(dates):
+            return out
+        out.append(nxt)
+
+
+def run_backtest(panel: Panel, config: Config) -> Dict[str, Any]:
+    no_of_stocks, total_capital, lookback_days, every_days = config
+    init_signal, rebal_signal = panel.signals(lookback_days)
+    steps = rebalance_dates(panel.dates, every_days)
+
+    held, qty, cash = initial_positions(
+        panel.raw_price[0], init_signal[0], panel.listed[0], no_of_stocks, total_capital
+    )
+    equity = np.empty(len(panel.dates))
+    trades = len(held)
+    bounds = steps + [len(panel.dates)]
+    for k, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if k > 0:
+            held, qty, cash, n = rebalance_positions(
+                panel.raw_price[lo], rebal_signal[lo], panel.listed[lo],
+                held, qty, cash, no_of_stocks, last_price_t=panel.price[lo],
+            )
+            trades += n
+        # value of the book on every date until the next rebalance
+        equity[lo:hi] = cash + panel.price[lo:hi][:, held] @ qty
+
+    return {
+        "no_of_stocks": no_of_stocks,
+        "total_capital": total_capital,
+        "lookback_days": lookback_days,
+        "rebalance_days": every_days,
+        "rebalances": len(steps) - 1,
+        "trades": trades,
+        **performance(panel.dates, equity, total_capital),
+    }
+
+
+def performance(dates: np.ndarray, equity: np.ndarray, total_capital: float) -> Dict[str, float]:
+    years = max((dates[-1] - dates[0]).astype(int) / 365.25, 1e-9)
+    final = float(equity[-1])
+    returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(1)
+    periods_per_year = min(len(equity) / years, TRADING_DAYS_PER_YEAR)
+    vol = float(returns.std(ddof=0) * np.sqrt(periods_per_year)) if len(returns) else 0.0
+    mean = float(returns.mean() * periods_per_year) if len(returns) else 0.0
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    return {
+        "final_value": round(final, 2),
+        "total_return_pct": round((final / total_capital - 1) * 100, 4),
+        "cagr_pct": round(((final / total_capital) ** (1 / years) - 1) * 100, 4)
+        if final > 0 else -100.0,
+        "max_drawdown_pct": round(float(drawdown.min()) * 100, 4),
+        "volatility_pct": round(vol * 100, 4),
+        "sharpe": round(mean / vol, 4) if vol > 0 else 0.0,
+    }
+
+
+# ---------- sweeps ----------
+_worker_panel: Optional[Panel] = None
+
+
+def _init_worker(panel: Panel) -> None:
+    global _worker_panel
+    _worker_panel = panel
+
+
+def run_chunk(configs: List[Config], panel: Optional[Panel] = None) -> List[Dict[str, Any]]:
+    """Top-level so it can run in a process pool; failures are reported inline."""
+    panel = panel or _worker_panel
+    out = []
+    for config in configs:
+        try:
+            out.append(run_backtest(panel, config))
+        except Exception as e:
+            n, capital, lookback, every = config
+            out.append({
+                "no_of_stocks": n, "total_capital": capital,
+                "lookback_days": lookback, "rebalance_days": every, "error": str(e),
+            })
+    return out
+
+
+def make_grid(
+    no_of_stocks: Iterable[int],
+    capitals: Iterable[float],
+    lookbacks: Iterable[int] = (0,),
+    rebalance_days: Iterable[int] = (30,),
+) -> List[Config]:
+    return [
+        (int(n), float(c), int(lb), int(rd))
+        for n, c, lb, rd in itertools.product(no_of_stocks, capitals, lookbacks, rebalance_days)
+    ]
+
+
+def run_sweep(
+    panel: Panel,
+    configs: Sequence[Config],
+    workers: int = 0,
+    chunk_size: int = SWEEP_CHUNK_SIZE,
+) -> pd.DataFrame:
+    """Every config against one panel; results in config order."""
+    chunks = [list(configs[i:i + chunk_size]) for i in range(0, len(configs), chunk_size)]
+    if workers > 0 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(panel,)
+        ) as pool:
+            results = list(pool.map(run_chunk, chunks))
+    else:
+        results = [run_chunk(c, panel) for c in chunks]
+    return pd.DataFrame([r for chunk in results for r in chunk])
+
+
+def _ints(text: str) -> List[int]:
+    return [int(float(x)) for x in text.split(",") if x.strip()]
+
+
+def _floats(text: str) -> List[float]:
+    return [float(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest top-N momentum portfolios on archived snapshots.")
+    parser.add_argument("--index", required=True, help='index symbol, e.g. "NIFTY 50"')
+    parser.add_argument("--start", help="first date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last date (YYYY-MM-DD)")
+    parser.add_argument("--source", choices=SOURCES, default=SOURCE_NSE,
+                        help="archived snapshots to replay: NSE market watch or indices.url downloads")
+    parser.add_argument("--n", default="10", help="comma-separated portfolio sizes")
+    parser.add_argument("--capital", default="100000", help="comma-separated starting capitals")
+    parser.add_argument("--lookback", default="0",
+                        help="comma-separated momentum lookbacks in days (0 = NSE 365D/30D columns)")
+    parser.add_argument("--rebalance-days", default="30", help="comma-separated rebalance intervals")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="process pool size (0 = in-process)")
+    parser.add_argument("--out", help="write all results to this CSV")
+    args = parser.parse_args()
+
+    panel = Panel.from_archive(args.index, args.start, args.end, source=args.source)
+    configs = make_grid(_ints(args.n), _floats(args.capital), _ints(args.lookback), _ints(args.rebalance_days))
+
+    started = time.perf_counter()
+    results = run_sweep(panel, configs, workers=args.workers)
+    elapsed = time.perf_counter() - started
+
+    if args.out:
+        results.to_csv(args.out, index=False)
+    ok = results[results["error"].isna()] if "error" in results else results
+    print(ok.sort_values("cagr_pct", ascending=False).head(10).to_string(index=False))
+    print(
+        f"dates={len(panel.dates)} symbols={len(panel.symbols)} configs={len(configs)} "
+        f"failed={len(results) - len(ok)} time={elapsed:.2f}s "
+        f"({len(configs) / elapsed:.1f} configs/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
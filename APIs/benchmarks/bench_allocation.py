@@ -0,0 +1,57 @@
+# bench_allocation.py
+"""
+Vectorized initialize_portfolio_from_index vs the row-by-row original.
+The reference is timed on a raw pd.read_csv frame (it cleans strings itself);
+the new code on the typed frame the snapshot store now holds.
+
+    cd APIs && python -m benchmarks.bench_allocation
+"""
+import io
+import time
+
+import pandas as pd
+
+from nse_csv import read_market_watch
+from portfolio_api import initialize_portfolio_from_index
+from benchmarks.reference_impl import initialize_portfolio_from_index_reference
+from benchmarks.synthetic import make_market_watch_csv
+
+SIZES = (50, 500, 5000)
+CAPITALS = (100_000.0, 1_000_000.0, 50_000_000.0)
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    print(f"{'rows':>6} {'N':>6} {'capital':>12} {'reference s':>12} {'vector s':>10} {'speedup':>8}")
+    for n in SIZES:
+        text = make_market_watch_csv(n, seed=n)
+        raw = pd.read_csv(io.StringIO(text))        # what the old code was given
+        parsed = read_market_watch(text.encode())     # what the API now caches
+        for capital in CAPITALS:
+            no_of_stocks = n
+            old = initialize_portfolio_from_index_reference(raw.copy(), capital, no_of_stocks)
+            new = initialize_portfolio_from_index(parsed, capital, no_of_stocks)
+            assert old == new, f"output differs for rows={n} capital={capital}"
+
+            repeat = 3 if n <= 500 else 1
+            t_old = _best_of(
+                lambda: initialize_portfolio_from_index_reference(raw.copy(), capital, no_of_stocks),
+                repeat,
+            )
+            t_new = _best_of(
+                lambda: initialize_portfolio_from_index(parsed, capital, no_of_stocks),
+                repeat * 5,
+            )
+            print(f"{n:>6} {no_of_stocks:>6} {capital:>12,.0f} {t_old:>12.4f} {t_new:>10.4f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# bench_backtest.py
+"""
+Backtester on a synthetic snapshot archive (3 years of daily snapshots).
+
+Checks that the array versions of the initialise and rebalance steps give
+the same holdings and cash as build_portfolio_from_ranked and
+run_update_portfolio_logic on random dates, then times a parameter sweep
+in-process and across a process pool.
+
+    cd APIs && python -m benchmarks.bench_backtest
+"""
+import math
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from allocation import build_portfolio_from_ranked, rank_index_by_one_year_return
+from backtest import Panel, initial_positions, make_grid, rebalance_positions, run_sweep
+from nse_csv import CHANGE_30D, CHANGE_365D, LTP, SYMBOL
+from rebalance_api import run_update_portfolio_logic
+from snapshot_archive import SOURCE_NSE, archive_snapshot
+
+UNIVERSE = 80
+MEMBERS = 50
+YEARS = 3
+CHECKS = 100
+
+
+def write_synthetic_archive(root: str, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2022-01-03", periods=252 * YEARS)
+    log_ret = rng.normal(0.0004, 0.02, size=(len(dates), UNIVERSE))
+    prices = 100 * np.exp(np.cumsum(log_ret, axis=0))
+    symbols = np.array([f"SYM{i:03d}" for i in range(UNIVERSE)])
+    members = rng.choice(UNIVERSE, MEMBERS, replace=False)
+
+    for t, d in enumerate(dates):
+        if t % 20 == 0:  # occasional index reshuffle
+            out = rng.choice(members)
+            members = np.append(members[members != out], rng.choice(np.setdiff1d(np.arange(UNIVERSE), members)))
+        p = prices[t, members]
+        p30 = prices[max(t - 21, 0), members]
+        p365 = prices[max(t - 252, 0), members]
+        df = pd.DataFrame({
+            SYMBOL: symbols[members],
+            LTP: np.round(p, 2),
+            # unrounded, so rankings have no ties (pandas' descending sort
+            # does not promise an order for those)
+            CHANGE_30D: (p / p30 - 1) * 100,
+            CHANGE_365D: (p / p365 - 1) * 100,
+        })
+        if rng.random() < 0.05:  # the odd missing price, as "-" in the CSV
+            df.loc[rng.integers(len(df)), LTP] = np.nan
+        archive_snapshot("SYNTH", df, SOURCE_NSE, as_of=d.date(), root=root)
+    return "SYNTH"
+
+
+def _snapshot(panel: Panel, t: int) -> pd.DataFrame:
+    cols = np.flatnonzero(panel.listed[t])
+    return pd.DataFrame({
+        SYMBOL: panel.symbols[cols],
+        LTP: panel.raw_price[t, cols],
+        CHANGE_30D: panel.chg30[t, cols],
+        CHANGE_365D: panel.chg365[t, cols],
+    })
+
+
+def check_against_live(panel: Panel, checks: int) -> None:
+    rng = random.Random(15)
+    for case in range(checks):
+        t0 = rng.randrange(0, len(panel.dates) - 30)
+        t1 = t0 + rng.randrange(1, 30)
+        n = rng.randint(1, MEMBERS)
+        capital = rng.choice((50_000.0, 100_000.0, 1_000_000.0))
+
+        live = build_portfolio_from_ranked(
+            rank_index_by_one_year_return(_snapshot(panel, t0)), capital, n
+        )
+        held, qty, cash = initial_positions(
+            panel.raw_price[t0], panel.chg365[t0], panel.listed[t0], n, capital
+        )
+        live_qty = {r["SYMBOL"]: r["QUANTITY"] for r in live["portfolio"] if r["QUANTITY"] > 0}
+        assert live_qty == dict(zip(panel.symbols[held], qty.tolist())), f"init case {case}"
+        assert math.isclose(live["free_cash"], cash, abs_tol=1e-6), f"init cash case {case}"
+
+        holdings = pd.DataFrame({
+            "SYMBOL": panel.symbols[held],
+            "LTP": panel.price[t1, held],
+            "QUANTITY": qty,
+            "INVESTED AMOUNT": qty * panel.raw_price[t0, held],
+            "DATE OF PURCHASE": "2024-01-01",
+        })
+        res = run_update_portfolio_logic(_snapshot(panel, t1), holdings, n, cash)
+        held2, qty2, cash2, _ = rebalance_positions(
+            panel.raw_price[t1], panel.chg30[t1], panel.listed[t1],
+            held, qty, cash, n, last_price_t=panel.price[t1],
+        )
+        live_df = res["portfolio_df"]
+        assert list(live_df["SYMBOL"]) == list(panel.symbols[held2]), f"rebalance case {case}"
+        assert list(live_df["QUANTITY"]) == qty2.tolist(), f"rebalance qty case {case}"
+        assert math.isclose(res["free_cash"], cash2, rel_tol=1e-12, abs_tol=1e-6), f"rebalance cash case {case}"
+    print(f"{checks} random dates: initialise/rebalance match the live code")
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="archive_")
+    t0 = time.perf_counter()
+    index_symbol = write_synthetic_archive(root)
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    panel = Panel.from_archive(index_symbol, root=root)
+    t_load = time.perf_counter() - t0
+    print(f"archive: {len(panel.dates)} snapshots written in {t_write:.2f}s, "
+          f"loaded + pivoted in {t_load:.2f}s")
+
+    check_against_live(panel, CHECKS)
+
+    configs = make_grid(
+        no_of_stocks=range(5, 45, 2),
+        capitals=(100_000, 500_000, 1_000_000, 5_000_000, 10_000_000),
+        lookbacks=(0, 30, 90, 180, 365),
+        rebalance_days=(30, 90),
+    )
+    workers = os.cpu_count() or 1
+    print(f"{'mode':>10} {'configs':>8} {'seconds':>8} {'configs/s':>10}")
+    for label, w in (("in-process", 0), (f"{workers} procs", workers)):
+        t0 = time.perf_counter()
+        results = run_sweep(panel, configs, workers=w)
+        elapsed = time.perf_counter() - t0
+        assert len(results) == len(configs) and "error" not in results
+        print(f"{label:>10} {len(configs):>8} {elapsed:>8.2f} {len(configs) / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_db_pool.py
+"""
+Rebalance read path (check_30d_rule, load_holdings_df, get_free_cash_and_total)
+with one pooled connection per request vs a fresh connection per helper.
+
+Runs against the SQLite stand-in unless PMS_DB_BACKEND=mysql is set:
+
+    cd APIs && python -m benchmarks.bench_db_pool
+"""
+import os
+import tempfile
+import time
+
+os.environ.setdefault("PMS_DB_BACKEND", "sqlite")
+os.environ.setdefault(
+    "PMS_SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "bench_pool.sqlite3")
+)
+
+import database_helper  # noqa: E402
+from database_helper import PooledConnection, create_standin_schema, db_session  # noqa: E402
+from rebalance_api import (  # noqa: E402
+    check_30d_rule,
+    get_free_cash_and_total,
+    load_holdings_df,
+)
+
+REQUESTS = 500
+HOLDINGS = 50
+
+
+class FreshConnectionPool:
+    """Old behaviour: connect on every get_connection(), disconnect on close()."""
+
+    def acquire(self):
+        return PooledConnection(self, database_helper._connect())
+
+    def release(self, raw):
+        raw.close()
+
+
+def seed() -> int:
+    create_standin_schema()
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO portfolios (portfolio_name, index_symbol) VALUES (%s, %s)",
+            ("bench", "NIFTY 50"),
+        )
+        portfolio_id = cur.lastrowid
+        cur.execute(
+            "INSERT INTO user_portfolios (user_id, portfolio_id, total_invested) VALUES (%s, %s, %s)",
+            (1, portfolio_id, 1_000_000),
+        )
+        cur.executemany(
+            """
+            INSERT INTO portfolio_holdings
+            (portfolio_id, symbol, date_of_purchase, buy_price, current_price,
+             quantity, invested_amount, current_value, pl_amount, pl_percent)
+            VALUES (%s, %s, '2025-01-01', %s, %s, %s, %s, %s, 0, 0)
+            """,
+            [(portfolio_id, f"SYM{i}", 100.0, 100.0, 10, 1000.0, 1000.0) for i in range(HOLDINGS)],
+        )
+        conn.commit()
+        cur.close()
+    return portfolio_id
+
+
+def read_path(portfolio_id: int, conn=None):
+    check_30d_rule(1, portfolio_id, conn)
+    load_holdings_df(portfolio_id, conn)
+    get_free_cash_and_total(portfolio_id, 1, conn)
+
+
+def main():
+    portfolio_id = seed()
+
+    pooled = database_helper.pool
+    t0 = time.perf_counter()
+    for _ in range(REQUESTS):
+        with db_session() as conn:
+            read_path(portfolio_id, conn)
+    t_pooled = time.perf_counter() - t0
+
+    database_helper.pool = FreshConnectionPool()
+    t0 = time.perf_counter()
+    for _ in range(REQUESTS):
+        read_path(portfolio_id)
+    t_fresh = time.perf_counter() - t0
+    database_helper.pool = pooled
+
+    print(f"backend={database_helper.DB_BACKEND} requests={REQUESTS}")
+    print(f"fresh connection per helper : {t_fresh / REQUESTS * 1000:8.3f} ms/request")
+    print(f"one pooled conn per request : {t_pooled / REQUESTS * 1000:8.3f} ms/request")
+    print(f"pool stats: {pooled.stats()}")
+
+
+if __name__ == "__main__":
+    main()
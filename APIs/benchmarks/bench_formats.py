@@ -0,0 +1,153 @@
+# bench_formats.py
+"""
+Response formats of /scrape_index_csv and /scrape_index_csv/batch: records
+JSON (the original), columnar JSON and MessagePack.
+
+For portfolios of 20 / 50 / 500 stocks, the script reports:
+  - body size, raw and gzipped;
+  - server time to build the body in that layout and encode it;
+  - client time to decode it, and to decode it and rebuild the row
+    dicts (which is what view_selected_stocks.php does).
+Each columnar body is checked to give back the same rows as the records
+body.
+
+Then it runs a real uvicorn server with a 2000-scenario batch and compares
+when the first byte and the last byte arrive, for the JSON response and for
+the NDJSON stream.
+
+    cd APIs && python -m benchmarks.bench_formats
+"""
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+
+os.environ.setdefault("PMS_DB_BACKEND", "sqlite")
+os.environ.setdefault("PMS_ARCHIVE_ENABLED", "0")
+os.environ.setdefault("PMS_WARMUP", "0")
+os.environ.setdefault("PMS_METRICS_ENABLED", "0")
+os.environ.setdefault("PMS_SHARED_SNAPSHOTS", "0")
+
+import httpx
+import msgpack
+import uvicorn
+
+import portfolio_api
+from allocation import build_portfolio_from_ranked, rank_index_by_one_year_return
+from nse_csv import read_market_watch
+from response_formats import COLUMNAR, RECORDS, columnar_to_records, dumps
+from benchmarks.synthetic import make_market_watch_csv
+
+STOCKS = (20, 50, 500)
+INDEX_ROWS = 5000
+CAPITAL = 10_000_000.0
+PURCHASE_DATE = "2025-11-28"
+BATCH_SCENARIOS = 2000
+
+
+def best_of(fn, repeat=7, min_time=0.05):
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= min_time:
+            break
+        loops *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / loops)
+    return best
+
+
+def response_body(ranked, n, layout):
+    result = build_portfolio_from_ranked(ranked, CAPITAL, n, PURCHASE_DATE, layout)
+    return {"success": True, "index_symbol": "NIFTY SYNTH", "no_of_stocks": n,
+            "total_capital": CAPITAL, **result}
+
+
+FORMATS = {
+    # name: (layout, encode, decode, rows)
+    "records json": (RECORDS, dumps, json.loads, lambda b: b["portfolio"]),
+    "columnar json": (COLUMNAR, dumps, json.loads, lambda b: columnar_to_records(b["portfolio"])),
+    "msgpack": (
+        COLUMNAR,
+        lambda b: msgpack.packb(b, use_bin_type=True),
+        msgpack.unpackb,
+        lambda b: columnar_to_records(b["portfolio"]),
+    ),
+}
+
+
+def compare_formats(ranked):
+    print(f"{'stocks':>6} {'format':<14} {'bytes':>8} {'gzip':>7} "
+          f"{'encode us':>10} {'decode us':>10} {'decode+rows us':>15}")
+    for n in STOCKS:
+        reference = response_body(ranked, n, RECORDS)["portfolio"]
+        for name, (layout, enc, dec, rows) in FORMATS.items():
+            payload = enc(response_body(ranked, n, layout))
+            assert rows(dec(payload)) == reference, f"{name} rows differ at {n}"
+            encode_s = best_of(lambda: enc(response_body(ranked, n, layout)))
+            decode_s = best_of(lambda: dec(payload))
+            rows_s = best_of(lambda: rows(dec(payload)))
+            print(f"{n:>6} {name:<14} {len(payload):>8} {len(gzip.compress(payload)):>7} "
+                  f"{encode_s * 1e6:>10.1f} {decode_s * 1e6:>10.1f} {rows_s * 1e6:>15.1f}")
+    print("(encode includes building the portfolio in that layout)")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def compare_streaming():
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(portfolio_api.app, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    scenarios = [
+        {"index_symbol": "NIFTY SYNTH", "no_of_stocks": 10 + i % 90, "total_capital": 100_000.0 + 250 * i}
+        for i in range(BATCH_SCENARIOS)
+    ]
+    url = f"http://127.0.0.1:{port}/scrape_index_csv/batch"
+    print(f"\nbatch of {BATCH_SCENARIOS} scenarios over HTTP")
+    print(f"{'accept':<22} {'first byte ms':>14} {'last byte ms':>13} {'bytes':>10}")
+    with httpx.Client(timeout=120) as client:
+        for accept in ("application/json", "application/x-ndjson"):
+            first = None
+            size = 0
+            for attempt in range(2):  # first pass warms the process pool
+                first, size = None, 0
+                t0 = time.perf_counter()
+                with client.stream("POST", url, json={"scenarios": scenarios},
+                                   headers={"Accept": accept}) as r:
+                    r.raise_for_status()
+                    for chunk in r.iter_raw():
+                        if first is None:
+                            first = time.perf_counter() - t0
+                        size += len(chunk)
+                last = time.perf_counter() - t0
+            print(f"{accept:<22} {first * 1e3:>14.1f} {last * 1e3:>13.1f} {size:>10}")
+    server.should_exit = True
+
+
+def main():
+    df = read_market_watch(make_market_watch_csv(INDEX_ROWS).encode())
+    ranked = rank_index_by_one_year_return(df)
+    portfolio_api.index_snapshots.loader = lambda symbol: df
+
+    compare_formats(ranked)
+    compare_streaming()
+    print("\ncolumnar and MessagePack bodies decode to the same rows as records")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# bench_index_download.py
+"""
+index_download against a local HTTP stand-in for the index host
+(benchmarks/stand_ins.py): a plain requests.get + read_market_watch per
+call (what fetch_index_csv used to do) vs fetch_frame, at 50 / 500 / 5000
+rows. The 200, 304, retry and timeout paths are tested by
+tests/test_index_download.py.
+
+    cd APIs && python -m benchmarks.bench_index_download
+"""
+import tempfile
+import time
+
+import requests
+
+import index_download
+from index_download import DownloadCache, fetch_frame
+from nse_csv import read_market_watch
+from benchmarks.stand_ins import IndexFiles, start, stop
+from benchmarks.synthetic import make_market_watch_csv
+
+SIZES = (50, 500, 5000)
+CALLS = 20
+
+
+def main():
+    server = start(IndexFiles, files={f"/{n}.csv": make_market_watch_csv(n).encode() for n in SIZES})
+    cache = DownloadCache(tempfile.mkdtemp(prefix="dlcache_"))
+
+    print(f"{'rows':>6} {'plain ms/call':>14} {'cached ms/call':>15} {'speedup':>8}")
+    for n in SIZES:
+        url = f"{server.base}/{n}.csv"
+        t0 = time.perf_counter()
+        for _ in range(CALLS):
+            r = requests.get(url, timeout=20)
+            read_market_watch(r.content)
+        plain = (time.perf_counter() - t0) / CALLS
+
+        fetch_frame(url, read_market_watch, cache)  # first download + parse
+        t0 = time.perf_counter()
+        for _ in range(CALLS):
+            fetch_frame(url, read_market_watch, cache)
+        cached = (time.perf_counter() - t0) / CALLS
+        print(f"{n:>6} {plain * 1e3:>14.2f} {cached * 1e3:>15.2f} {plain / cached:>7.1f}x")
+
+    print("server replies:", {k: v for k, v in server.state.hits.items() if v},
+          "client:", index_download.stats())
+    stop(server)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# bench_jobs.py
+"""
+Submit/poll jobs (POST /scrape_index_csv/jobs) against the synchronous
+/scrape_index_csv, with a stand-in scrape that sleeps SCRAPE_SECONDS.
+
+USERS clients ask for the same portfolio at once. Synchronously, each
+request holds its connection (a PHP worker) for the whole scrape. With jobs,
+the submit returns straight away, the identical submits share one job, and
+the polls are cheap. The script checks that the job result equals the
+synchronous response and reports how long a caller is blocked per
+request, for both backends of the result store.
+
+    cd APIs && python -m benchmarks.bench_jobs
+"""
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("PMS_DB_BACKEND", "sqlite")
+os.environ.setdefault("PMS_ARCHIVE_ENABLED", "0")
+os.environ.setdefault("PMS_WARMUP", "0")
+os.environ.setdefault("PMS_METRICS_ENABLED", "0")
+
+from fastapi.testclient import TestClient
+
+import portfolio_api
+from job_store import JobStore, MemoryResults, SQLiteResults
+from nse_csv import read_market_watch
+from benchmarks.synthetic import make_market_watch_csv
+
+USERS = 20
+SCRAPE_SECONDS = 0.5
+POLL_SECONDS = 0.05
+BODY = {"index_symbol": "NIFTY 50", "no_of_stocks": 20, "total_capital": 500000}
+
+scrapes = []
+
+
+def stand_in_scrape(index_symbol: str):
+    scrapes.append(index_symbol)
+    time.sleep(SCRAPE_SECONDS)
+    return read_market_watch(make_market_watch_csv(500).encode())
+
+
+def run_sync(client):
+    portfolio_api.index_snapshots.invalidate()
+    scrapes.clear()
+
+    def one(_):
+        t0 = time.perf_counter()
+        r = client.post("/scrape_index_csv", json=BODY)
+        return time.perf_counter() - t0, r.json()
+
+    with ThreadPoolExecutor(USERS) as ex:
+        out = list(ex.map(one, range(USERS)))
+    return [t for t, _ in out], out[0][1], len(scrapes)
+
+
+def run_jobs(client):
+    portfolio_api.index_snapshots.invalidate()
+    scrapes.clear()
+
+    def one(_):
+        t0 = time.perf_counter()
+        job = client.post("/scrape_index_csv/jobs", json=BODY).json()
+        blocked = time.perf_counter() - t0
+        polls = 0
+        while job["state"] not in ("done", "failed"):
+            time.sleep(POLL_SECONDS)
+            t0 = time.perf_counter()
+            job = client.get(job["status_url"]).json()
+            blocked = max(blocked, time.perf_counter() - t0)
+            polls += 1
+        return blocked, job, polls
+
+    with ThreadPoolExecutor(USERS) as ex:
+        out = list(ex.map(one, range(USERS)))
+    job_ids = {job["job_id"] for _, job, _ in out}
+    return [t for t, _, _ in out], out[0][1], len(scrapes), job_ids, sum(p for *_, p in out)
+
+
+def main():
+    portfolio_api.index_snapshots.loader = stand_in_scrape
+    client = TestClient(portfolio_api.app)
+    print(f"{USERS} identical requests, scrape takes {SCRAPE_SECONDS * 1e3:.0f} ms\n")
+    print(f"{'mode':<14} {'scrapes':>8} {'max blocked ms':>15} {'median ms':>10} {'polls':>6}")
+
+    blocked, sync_body, n = run_sync(client)
+    print(f"{'sync':<14} {n:>8} {max(blocked) * 1e3:>15.1f} {statistics.median(blocked) * 1e3:>10.1f} {'-':>6}")
+
+    db = os.path.join(tempfile.mkdtemp(prefix="jobs_"), "job_results.sqlite3")
+    for name, results in (("jobs/memory", MemoryResults()), ("jobs/sqlite", SQLiteResults(db))):
+        portfolio_api.scrape_jobs = JobStore(results, reuse_seconds=0)
+        blocked, job, n, job_ids, polls = run_jobs(client)
+        assert job["state"] == "done" and len(job_ids) == 1, (job["state"], job_ids)
+        assert job["result"] == sync_body, "job result differs from the synchronous response"
+        print(f"{name:<14} {n:>8} {max(blocked) * 1e3:>15.1f} "
+              f"{statistics.median(blocked) * 1e3:>10.1f} {polls:>6}")
+        portfolio_api.scrape_jobs.shutdown()
+
+    print("\njob results match the synchronous response; identical submits shared one job")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# bench_ledger.py
+"""
+Rebalance ledger writes and history reads on the SQLite stand-in.
+
+The database gets USERS users with PORTFOLIOS portfolios each and YEARS of
+monthly rebalances per portfolio, TRADES trades per rebalance, appended
+month by month through LedgerWriter, the way the rebalances would happen.
+
+Writes: microseconds per rebalance for one INSERT per trade (the previous
+transaction log) against LedgerWriter, flushed per rebalance (the request
+path) and per 50 rebalances (bulk_rebalance).
+
+Reads, for random (user, portfolio) pairs, per page of PAGE rebalances:
+  - history(): rebalance_history() with the cursor of the previous page,
+    and its keyset query alone;
+  - offset: the same page with LIMIT/OFFSET on rebalance_ledger;
+  - group by: the page aggregated from portfolio_transactions, which is
+    what reading the history took without the ledger.
+The script checks that following next_cursor returns every rebalance once,
+newest first, with the totals the trades add up to, and that
+GET /rebalance_history returns the same page.
+
+    cd APIs && python -m benchmarks.bench_ledger [--users 100]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["PMS_DB_BACKEND"] = "sqlite"
+os.environ.setdefault("PMS_SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="ledger_"), "ledger.sqlite3"))
+os.environ.setdefault("PMS_METRICS_ENABLED", "0")
+os.environ.setdefault("PMS_SHARED_SNAPSHOTS", "0")
+
+from database_helper import SQLiteConnection, SQLITE_PATH, create_standin_schema
+from trade_ledger import (
+    AFTER_CURSOR_SQL,
+    HISTORY_SQL,
+    LedgerWriter,
+    create_ledger_tables,
+    decode_cursor,
+    rebalance_history,
+)
+
+USERS = 100
+PORTFOLIOS = 10
+YEARS = 10
+TRADES = 10
+PAGE = 24
+SAMPLES = 200
+START = datetime(2016, 1, 1, 10, 0, 0)
+
+TXN_ROW_SQL = """
+    INSERT INTO portfolio_transactions
+    (portfolio_id, user_id, symbol, txn_type, quantity, price, amount,
+     before_quantity, after_quantity, before_invested, after_invested, reason, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+OFFSET_SQL = """
+    SELECT rebalance_id, created_at, trades, buy_amount, sell_amount,
+           invested_before, invested_after
+    FROM rebalance_ledger
+    WHERE user_id = %s AND portfolio_id = %s
+    ORDER BY created_at DESC, rebalance_id DESC
+    LIMIT %s OFFSET %s
+"""
+
+GROUP_BY_SQL = """
+    SELECT created_at, COUNT(*) AS trades,
+           SUM(CASE WHEN txn_type = 'BUY' THEN amount ELSE 0 END) AS buy_amount,
+           SUM(CASE WHEN txn_type = 'SELL' THEN amount ELSE 0 END) AS sell_amount
+    FROM portfolio_transactions
+    WHERE user_id = %s AND portfolio_id = %s
+    GROUP BY created_at
+    ORDER BY created_at DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+def make_trades(rng):
+    trades = []
+    for i in range(TRADES):
+        side = "SELL" if i < TRADES // 2 else "BUY"
+        qty, price = rng.randint(1, 200), round(rng.uniform(50, 5000), 2)
+        if side == "SELL":
+            trades.append((f"S{rng.randrange(500)}", side, qty, price, qty, 0, qty * price, 0))
+        else:
+            trades.append((f"S{rng.randrange(500)}", side, qty, price, 0, qty, 0, qty * price))
+    return trades
+
+
+def populate(conn, users, rng):
+    months = YEARS * 12
+    cur = conn.cursor()
+    t0 = time.perf_counter()
+    for month in range(months):
+        ledger = LedgerWriter()
+        for user_id in range(1, users + 1):
+            for p in range(PORTFOLIOS):
+                portfolio_id = (user_id - 1) * PORTFOLIOS + p + 1
+                at = START + timedelta(days=30 * month, minutes=portfolio_id)
+                ledger.record(portfolio_id, user_id, make_trades(rng), 1_000_000.0, 1_000_000.0,
+                              created_at=at)
+        ledger.flush(cur)
+        conn.commit()
+    cur.close()
+    return months * users * PORTFOLIOS, time.perf_counter() - t0
+
+
+def compare_writes(conn, rng, n=2000):
+    cur = conn.cursor()
+    batches = [(900_000 + i, 900_000 + i, make_trades(rng)) for i in range(n)]
+
+    t0 = time.perf_counter()
+    for user_id, portfolio_id, trades in batches:
+        at = datetime.utcnow()
+        for sym, side, qty, price, bq, aq, bi, ai in trades:
+            cur.execute(TXN_ROW_SQL, (portfolio_id, user_id, sym, side, qty, price, qty * price,
+                                      bq, aq, bi, ai, "30D rebalance", at))
+    conn.commit()
+    per_row = (time.perf_counter() - t0) / n
+
+    t0 = time.perf_counter()
+    ledger = LedgerWriter()
+    for user_id, portfolio_id, trades in batches:
+        ledger.record(portfolio_id, user_id, trades, 1_000_000.0, 1_000_000.0)
+        ledger.flush(cur)  # one rebalance per request transaction
+    conn.commit()
+    per_flush = (time.perf_counter() - t0) / n
+
+    t0 = time.perf_counter()
+    ledger = LedgerWriter()
+    for i, (user_id, portfolio_id, trades) in enumerate(batches, 1):
+        ledger.record(portfolio_id, user_id, trades, 1_000_000.0, 1_000_000.0)
+        if i % 50 == 0:  # bulk_rebalance: one flush per commit chunk
+            ledger.flush(cur)
+    ledger.flush(cur)
+    conn.commit()
+    per_chunk = (time.perf_counter() - t0) / n
+    cur.close()
+
+    print(f"\nwrites, {TRADES} trades per rebalance, us per rebalance, one commit at the end")
+    print(f"  one INSERT per trade        {per_row * 1e6:>8.1f}")
+    print(f"  LedgerWriter, flush each    {per_flush * 1e6:>8.1f}  (also writes the ledger row)")
+    print(f"  LedgerWriter, flush per 50  {per_chunk * 1e6:>8.1f}")
+
+
+def percentiles(samples):
+    s = sorted(samples)
+    return statistics.median(s) * 1e3, s[int(len(s) * 0.99) - 1] * 1e3
+
+
+def check_pages(conn, user_id, portfolio_id):
+    cur = conn.cursor(dictionary=True)
+    cur.execute(GROUP_BY_SQL, (user_id, portfolio_id, -1, 0))
+    expected = [(r["created_at"].isoformat(sep=" "), r["trades"], round(r["buy_amount"], 2),
+                 round(r["sell_amount"], 2)) for r in cur.fetchall()]
+    cur.close()
+
+    seen, cursor = [], None
+    while True:
+        page = rebalance_history(user_id, portfolio_id, PAGE, cursor, conn=conn)
+        seen += [(r["created_at"], r["trades"], r["buy_amount"], r["sell_amount"])
+                 for r in page["rebalances"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected, f"keyset pages differ from the trades for {user_id}/{portfolio_id}"
+    return len(seen)
+
+
+def compare_reads(conn, users, rng):
+    months = YEARS * 12
+    pages = -(-months // PAGE)
+    pairs = [(u, (u - 1) * PORTFOLIOS + rng.randrange(PORTFOLIOS) + 1)
+             for u in (rng.randint(1, users) for _ in range(SAMPLES))]
+
+    for user_id, portfolio_id in pairs[:20]:
+        assert check_pages(conn, user_id, portfolio_id) == months
+
+    # cursors of every page for each sampled portfolio
+    cursors = {}
+    for pair in pairs:
+        cs, c = [None], None
+        for _ in range(pages - 1):
+            c = rebalance_history(*pair, PAGE, c, conn=conn)["next_cursor"]
+            cs.append(c)
+        cursors[pair] = cs
+
+    cur = conn.cursor(dictionary=True)
+    print(f"\nhistory reads, {PAGE} rebalances per page, ms (median / p99 over {SAMPLES} portfolios)")
+    print(f"{'page':>6} {'history()':>16} {'keyset sql':>16} {'offset sql':>16} {'group by sql':>16}")
+    for page in (0, pages // 2, pages - 1):
+        history, keyset, offset, group_by = [], [], [], []
+        for pair in pairs:
+            t0 = time.perf_counter()
+            rebalance_history(*pair, PAGE, cursors[pair][page], conn=conn)
+            history.append(time.perf_counter() - t0)
+
+            after, params = "", [*pair]
+            if cursors[pair][page]:
+                created_at, rebalance_id = decode_cursor(cursors[pair][page])
+                after, params = AFTER_CURSOR_SQL, params + [created_at, created_at, rebalance_id]
+            t0 = time.perf_counter()
+            cur.execute(HISTORY_SQL.format(after=after), (*params, PAGE + 1))
+            cur.fetchall()
+            keyset.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            cur.execute(OFFSET_SQL, (*pair, PAGE, page * PAGE))
+            cur.fetchall()
+            offset.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            cur.execute(GROUP_BY_SQL, (*pair, PAGE, page * PAGE))
+            cur.fetchall()
+            group_by.append(time.perf_counter() - t0)
+        cols = ["{:>7.3f} / {:<6.3f}".format(*percentiles(x)) for x in (history, keyset, offset, group_by)]
+        print(f"{page + 1:>6} " + " ".join(f"{c:>16}" for c in cols))
+
+    cur.execute("EXPLAIN QUERY PLAN " + HISTORY_SQL.format(after=""), (1, 1, PAGE))
+    print("\nplan:", cur.fetchall()[0]["detail"])
+    cur.close()
+    return pairs[0]
+
+
+def check_endpoint(user_id, portfolio_id):
+    from fastapi.testclient import TestClient
+
+    import rebalance_api
+
+    client = TestClient(rebalance_api.app)
+    r = client.get(f"/rebalance_history/{user_id}/{portfolio_id}", params={"limit": PAGE, "trades": "true"})
+    r.raise_for_status()
+    body = r.json()
+    assert [x["rebalance_id"] for x in body["rebalances"]] == [
+        x["rebalance_id"] for x in rebalance_history(user_id, portfolio_id, PAGE)["rebalances"]
+    ]
+    assert all(len(x["transactions"]) == x["trades"] for x in body["rebalances"])
+    nxt = client.get(f"/rebalance_history/{user_id}/{portfolio_id}",
+                     params={"limit": PAGE, "cursor": body["next_cursor"]}).json()
+    assert nxt["rebalances"][0]["created_at"] < body["rebalances"][-1]["created_at"]
+    assert client.get(f"/rebalance_history/{user_id}/{portfolio_id}", params={"cursor": "x"}).status_code == 400
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=USERS)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    create_standin_schema()
+    conn = SQLiteConnection(SQLITE_PATH)
+    create_ledger_tables(conn)
+    conn.commit()
+
+    rebalances, seconds = populate(conn, args.users, rng)
+    print(f"{args.users} users x {PORTFOLIOS} portfolios x {YEARS} years monthly: "
+          f"{rebalances} rebalances, {rebalances * TRADES} trades "
+          f"({seconds:.1f} s, {os.path.getsize(SQLITE_PATH) / 2**20:.0f} MB)")
+
+    compare_writes(conn, rng)
+    user_id, portfolio_id = compare_reads(conn, args.users, rng)
+    conn.close()
+    check_endpoint(user_id, portfolio_id)
+    print("\nkeyset pages return every rebalance once, newest first, with the totals of its trades")
+
+
+if __name__ == "__main__":
+    main()
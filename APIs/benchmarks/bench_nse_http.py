@@ -0,0 +1,75 @@
+# bench_nse_http.py
+"""
+nse_http.NSEClient against the local nseindia.com stand-in
+(benchmarks/stand_ins.py), and the Selenium scrape next to it when a
+chromedriver is available: time per scrape, tracemalloc peak and process
+RSS for each path. The handshake, re-handshake, non-CSV rejection and
+browser fallback are tested by tests/test_nse_http.py.
+
+    cd APIs && python -m benchmarks.bench_nse_http
+"""
+import os
+import time
+import tracemalloc
+
+os.environ.setdefault("PMS_DB_BACKEND", "sqlite")
+os.environ.setdefault("PMS_ARCHIVE_ENABLED", "0")
+os.environ.setdefault("PMS_WARMUP", "0")
+os.environ.setdefault("PMS_DRIVER_ALLOW_DOWNLOAD", "0")
+
+from nse_http import NSEClient
+from benchmarks.stand_ins import NSE, start, stop
+from benchmarks.synthetic import make_market_watch_csv
+
+ROWS = 500
+CALLS = 20
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def measure(label: str, fn) -> None:
+    fn()  # handshake / browser launch outside the timing
+    rss_before = rss_mb()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    for _ in range(CALLS):
+        fn()
+    per_call = (time.perf_counter() - t0) / CALLS
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<10} {per_call * 1e3:>10.2f} {peak / 2**20:>12.2f} {rss_mb():>9.1f} "
+          f"{rss_mb() - rss_before:>+8.1f}")
+
+
+def main():
+    server = start(NSE, csv=make_market_watch_csv(ROWS).encode())
+
+    print(f"{ROWS} rows, {CALLS} scrapes per path")
+    print(f"{'path':<10} {'ms/scrape':>10} {'py peak MB':>12} {'RSS MB':>9} {'RSS +/-':>8}")
+    client = NSEClient(base_url=server.base, timeout=5)
+    measure("http", lambda: client.fetch_frame("NIFTY 50"))
+
+    import chrome_driver
+    import portfolio_api
+    try:
+        chrome_driver.resolve_driver_path()
+        chrome_driver.selenium_api()
+    except Exception as e:
+        print(f"selenium   skipped: no chromedriver here ({e})")
+    else:
+        portfolio_api.NSE_BASE_URL = server.base
+        measure("selenium", lambda: portfolio_api.scrape_index_df_browser("NIFTY 50"))
+        portfolio_api.driver_pool.close_all()
+
+    print("server:", {k: server.state.hits[k] for k in ("page", "csv", "401")})
+    stop(server)
+
+
+if __name__ == "__main__":
+    main()
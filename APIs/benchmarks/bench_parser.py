@@ -0,0 +1,68 @@
+# bench_parser.py
+"""
+nse_csv.read_market_watch vs the old read_csv + .str.replace cleaning,
+time and peak Python-heap memory (tracemalloc). What it parses is checked
+by tests/test_nse_csv.py against the checked-in download.
+
+    cd APIs && python -m benchmarks.bench_parser
+"""
+import io
+import time
+import tracemalloc
+
+import pandas as pd
+
+from nse_csv import CHANGE_30D, CHANGE_365D, LTP, SYMBOL, read_market_watch
+from benchmarks.synthetic import make_market_watch_csv
+
+SIZES = (500, 5000, 50000)
+
+
+def legacy_parse(data: bytes) -> pd.DataFrame:
+    df = pd.read_csv(io.BytesIO(data))
+    df.columns = (
+        df.columns.astype(str)
+        .str.strip()
+        .str.replace("\n", " ")
+        .str.replace("  ", " ", regex=False)
+    )
+    df["LTP"] = pd.to_numeric(
+        df["LTP"].astype(str).str.replace(",", "").str.replace("₹", "").str.strip(),
+        errors="coerce",
+    )
+    df[CHANGE_365D] = pd.to_numeric(
+        df[CHANGE_365D].astype(str).str.replace("%", "").str.strip(), errors="coerce"
+    )
+    return df
+
+
+def measure(fn, data: bytes, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 1e6
+
+
+def main():
+    cases = [
+        ("legacy (2 cols cleaned)", legacy_parse),
+        ("read_market_watch", read_market_watch),
+        ("read_market_watch usecols", lambda d: read_market_watch(
+            d, usecols=[SYMBOL, LTP, CHANGE_30D, CHANGE_365D])),
+    ]
+    print(f"{'rows':>7} {'parser':<28} {'time s':>8} {'peak MB':>8}")
+    for n in SIZES:
+        data = make_market_watch_csv(n, seed=n).encode()
+        for name, fn in cases:
+            t, peak = measure(fn, data)
+            print(f"{n:>7} {name:<28} {t:>8.4f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# bench_rebalance.py
+"""
+Symbol-indexed run_update_portfolio_logic vs the row-by-row original.
+
+Times both at 50 / 500 / 5000 symbols. That they return the same holdings,
+quantities and cash is checked on randomized portfolios by
+tests/test_rebalance_equivalence.py.
+
+    cd APIs && python -m benchmarks.bench_rebalance
+"""
+import argparse
+import random
+import time
+
+from nse_csv import read_market_watch
+from rebalance_api import run_update_portfolio_logic
+from benchmarks.reference_impl import run_update_portfolio_logic_reference
+from benchmarks.synthetic import make_holdings, make_market_watch_csv
+
+SIZES = (50, 500, 5000)
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    args = parser.parse_args()
+
+    print(f"{'symbols':>8} {'reference s':>12} {'indexed s':>10} {'speedup':>8}")
+    rng = random.Random(0)
+    for n in args.sizes:
+        df_index = read_market_watch(make_market_watch_csv(n, seed=n).encode())
+        holdings = make_holdings(df_index, n // 2, rng)
+        no_of_stocks = n // 2
+        free_cash = 1_000_000.0
+
+        repeat = 3 if n <= 500 else 1
+        t_old = _best_of(
+            lambda: run_update_portfolio_logic_reference(df_index, holdings, no_of_stocks, free_cash),
+            repeat,
+        )
+        t_new = _best_of(
+            lambda: run_update_portfolio_logic(df_index, holdings, no_of_stocks, free_cash),
+            repeat * 5,
+        )
+        print(f"{n:>8} {t_old:>12.4f} {t_new:>10.4f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
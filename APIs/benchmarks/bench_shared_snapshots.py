@@ -0,0 +1,143 @@
+# bench_shared_snapshots.py
+"""
+Memory and fetch count per worker process, with and without shared
+snapshots.
+
+For 1, 2, 4 and 8 worker processes (spawned, like separate uvicorn
+workers), every worker asks for the same index at the same moment. In
+"private" mode each one parses the CSV itself (PMS_SHARED_SNAPSHOTS=0).
+In "shared" mode they go through shared_snapshots.get_or_load: one worker
+parses and publishes, and the rest attach to the mapped file. Each worker
+reports how much its private memory (Private_Clean + Private_Dirty from
+/proc/self/smaps_rollup) and its Pss (shared pages split between the
+processes mapping them) grew, measured once all of them hold the frame.
+Each also checks that its frame equals a locally parsed one.
+
+A second run publishes a new version while the workers hold the old one,
+and checks that they all switch to it on their next get.
+
+    cd APIs && python -m benchmarks.bench_shared_snapshots [--rows 50000]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+
+ROWS = 50000
+WORKERS = (1, 2, 4, 8)
+
+
+def smaps_mb() -> dict:
+    out = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    out["Private"] = out.get("Private_Clean", 0) + out.get("Private_Dirty", 0)
+    return out
+
+
+def worker(mode, root, csv_path, fetch_log, barrier, results):
+    os.environ["PMS_SHARED_SNAPSHOTS"] = "1" if mode == "shared" else "0"
+    os.environ["PMS_SHARED_SNAPSHOT_DIR"] = root
+    os.environ["PMS_METRICS_ENABLED"] = "0"
+    import pandas as pd
+
+    from nse_csv import read_market_watch
+    from shared_snapshots import SharedSnapshots, frame_to_table, table_to_frame
+
+    store = SharedSnapshots(root=root)
+    with open(csv_path, "rb") as f:
+        content = f.read()
+
+    def load(_key):
+        with open(fetch_log, "a") as log:
+            log.write("x")
+        return read_market_watch(content)
+
+    # first calls into pandas/pyarrow load code and caches; keep that out of
+    # the measurement in both modes
+    small = read_market_watch(content[:20000].rsplit(b"\n", 1)[0])
+    table_to_frame(frame_to_table(small))
+    del small
+
+    before = smaps_mb()
+    barrier.wait()
+    df = store.get_or_load("NIFTY SYNTH", load)
+    # measured once every worker holds its frame: a mapped page only counts
+    # as shared once a second process has touched it
+    barrier.wait()
+    after = smaps_mb()
+    results.put((after["Private"] - before["Private"], after["Pss"] - before["Pss"]))
+    pd.testing.assert_frame_equal(df, read_market_watch(content))
+
+    # version pickup: the parent publishes a new version, we must see it
+    barrier.wait()
+    if mode == "shared":
+        assert store.get("NIFTY SYNTH")["LTP"].iloc[1] == -1.0, "new version not picked up"
+
+
+def run(mode, n, csv_path):
+    ctx = mp.get_context("spawn")
+    root = tempfile.mkdtemp(prefix="pms_shared_", dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+    fetch_log = os.path.join(root, "fetches.log")
+    open(fetch_log, "w").close()
+    barrier = ctx.Barrier(n + 1)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(mode, root, csv_path, fetch_log, barrier, results))
+        for _ in range(n)
+    ]
+    for p in procs:
+        p.start()
+    barrier.wait()  # all workers started: go
+    barrier.wait()  # all frames loaded
+    samples = [results.get(timeout=120) for _ in range(n)]
+
+    if mode == "shared":
+        from nse_csv import read_market_watch
+        from shared_snapshots import SharedSnapshots
+
+        with open(csv_path, "rb") as f:
+            df = read_market_watch(f.read())
+        df.loc[1, "LTP"] = -1.0
+        SharedSnapshots(root=root, enabled=True).publish("NIFTY SYNTH", df)
+    barrier.wait()
+
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0, f"worker failed ({mode}, {n})"
+    with open(fetch_log) as f:
+        fetches = len(f.read())
+    shutil.rmtree(root, ignore_errors=True)
+
+    private = sum(s[0] for s in samples)
+    pss = sum(s[1] for s in samples)
+    print(f"{mode:<8} {n:>7} {fetches:>8} {private / n:>16.1f} {pss / n:>12.1f} {pss:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=ROWS)
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import make_market_watch_csv
+
+    csv_path = os.path.join(tempfile.mkdtemp(prefix="pms_csv_"), "index.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write(make_market_watch_csv(args.rows))
+
+    print(f"{args.rows} rows ({os.path.getsize(csv_path) / 2**20:.1f} MB CSV)")
+    print(f"{'mode':<8} {'workers':>7} {'fetches':>8} {'+private MB/wkr':>16} "
+          f"{'+Pss MB/wkr':>12} {'+Pss total':>10}")
+    for mode in ("private", "shared"):
+        for n in WORKERS:
+            run(mode, n, csv_path)
+    print("frames equal a local parse; shared workers picked up the new version")
+    shutil.rmtree(os.path.dirname(csv_path), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# reference_impl.py
+"""
+Row-by-row implementations that the vectorized code replaced, kept verbatim
+so benchmarks can time them and check that outputs did not change. The one
+edit: the rebalance sums sold positions with math.fsum, as the vectorized
+code does, so the comparison does not depend on set iteration order.
+"""
+import math
+from datetime import datetime
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from nse_csv import CHANGE_30D, LTP, SYMBOL, normalize_market_watch, require_columns
+
+
+def initialize_portfolio_from_index_reference(
+    df: pd.DataFrame, total_capital: float, no_of_stocks: int
+) -> Dict[str, Any]:
+    """
+    Strategy:
+    1) Pick top N by 365 D % CHNG.
+    2) Pass 1: equal capital per stock, buy floor(investment_per_stock / LTP).
+    3) Pass 2: for stocks with QUANTITY == 0, try to buy 1 share if free_cash >= LTP.
+    4) Pass 3: greedy, for all N stocks in order, buy as many extra shares as
+       possible with remaining free_cash to minimize leftover cash.
+    """
+    portfolio = []
+    purchase_date = datetime.today().strftime("%Y-%m-%d")
+
+    # Normalize columns
+    df.columns = (
+        df.columns.astype(str)
+        .str.strip()
+        .str.replace("\n", " ")
+        .str.replace("  ", " ", regex=False)
+    )
+
+    # Drop duplicate header row if present
+    if len(df) > 0 and str(df.iloc[0]["SYMBOL"]).upper() == "SYMBOL":
+        df = df.iloc[1:].copy()
+
+    # Clean LTP
+    df["LTP"] = (
+        df["LTP"]
+        .astype(str)
+        .str.replace(",", "")
+        .str.replace("₹", "")
+        .str.strip()
+    )
+    df["LTP"] = pd.to_numeric(df["LTP"], errors="coerce")
+
+    # 365‑day change column
+    change_col = "365 D % CHNG"
+    if change_col not in df.columns:
+        raise RuntimeError(f"Expected column '{change_col}' not found in CSV")
+
+    df[change_col] = (
+        df[change_col]
+        .astype(str)
+        .str.replace("%", "")
+        .str.strip()
+    )
+    df[change_col] = pd.to_numeric(df[change_col], errors="coerce")
+
+    # Rank by 1‑year return and pick top N
+    df = df.sort_values(by=change_col, ascending=False).head(no_of_stocks).copy()
+
+    # Filter out rows without valid price
+    df = df[pd.notna(df["LTP"]) & (df["LTP"] > 0)].copy()
+    if df.empty:
+        raise RuntimeError("No valid prices found to build portfolio")
+
+    investment_per_stock = total_capital // no_of_stocks
+
+    # ---------- PASS 1: equal-budget buy ----------
+    for _, row in df.iterrows():
+        ltp = float(row["LTP"])
+        qty = int(investment_per_stock // ltp)
+        invested = qty * ltp
+
+        portfolio.append(
+            {
+                "SYMBOL": row["SYMBOL"],
+                "LTP": round(ltp, 2),
+                "QUANTITY": qty,
+                "INVESTED_AMOUNT": round(invested, 2),
+                "ONE_YEAR_RETURN_PCT": round(
+                    float(row[change_col]) if pd.notna(row[change_col]) else 0.0, 2
+                ),
+                "DATE_OF_PURCHASE": purchase_date,
+            }
+        )
+
+    portfolio_df = pd.DataFrame(portfolio)
+
+    # Ensure all selected symbols exist (if some were missing)
+    selected_symbols = set(df["SYMBOL"])
+    existing_symbols = set(portfolio_df["SYMBOL"])
+    missing = selected_symbols - existing_symbols
+    for sym in missing:
+        row = df[df["SYMBOL"] == sym].iloc[0]
+        portfolio_df = pd.concat(
+            [
+                portfolio_df,
+                pd.DataFrame(
+                    [
+                        {
+                            "SYMBOL": sym,
+                            "LTP": round(float(row["LTP"]), 2),
+                            "QUANTITY": 0,
+                            "INVESTED_AMOUNT": 0.0,
+                            "ONE_YEAR_RETURN_PCT": round(
+                                float(row[change_col]) if pd.notna(row[change_col]) else 0.0,
+                                2,
+                            ),
+                            "DATE_OF_PURCHASE": purchase_date,
+                        }
+                    ]
+                ),
+            ],
+            ignore_index=True,
+        )
+
+    # Free cash after pass 1
+    total_invested = float(portfolio_df["INVESTED_AMOUNT"].sum())
+    free_cash = float(total_capital - total_invested)
+
+    # Ranked view (top N) for further passes
+    df_ranked = df.sort_values(by=change_col, ascending=False).reset_index(drop=True)
+    ltp_map = {row["SYMBOL"]: float(row["LTP"]) for _, row in df_ranked.iterrows()}
+
+    # Quick symbol index for faster updates
+    symbol_index = {sym: i for i, sym in enumerate(portfolio_df["SYMBOL"])}
+
+    # ---------- PASS 2: ensure each stock gets at least 1 share if possible ----------
+    for _, row in df_ranked.iterrows():
+        sym = row["SYMBOL"]
+        ltp = ltp_map[sym]
+        if ltp <= 0:
+            continue
+
+        i = symbol_index[sym]
+        current_qty = int(portfolio_df.at[i, "QUANTITY"])
+
+        if current_qty == 0 and free_cash >= ltp:
+            portfolio_df.at[i, "QUANTITY"] += 1
+            portfolio_df.at[i, "INVESTED_AMOUNT"] += ltp
+            free_cash -= ltp
+
+    # ---------- PASS 3: greedy allocation across all N stocks ----------
+    while True:
+        bought_any = False
+
+        for _, row in df_ranked.iterrows():
+            sym = row["SYMBOL"]
+            ltp = ltp_map[sym]
+            if ltp <= 0 or free_cash < ltp:
+                continue
+
+            extra_qty = int(free_cash // ltp)
+            if extra_qty <= 0:
+                continue
+
+            i = symbol_index[sym]
+            portfolio_df.at[i, "QUANTITY"] += extra_qty
+            portfolio_df.at[i, "INVESTED_AMOUNT"] += extra_qty * ltp
+            free_cash -= extra_qty * ltp
+            bought_any = True
+
+            if free_cash <= 0:
+                break
+
+        if not bought_any:
+            break
+
+    portfolio_df["INVESTED_AMOUNT"] = portfolio_df["INVESTED_AMOUNT"].round(2)
+
+    portfolio_df = portfolio_df.sort_values(
+        by="ONE_YEAR_RETURN_PCT", ascending=False
+    ).reset_index(drop=True)
+
+    return {
+        "portfolio": portfolio_df.to_dict(orient="records"),
+        "total_invested": float(portfolio_df["INVESTED_AMOUNT"].sum()),
+        "free_cash": float(free_cash),
+    }
+
+
+def run_update_portfolio_logic_reference(
+    df_index: pd.DataFrame,
+    portfolio_df: pd.DataFrame,
+    no_of_stocks: int,
+    free_cash: float
+) -> Dict[str, Any]:
+    df = normalize_market_watch(df_index)
+    require_columns(df, [SYMBOL, LTP, CHANGE_30D])
+
+    new_top = df.sort_values(by="30 D %CHNG", ascending=False).head(no_of_stocks)
+
+    new_portfolio: List[Dict[str, Any]] = []
+    old_symbols = set(portfolio_df["SYMBOL"])
+    new_symbols = set(new_top["SYMBOL"])
+
+    common = old_symbols & new_symbols
+
+    # keep common stocks
+    for _, row in new_top.iterrows():
+        if row["SYMBOL"] in common:
+            old_row = portfolio_df[portfolio_df["SYMBOL"] == row["SYMBOL"]].iloc[0]
+            new_portfolio.append(
+                {
+                    "SYMBOL": row["SYMBOL"],
+                    "LTP": float(row["LTP"]),
+                    "QUANTITY": int(old_row["QUANTITY"]),
+                    "INVESTED AMOUNT": float(old_row["INVESTED AMOUNT"]),
+                    "1M RETURN (%)": float(row["30 D %CHNG"]),
+                    "DATE OF PURCHASE": old_row["DATE OF PURCHASE"],
+                }
+            )
+
+    # sell removed stocks
+    sold_symbols = old_symbols - new_symbols
+    freed = []
+    for sym in sold_symbols:
+        r = portfolio_df[portfolio_df["SYMBOL"] == sym].iloc[0]
+        freed.append(float(r["QUANTITY"]) * float(r["LTP"]))
+    # fsum: the set order above varies with PYTHONHASHSEED, the exact sum does not
+    free_cash += math.fsum(freed)
+
+    # buy new entries
+    new_entries = new_symbols - old_symbols
+    if new_entries:
+        cash_per_new = free_cash // len(new_entries)
+        purchase_date = datetime.today().strftime("%Y-%m-%d")
+        for _, row in new_top.iterrows():
+            if row["SYMBOL"] in new_entries:
+                ltp = float(row["LTP"])
+                if ltp > 0 and ltp <= cash_per_new:
+                    qty = int(cash_per_new // ltp)
+                    if qty <= 0:
+                        continue
+                    invested = qty * ltp
+                    free_cash -= invested
+                    new_portfolio.append(
+                        {
+                            "SYMBOL": row["SYMBOL"],
+                            "LTP": ltp,
+                            "QUANTITY": qty,
+                            "INVESTED AMOUNT": invested,
+                            "1M RETURN (%)": float(row["30 D %CHNG"]),
+                            "DATE OF PURCHASE": purchase_date,
+                        }
+                    )
+
+    new_df = pd.DataFrame(new_portfolio)
+    return {
+        "portfolio_df": new_df,
+        "free_cash": free_cash,
+        "sold_symbols": list(sold_symbols),
+        "new_entries": list(new_entries),
+        "common_stocks": list(common),
+    }
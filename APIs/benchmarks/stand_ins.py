@@ -0,0 +1,140 @@
+# stand_ins.py
+"""
+Local HTTP stand-ins for the servers the APIs download from, shared by the
+benchmarks and tests. start() serves one on 127.0.0.1 in a daemon thread;
+its state (files, counters) lives on the server, so every server starts
+clean:
+
+    server = start(IndexFiles, files={"/50.csv": b"..."})
+    download(server.base + "/50.csv")
+    server.state.hits["304"]
+    stop(server)
+
+IndexFiles stands in for an indices.url host: files with ETag /
+Last-Modified, gzip when asked, 304 for a matching If-None-Match, /slow
+stalls for a second, /flaky answers 503 flaky_left times and then serves
+/50.csv.
+
+NSE mimics nseindia.com's cookie handshake: the market-watch page sets an
+nsit cookie, and the CSV API answers 401 without it (or once it has been
+rotated) and the CSV with it. ?index=BLOCKED gets an HTML error page with
+status 200, the way NSE's bot protection does. The page also carries the
+dnldEquityStock link, so the Selenium path can run against it too.
+"""
+import email.utils
+import gzip
+import hashlib
+import http.server
+import secrets
+import threading
+import time
+import types
+import urllib.parse
+
+from nse_http import BOOTSTRAP_PATH, CSV_PATH
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class IndexFiles(_Handler):
+    defaults = {"files": {}, "flaky_left": 0}
+
+    def do_GET(self):
+        state = self.state
+        if self.path == "/slow":
+            time.sleep(1.0)
+            try:
+                return self._send(200, b"SYMBOL\n")
+            except (BrokenPipeError, ConnectionResetError):
+                return  # the client gave up, as it should
+
+        if self.path == "/flaky" and state.flaky_left > 0:
+            state.flaky_left -= 1
+            state.hits["503"] += 1
+            return self._send(503)
+
+        body = state.files.get(self.path.replace("/flaky", "/50.csv"))
+        if body is None:
+            return self._send(404)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        validators = {"ETag": etag, "Last-Modified": state.modified}
+        if self.headers.get("If-None-Match") == etag:
+            state.hits["304"] += 1
+            return self._send(304, headers=validators)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            validators["Content-Encoding"] = "gzip"
+        state.hits["200"] += 1
+        self._send(200, body, {**validators, "Content-Type": "text/csv"})
+
+
+class NSE(_Handler):
+    defaults = {"csv": b"", "cookie": ""}
+
+    def do_GET(self):
+        state = self.state
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path == BOOTSTRAP_PATH:
+            state.hits["page"] += 1
+            state.cookie = secrets.token_hex(8)
+            index = urllib.parse.quote(query.get("symbol", ["NIFTY 50"])[0])
+            page = (
+                '<html><body><a id="dnldEquityStock" download="index.csv" '
+                f'href="{CSV_PATH}?csv=true&amp;index={index}">'
+                "Download (.csv)</a></body></html>"
+            ).encode()
+            return self._send(200, page, {
+                "Content-Type": "text/html",
+                "Set-Cookie": f"nsit={state.cookie}; Path=/",
+            })
+
+        if url.path == CSV_PATH:
+            if f"nsit={state.cookie}" not in self.headers.get("Cookie", ""):
+                state.hits["401"] += 1
+                return self._send(401, b'{"message": "unauthorised"}',
+                                  {"Content-Type": "application/json"})
+            if query.get("index") == ["BLOCKED"]:
+                return self._send(200, b"<html>Access Denied</html>", {"Content-Type": "text/html"})
+            state.hits["csv"] += 1
+            return self._send(200, state.csv, {"Content-Type": "text/csv"})
+
+        self._send(404)
+
+
+def start(handler, **state) -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    values = {k: (dict(v) if isinstance(v, dict) else v) for k, v in handler.defaults.items()}
+    values.update(state)
+    server.state = types.SimpleNamespace(
+        modified=email.utils.formatdate(usegmt=True),
+        hits={"200": 0, "304": 0, "503": 0, "page": 0, "csv": 0, "401": 0},
+        **values,
+    )
+    server.base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stop(server) -> None:
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,398 @@
+# suite.py
+"""
+Benchmark suite for the hot paths, with JSON baselines and a regression gate.
+
+Cases, each at 50 / 500 / 5000 index rows (synthetic CSVs in the layout of
+MW-NIFTY-50-28-Nov-2025.csv, see synthetic.py):
+
+  parse       nse_csv.read_market_watch on the raw bytes
+  initialize  portfolio_api.initialize_portfolio_from_index
+  rebalance   rebalance_api.run_update_portfolio_logic
+  db_write    rebalance_api.apply_rebalance (holdings diff, transaction log,
+              summaries, commit) against a fresh SQLite stand-in copy
+
+The whole suite runs ROUNDS times, so load that drifts over a run hits
+every round rather than whichever case happened to be running. For every
+case the best time and the median of the per-round medians are recorded,
+with noise_us: the larger of the spread within a round (1.4826 x the
+median absolute deviation, a robust standard deviation) and half the range
+of the round medians. The peak traced memory (tracemalloc, which numpy
+reports to) comes from one separate, untimed call.
+
+    cd APIs && python -m benchmarks.suite run --out benchmarks/baselines/current.json
+    cd APIs && python -m benchmarks.suite compare benchmarks/baselines/baseline.json \\
+        benchmarks/baselines/current.json --threshold 0.25
+    cd APIs && python -m benchmarks.suite run --compare benchmarks/baselines/baseline.json
+
+compare (and run --compare) exits with status 1 when a case's median got
+slower, or its peak memory grew, by more than the threshold. A slowdown
+only counts when it also exceeds NOISE_SIGMAS x the larger noise_us of the
+two runs and --min-delta-us, so a case that varies run to run (db_write,
+which fsyncs) does not fail the gate on an unchanged tree. Baselines
+are machine-specific: regenerate baseline.json on the machine that runs
+the gate.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("PMS_DB_BACKEND", "sqlite")
+os.environ.setdefault("PMS_ARCHIVE_ENABLED", "0")
+os.environ.setdefault("PMS_METRICS_ENABLED", "0")
+
+import pandas as pd  # noqa: E402
+
+from database_helper import SQLITE_STANDIN_SCHEMA, SQLiteConnection  # noqa: E402
+from nse_csv import read_market_watch  # noqa: E402
+from portfolio_api import initialize_portfolio_from_index  # noqa: E402
+from portfolio_summary import create_summary_tables  # noqa: E402
+from trade_ledger import create_ledger_tables  # noqa: E402
+from rebalance_api import apply_rebalance, run_update_portfolio_logic  # noqa: E402
+from benchmarks.synthetic import make_market_watch_csv  # noqa: E402
+
+SIZES = (50, 500, 5000)
+REPEATS = 7
+ROUNDS = 3
+MIN_REPEAT_SECONDS = 0.1  # reusable cases loop until one repeat takes this long
+DEFAULT_THRESHOLD = 0.25
+# differences below this are timer noise, whatever the ratio
+DEFAULT_MIN_DELTA_US = 50.0
+# a slowdown must also exceed this many noise_us of the noisier run
+NOISE_SIGMAS = 3.0
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+class Case:
+    """
+    fn(*setup()) is what gets timed. reusable=False means fn consumes what
+    setup() returns (e.g. a database copy), so setup runs before every call.
+    """
+
+    def __init__(self, name: str, setup: Callable[[], tuple], fn: Callable, reusable: bool = True):
+        self.name = name
+        self.setup = setup
+        self.fn = fn
+        self.reusable = reusable
+
+
+# ---------- inputs ----------
+def no_of_stocks_for(n_rows: int) -> int:
+    return max(10, n_rows // 5)
+
+
+def make_holdings(df_index: pd.DataFrame, n_holdings: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    held = rng.sample(list(df_index["SYMBOL"].iloc[1:]), n_holdings)  # skip the index row
+    return pd.DataFrame(
+        {
+            "SYMBOL": held,
+            "LTP": [round(rng.uniform(10, 5000), 2) for _ in held],
+            "QUANTITY": [rng.randint(1, 500) for _ in held],
+            "INVESTED AMOUNT": [round(rng.uniform(1e3, 1e6), 2) for _ in held],
+            "DATE OF PURCHASE": "2025-01-01",
+        }
+    )
+
+
+def make_database(path: str, holdings: pd.DataFrame) -> Tuple[int, int]:
+    """SQLite stand-in with one user subscribed to one portfolio holding `holdings`."""
+    conn = SQLiteConnection(path)
+    conn.executescript(SQLITE_STANDIN_SCHEMA)
+    create_summary_tables(conn)
+    create_ledger_tables(conn)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO portfolios (portfolio_name, index_symbol) VALUES (%s, %s)",
+        ("bench", "NIFTY SYNTH"),
+    )
+    portfolio_id = cur.lastrowid
+    user_id = 1
+    cur.execute(
+        "INSERT INTO user_portfolios (user_id, portfolio_id, total_invested) VALUES (%s, %s, %s)",
+        (user_id, portfolio_id, float(holdings["INVESTED AMOUNT"].sum())),
+    )
+    cur.executemany(
+        """
+        INSERT INTO portfolio_holdings
+        (portfolio_id, symbol, date_of_purchase, buy_price, current_price,
+         quantity, invested_amount, current_value, pl_amount, pl_percent)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 0, 0)
+        """,
+        [
+            (portfolio_id, sym, date, ltp, ltp, int(qty), inv, qty * ltp)
+            for sym, ltp, qty, inv, date in holdings.itertuples(index=False)
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return portfolio_id, user_id
+
+
+def build_cases(sizes, workdir: str) -> List[Case]:
+    cases = []
+    for n in sizes:
+        raw = make_market_watch_csv(n, seed=n).encode()
+        df = read_market_watch(raw)
+        n_stocks = no_of_stocks_for(n)
+        holdings = make_holdings(df, n_stocks, seed=n)
+        free_cash = 50_000.0
+
+        cases.append(Case(f"parse/{n}", lambda raw=raw: (raw,), read_market_watch))
+        cases.append(Case(
+            f"initialize/{n}",
+            lambda df=df, k=n_stocks: (df, 10_000_000.0, k),
+            initialize_portfolio_from_index,
+        ))
+        cases.append(Case(
+            f"rebalance/{n}",
+            lambda df=df, h=holdings, k=n_stocks: (df, h, k, free_cash),
+            run_update_portfolio_logic,
+        ))
+
+        template = os.path.join(workdir, f"template_{n}.sqlite3")
+        portfolio_id, user_id = make_database(template, holdings)
+        res = run_update_portfolio_logic(df, holdings, n_stocks, free_cash)
+
+        def db_setup(template=template, n=n, pid=portfolio_id, uid=user_id, h=holdings, res=res):
+            work = os.path.join(workdir, f"work_{n}.sqlite3")
+            shutil.copyfile(template, work)
+            return (SQLiteConnection(work), pid, uid, h, res)
+
+        def db_write(conn, pid, uid, h, res):
+            try:
+                apply_rebalance(conn, pid, uid, h, res)
+            finally:
+                conn.close()
+
+        cases.append(Case(f"db_write/{n}", db_setup, db_write, reusable=False))
+    return cases
+
+
+# ---------- measuring ----------
+def _loops_for(case: Case, args: tuple) -> int:
+    if not case.reusable:
+        return 1
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            case.fn(*args)
+        if time.perf_counter() - t0 >= MIN_REPEAT_SECONDS or loops >= 1_000_000:
+            return loops
+        loops *= 2
+
+
+def measure(case: Case, repeats: int = REPEATS) -> Dict[str, Any]:
+    if not case.reusable:
+        # one call per repeat (commit + fsync for db_write): take more of them
+        repeats *= 3
+    args = case.setup()
+    case.fn(*args)  # warm-up (imports, caches)
+    loops = _loops_for(case, args)
+
+    per_call = []
+    for _ in range(repeats):
+        if not case.reusable:
+            args = case.setup()
+        gc.collect()
+        gc.disable()  # as timeit does: no collector pauses inside the timing
+        try:
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                case.fn(*args)
+            per_call.append((time.perf_counter() - t0) / loops)
+        finally:
+            gc.enable()
+
+    args = case.setup()
+    tracemalloc.start()
+    try:
+        case.fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(per_call)
+    mad = statistics.median(abs(t - median) for t in per_call)
+    return {
+        "min_us": round(min(per_call) * 1e6, 2),
+        "median_us": round(median * 1e6, 2),
+        "noise_us": round(1.4826 * mad * 1e6, 2),
+        "loops": loops,
+        "repeats": repeats,
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def combine_rounds(rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    medians = [r["median_us"] for r in rounds]
+    return {
+        "min_us": min(r["min_us"] for r in rounds),
+        "median_us": round(statistics.median(medians), 2),
+        "noise_us": round(max(statistics.median(r["noise_us"] for r in rounds),
+                              (max(medians) - min(medians)) / 2), 2),
+        "loops": rounds[0]["loops"],
+        "repeats": rounds[0]["repeats"],
+        "rounds": len(rounds),
+        "peak_kib": max(r["peak_kib"] for r in rounds),
+    }
+
+
+def run_suite(
+    sizes=SIZES, repeats: int = REPEATS, only: Optional[List[str]] = None, rounds: int = ROUNDS
+) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="pms_bench_")
+    try:
+        cases = [c for c in build_cases(sizes, workdir)
+                 if not only or any(c.name.startswith(prefix) for prefix in only)]
+        per_round: Dict[str, List[Dict[str, Any]]] = {c.name: [] for c in cases}
+        for i in range(rounds):
+            print(f"round {i + 1}/{rounds}")
+            for case in cases:
+                per_round[case.name].append(r := measure(case, repeats))
+                print(f"  {case.name:<16} min {r['min_us']:>12.1f} us  median {r['median_us']:>12.1f} us"
+                      f" +- {r['noise_us']:>9.1f}  peak {r['peak_kib']:>10.1f} KiB")
+        results = {name: combine_rounds(rs) for name, rs in per_round.items()}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+# ---------- comparing ----------
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    memory_threshold: Optional[float] = None,
+    min_delta_us: float = DEFAULT_MIN_DELTA_US,
+) -> List[str]:
+    """
+    Prints a table and returns the regressions (empty list = pass). Times
+    are compared on median_us; results written before noise_us existed
+    count as noiseless.
+    """
+    memory_threshold = threshold if memory_threshold is None else memory_threshold
+    base, cur = baseline["results"], current["results"]
+    regressions = []
+
+    print(f"{'case':<16} {'base us':>12} {'now us':>12} {'noise us':>10} {'ratio':>7} "
+          f"{'base KiB':>10} {'now KiB':>10} {'ratio':>7}")
+    for name in sorted(base.keys() & cur.keys(), key=_case_order):
+        b, c = base[name], cur[name]
+        t_ratio = c["median_us"] / b["median_us"] if b["median_us"] else 1.0
+        m_ratio = c["peak_kib"] / b["peak_kib"] if b["peak_kib"] else 1.0
+        noise = max(b.get("noise_us", 0.0), c.get("noise_us", 0.0))
+        delta = c["median_us"] - b["median_us"]
+        flags = []
+        if t_ratio > 1 + threshold and delta > max(min_delta_us, NOISE_SIGMAS * noise):
+            flags.append("TIME")
+            regressions.append(f"{name}: {t_ratio:.2f}x slower "
+                               f"({b['median_us']:.1f} -> {c['median_us']:.1f} us, noise {noise:.1f} us)")
+        if m_ratio > 1 + memory_threshold:
+            flags.append("MEM")
+            regressions.append(f"{name}: {m_ratio:.2f}x peak memory ({b['peak_kib']:.1f} -> {c['peak_kib']:.1f} KiB)")
+        print(f"{name:<16} {b['median_us']:>12.1f} {c['median_us']:>12.1f} {noise:>10.1f} {t_ratio:>6.2f}x "
+              f"{b['peak_kib']:>10.1f} {c['peak_kib']:>10.1f} {m_ratio:>6.2f}x  {' '.join(flags)}")
+
+    for name in sorted(base.keys() - cur.keys(), key=_case_order):
+        print(f"{name:<16} missing from the current run")
+    for name in sorted(cur.keys() - base.keys(), key=_case_order):
+        print(f"{name:<16} new (no baseline)")
+    return regressions
+
+
+def _case_order(name: str):
+    kind, _, size = name.partition("/")
+    return kind, int(size) if size.isdigit() else 0
+
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _report(regressions: List[str], threshold: float) -> int:
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} regression(s) beyond {threshold:.0%}:")
+        for r in regressions:
+            print("  " + r)
+        return 1
+    print(f"\nOK: no case regressed beyond {threshold:.0%}")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PMS hot-path benchmarks with a regression gate.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_gate_options(p):
+        p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="allowed slowdown as a fraction (0.25 = 25%%)")
+        p.add_argument("--memory-threshold", type=float, default=None,
+                       help="allowed peak-memory growth (default: --threshold)")
+        p.add_argument("--min-delta-us", type=float, default=DEFAULT_MIN_DELTA_US,
+                       help="ignore slowdowns smaller than this many microseconds")
+
+    run_p = sub.add_parser("run", help="run the suite and write a JSON result file")
+    run_p.add_argument("--out", default=os.path.join(BASELINE_DIR, "current.json"))
+    run_p.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    run_p.add_argument("--repeats", type=int, default=REPEATS)
+    run_p.add_argument("--rounds", type=int, default=ROUNDS,
+                       help="times the whole suite runs; times are the median over rounds")
+    run_p.add_argument("--only", nargs="+", help="case name prefixes, e.g. parse rebalance/500")
+    run_p.add_argument("--compare", metavar="BASELINE", help="compare against BASELINE afterwards")
+    add_gate_options(run_p)
+
+    cmp_p = sub.add_parser("compare", help="compare two result files")
+    cmp_p.add_argument("baseline")
+    cmp_p.add_argument("current")
+    add_gate_options(cmp_p)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        data = run_suite(args.sizes, args.repeats, args.only, args.rounds)
+        save(args.out, data)
+        print(f"wrote {args.out}")
+        if not args.compare:
+            return 0
+        baseline, current = load(args.compare), data
+    else:
+        baseline, current = load(args.baseline), load(args.current)
+
+    regressions = compare(
+        baseline, current, args.threshold, args.memory_threshold, args.min_delta_us
+    )
+    return _report(regressions, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# synthetic.py
+"""Synthetic NSE market-watch CSVs in the same layout as the real downloads."""
+import csv
+import io
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_CSV = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "nse_indices_downloads_api",
+    "MW-NIFTY-50-28-Nov-2025.csv",
+)
+
+
+def sample_header() -> list:
+    """Raw header of the checked-in NSE file (with its embedded newlines)."""
+    with open(SAMPLE_CSV, encoding="utf-8-sig", newline="") as f:
+        return next(csv.reader(f))
+
+
+def _money(x: float) -> str:
+    return f"{x:,.2f}"
+
+
+def make_market_watch_csv(n_rows: int, seed: int = 0) -> str:
+    """
+    CSV text with one index row followed by n_rows stocks. Prices use the
+    "1,234.50" format, volumes are integers with separators and INDICATIVE
+    CLOSE is "-", as in the NSE download.
+    """
+    rng = np.random.default_rng(seed)
+    ltp = np.round(rng.lognormal(mean=7.0, sigma=1.2, size=n_rows), 2)
+    prev = np.round(ltp / (1 + rng.normal(0, 0.015, n_rows)), 2)
+    chng_30 = np.round(rng.normal(1.0, 8.0, n_rows), 2)
+    chng_365 = np.round(rng.normal(10.0, 25.0, n_rows), 2)
+    volume = rng.integers(1_000, 50_000_000, n_rows)
+
+    out = io.StringIO()
+    w = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    w.writerow(sample_header())
+    w.writerow(["NIFTY SYNTH", "26,237.45", "26,280.75", "26,172.40", "26,215.55",
+                "26,218.30", "-", "2.75", "0.01", "14,95,26,948", "15,188.62",
+                "26,310.45", "21,743.65", "0.96", "8.35"])
+    for i in range(n_rows):
+        w.writerow([
+            f"SYM{i:05d}",
+            _money(prev[i]),
+            _money(max(ltp[i], prev[i]) * 1.01),
+            _money(min(ltp[i], prev[i]) * 0.99),
+            _money(prev[i]),
+            _money(ltp[i]),
+            "-",
+            f"{ltp[i] - prev[i]:.2f}",
+            f"{(ltp[i] / prev[i] - 1) * 100:.2f}",
+            f"{volume[i]:,}",
+            f"{ltp[i] * volume[i] / 1e7:,.2f}",
+            _money(ltp[i] * 1.3),
+            _money(ltp[i] * 0.7),
+            f"{chng_30[i]:.2f}",
+            f"{chng_365[i]:.2f}",
+        ])
+    return out.getvalue()
+
+
+def make_holdings(df_index: pd.DataFrame, n_holdings: int, rng: random.Random) -> pd.DataFrame:
+    """
+    Holdings for run_update_portfolio_logic: n_holdings symbols of the index,
+    a few that are no longer in it, and now and then a duplicate row.
+    """
+    symbols = list(df_index["SYMBOL"])
+    held = rng.sample(symbols, min(n_holdings, len(symbols)))
+    held += [f"OLD{i:04d}" for i in range(rng.randint(0, 5))]
+    if held and rng.random() < 0.3:
+        held.append(rng.choice(held))
+    return pd.DataFrame(
+        {
+            "SYMBOL": held,
+            "LTP": [round(rng.uniform(1, 5000), 2) for _ in held],
+            "QUANTITY": [rng.randint(0, 500) for _ in held],
+            "INVESTED AMOUNT": [round(rng.uniform(0, 1e6), 2) for _ in held],
+            "DATE OF PURCHASE": ["2024-01-01" for _ in held],
+        }
+    )
@@ -0,0 +1,637 @@
+# bhavcopy_ingest.py
+"""
+Load NSE daily bhavcopy files into the database.
+
+Accepts the three NSE equity layouts (sec_bhavdata_full_DDMMYYYY.csv,
+cmDDMONYYYYbhav.csv[.zip] and the UDiFF BhavCopy_NSE_CM_*.csv). Each file is
+read in chunks, only the wanted series are kept, and rows are written with
+multi-row INSERTs into:
+
+  bhavcopy_history  one row per (trade_date, symbol); on MySQL it is
+                    LIST-partitioned with one partition per trading date
+  bhavcopy_data     latest close per symbol (PRIMARY KEY SYMBOL), the table
+                    view_scripts.php and mark_to_market.py read
+
+Loads are idempotent per date. Every date in a file is replaced inside one
+transaction, and a file whose checksum has already been loaded is skipped
+unless --force is given.
+
+bhavcopy_data is refreshed once per run, after the last file, for every
+symbol traded on a loaded date, so a multi-year backfill rebuilds it once
+rather than once per day. An older hand-made bhavcopy_data may carry more
+bhavcopy columns (SERIES, DATE1, OPEN_PRICE, ...): those are filled from the
+same history row; any other NOT NULL column without a default stops the run
+before anything is loaded. If a run dies between its last file and the
+refresh, --rebuild-latest refreshes every symbol in bhavcopy_history.
+
+    python bhavcopy_ingest.py ~/bhavcopy/2023 ~/bhavcopy/2024 --chunk-size 100000
+    python bhavcopy_ingest.py sec_bhavdata_full_02012025.csv
+    python bhavcopy_ingest.py --rebuild-latest
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import io
+import os
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from database_helper import db_session, is_sqlite
+from nse_csv import canonical_column
+
+CHUNK_SIZE = int(os.environ.get("PMS_BHAVCOPY_CHUNK_SIZE", "50000"))
+DEFAULT_SERIES = ("EQ",)
+FILE_PATTERNS = ("*.csv", "*.zip", "*.csv.gz")
+
+# canonical column -> header used by each NSE layout
+COLUMN_ALIASES = {
+    "SYMBOL": ("SYMBOL", "TckrSymb"),
+    "SERIES": ("SERIES", "SctySrs"),
+    "TRADE_DATE": ("DATE1", "TIMESTAMP", "TradDt"),
+    "OPEN": ("OPEN_PRICE", "OPEN", "OpnPric"),
+    "HIGH": ("HIGH_PRICE", "HIGH", "HghPric"),
+    "LOW": ("LOW_PRICE", "LOW", "LwPric"),
+    "CLOSE": ("CLOSE_PRICE", "CLOSE", "ClsPric"),
+    "PREV_CLOSE": ("PREV_CLOSE", "PREVCLOSE", "PrvsClsgPric"),
+    "VOLUME": ("TTL_TRD_QNTY", "TOTTRDQTY", "TtlTradgVol"),
+}
+PRICE_COLUMNS = ["OPEN", "HIGH", "LOW", "CLOSE", "PREV_CLOSE"]
+
+BHAVCOPY_SCHEMA_MYSQL = [
+    """
+    CREATE TABLE IF NOT EXISTS bhavcopy_history (
+        trade_date DATE NOT NULL,
+        symbol VARCHAR(64) NOT NULL,
+        series VARCHAR(8) NOT NULL,
+        open_price DECIMAL(14, 2) NULL,
+        high_price DECIMAL(14, 2) NULL,
+        low_price DECIMAL(14, 2) NULL,
+        close_price DECIMAL(14, 2) NOT NULL,
+        prev_close DECIMAL(14, 2) NULL,
+        volume BIGINT NULL,
+        PRIMARY KEY (trade_date, symbol),
+        KEY idx_bhavcopy_history_symbol (symbol, trade_date)
+    )
+    PARTITION BY LIST COLUMNS (trade_date) (
+        PARTITION p19700101 VALUES IN ('1970-01-01')
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bhavcopy_loads (
+        trade_date DATE PRIMARY KEY,
+        source_file VARCHAR(255) NOT NULL,
+        source_checksum CHAR(64) NOT NULL,
+        row_count INT NOT NULL,
+        loaded_at DATETIME NOT NULL,
+        KEY idx_bhavcopy_loads_checksum (source_checksum)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bhavcopy_data (
+        SYMBOL VARCHAR(64) PRIMARY KEY,
+        CLOSE_PRICE DECIMAL(14, 2) NOT NULL
+    )
+    """,
+]
+
+BHAVCOPY_SCHEMA_SQLITE = [
+    # clustered on (trade_date, symbol): each date is one contiguous range,
+    # the closest SQLite gets to a per-date partition
+    """
+    CREATE TABLE IF NOT EXISTS bhavcopy_history (
+        trade_date TEXT NOT NULL,
+        symbol TEXT NOT NULL,
+        series TEXT NOT NULL,
+        open_price REAL NULL,
+        high_price REAL NULL,
+        low_price REAL NULL,
+        close_price REAL NOT NULL,
+        prev_close REAL NULL,
+        volume INTEGER NULL,
+        PRIMARY KEY (trade_date, symbol)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_bhavcopy_history_symbol ON bhavcopy_history (symbol, trade_date)",
+    """
+    CREATE TABLE IF NOT EXISTS bhavcopy_loads (
+        trade_date TEXT PRIMARY KEY,
+        source_file TEXT NOT NULL,
+        source_checksum TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        loaded_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_bhavcopy_loads_checksum ON bhavcopy_loads (source_checksum)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_bhavcopy_data_symbol ON bhavcopy_data (SYMBOL)",
+]
+
+HISTORY_INSERT_SQL = """
+    INSERT INTO bhavcopy_history
+    (trade_date, symbol, series, open_price, high_price, low_price,
+     close_price, prev_close, volume)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# bhavcopy_history column behind each canonical bhavcopy column
+HISTORY_COLUMNS = {
+    "SYMBOL": "symbol",
+    "SERIES": "series",
+    "TRADE_DATE": "trade_date",
+    "OPEN": "open_price",
+    "HIGH": "high_price",
+    "LOW": "low_price",
+    "CLOSE": "close_price",
+    "PREV_CLOSE": "prev_close",
+    "VOLUME": "volume",
+}
+
+# Latest row for every symbol traded on one of the loaded dates (or every
+# symbol, {where} empty): one (symbol, trade_date) index seek for the MAX and
+# one primary-key lookup per symbol, and still right when an older date is
+# backfilled after newer ones.
+LATEST_DELETE_SQL = """
+    DELETE FROM bhavcopy_data
+    WHERE SYMBOL IN (SELECT symbol FROM bhavcopy_history {where})
+"""
+
+LATEST_INSERT_SQL = """
+    INSERT INTO bhavcopy_data ({columns})
+    SELECT {values}
+    FROM (SELECT DISTINCT symbol FROM bhavcopy_history {where}) s
+    JOIN bhavcopy_history h
+      ON h.symbol = s.symbol
+     AND h.trade_date = (SELECT MAX(m.trade_date) FROM bhavcopy_history m WHERE m.symbol = s.symbol)
+"""
+
+
+def _placeholders(values: Sequence[Any]) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+# ---------- schema ----------
+def create_bhavcopy_tables(conn) -> None:
+    cur = conn.cursor()
+    for stmt in BHAVCOPY_SCHEMA_SQLITE if is_sqlite() else BHAVCOPY_SCHEMA_MYSQL:
+        cur.execute(stmt)
+    if not is_sqlite():
+        # an older hand-made bhavcopy_data may not be keyed on SYMBOL
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'bhavcopy_data'
+              AND column_name = 'SYMBOL' AND seq_in_index = 1
+            """
+        )
+        if cur.fetchone()[0] == 0:
+            cur.execute("CREATE INDEX idx_bhavcopy_data_symbol ON bhavcopy_data (SYMBOL)")
+    cur.close()
+
+
+def _column_info(conn, table: str) -> List[Tuple[str, bool]]:
+    """(column, needs a value: NOT NULL without a default) for each column of `table`."""
+    cur = conn.cursor()
+    if is_sqlite():
+        cur.execute(f"PRAGMA table_info({table})")
+        info = [(row[1], bool(row[3]) and row[4] is None) for row in cur.fetchall()]
+    else:
+        cur.execute(
+            """
+            SELECT column_name,
+                   is_nullable = 'NO' AND column_default IS NULL
+                   AND extra NOT LIKE '%%auto_increment%%'
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s
+            ORDER BY ordinal_position
+            """,
+            (table,),
+        )
+        info = [(row[0], bool(row[1])) for row in cur.fetchall()]
+    cur.close()
+    return info
+
+
+def latest_columns(conn) -> List[Tuple[str, str]]:
+    """
+    (bhavcopy_data column, bhavcopy_history column) pairs the latest-close
+    refresh writes: every bhavcopy_data column that is a known bhavcopy
+    header. Raises if SYMBOL / CLOSE_PRICE are missing or another column
+    needs a value the history cannot give.
+    """
+    canonical = {
+        alias.upper(): name for name, aliases in COLUMN_ALIASES.items() for alias in aliases
+    }
+    pairs, unfilled = [], []
+    for column, needs_value in _column_info(conn, "bhavcopy_data"):
+        name = canonical.get(column.upper())
+        if name is not None:
+            pairs.append((column, HISTORY_COLUMNS[name]))
+        elif needs_value:
+            unfilled.append(column)
+    filled = {history for _, history in pairs}
+    if not {"symbol", "close_price"} <= filled:
+        raise RuntimeError("bhavcopy_data needs a SYMBOL and a CLOSE_PRICE column")
+    if unfilled:
+        raise RuntimeError(
+            f"bhavcopy_data.{', bhavcopy_data.'.join(unfilled)} is NOT NULL without a default "
+            "and has no bhavcopy_history counterpart; give it a default or make it nullable"
+        )
+    return pairs
+
+
+def refresh_latest(
+    conn, columns: Sequence[Tuple[str, str]], trade_dates: Optional[Sequence[str]] = None
+) -> int:
+    """
+    Rewrite bhavcopy_data for the symbols traded on `trade_dates` (ISO
+    strings), or for every symbol in bhavcopy_history. Commits; returns the
+    number of symbols written.
+    """
+    if trade_dates is not None and not trade_dates:
+        return 0
+    where, params = "", ()
+    if trade_dates is not None:
+        where = f"WHERE trade_date IN ({_placeholders(trade_dates)})"
+        params = tuple(trade_dates)
+    insert = LATEST_INSERT_SQL.format(
+        columns=", ".join(c for c, _ in columns),
+        values=", ".join(f"h.{h}" for _, h in columns),
+        where=where,
+    )
+    cur = conn.cursor()
+    try:
+        cur.execute(LATEST_DELETE_SQL.format(where=where), params)
+        cur.execute(insert, params)
+        written = max(cur.rowcount, 0)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return written
+
+
+def partition_name(trade_date: date) -> str:
+    return "p" + trade_date.strftime("%Y%m%d")
+
+
+def ensure_partitions(conn, trade_dates: Iterable[date]) -> int:
+    """Add missing per-date partitions (MySQL only; DDL, so call outside a transaction)."""
+    if is_sqlite():
+        return 0
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'bhavcopy_history'
+        """
+    )
+    existing = {row[0] for row in cur.fetchall()}
+    added = 0
+    for d in sorted(set(trade_dates)):
+        name = partition_name(d)
+        if name in existing:
+            continue
+        cur.execute(
+            f"ALTER TABLE bhavcopy_history ADD PARTITION "
+            f"(PARTITION {name} VALUES IN ('{d.isoformat()}'))"
+        )
+        added += 1
+    cur.close()
+    return added
+
+
+# ---------- reading ----------
+def file_checksum(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def resolve_columns(path: str) -> Dict[str, str]:
+    """Map canonical names to the raw headers present in `path`."""
+    raw = list(pd.read_csv(path, nrows=0, skipinitialspace=True).columns)
+    by_name = {canonical_column(c): c for c in raw}
+    columns = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in by_name:
+                columns[name] = by_name[alias]
+                break
+    for required in ("SYMBOL", "SERIES", "TRADE_DATE", "CLOSE"):
+        if required not in columns:
+            raise RuntimeError(f"{os.path.basename(path)}: no {required} column in bhavcopy")
+    return columns
+
+
+class _HashingFile(io.RawIOBase):
+    """Read-only file that feeds every byte it hands out into a sha256."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "rb")
+        self.sha256 = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._f.readinto(b)
+        if n:
+            self.sha256.update(memoryview(b)[:n])
+        return n
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+    def hexdigest(self) -> str:
+        # the parser may stop short of EOF (trailing bytes, gzip footer)
+        while self.readinto(bytearray(1 << 20)):
+            pass
+        return self.sha256.hexdigest()
+
+
+def _parse_dates(values: pd.Series, cache: Dict[str, date]) -> pd.Series:
+    # a daily file holds one or two distinct date strings, so parse uniques
+    # only; empty cells stay missing
+    for v in values.dropna().unique():
+        if v not in cache:
+            cache[v] = pd.to_datetime(v, dayfirst=not v[:4].isdigit()).date()
+    return values.map(cache)
+
+
+def iter_chunks(
+    path: str,
+    columns: Dict[str, str],
+    series: Sequence[str],
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Chunks of canonical columns, wanted series only, one row per (date, symbol)."""
+    rename = {raw: name for name, raw in columns.items()}
+    dtype = {raw: str for raw in (columns["SYMBOL"], columns["SERIES"], columns["TRADE_DATE"])}
+    date_cache: Dict[str, date] = {}
+    wanted = set(series)
+    reader = pd.read_csv(
+        path,
+        usecols=list(rename),
+        dtype=dtype,
+        chunksize=chunk_size,
+        skipinitialspace=True,
+        na_values=["-", ""],
+        keep_default_na=False,
+    )
+    for chunk in reader:
+        chunk = chunk.rename(columns=rename)
+        chunk["SYMBOL"] = chunk["SYMBOL"].str.strip()
+        chunk["SERIES"] = chunk["SERIES"].str.strip()
+        chunk = chunk[chunk["SERIES"].isin(wanted)]
+        for col in PRICE_COLUMNS + ["VOLUME"]:
+            if col in chunk.columns:
+                chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+            else:
+                chunk[col] = float("nan")
+        chunk = chunk[chunk["CLOSE"].notna()]
+        if chunk.empty:
+            continue
+        chunk["TRADE_DATE"] = _parse_dates(chunk["TRADE_DATE"].str.strip(), date_cache)
+        chunk = chunk[chunk["TRADE_DATE"].notna()]
+        if not chunk.empty:
+            yield chunk
+
+
+def _scan_dates(source, columns: Dict[str, str], chunk_size: int) -> List[date]:
+    date_cache: Dict[str, date] = {}
+    found = set()
+    for chunk in pd.read_csv(
+        source,
+        usecols=[columns["TRADE_DATE"]],
+        dtype=str,
+        chunksize=chunk_size,
+        skipinitialspace=True,
+    ):
+        found.update(_parse_dates(chunk.iloc[:, 0].str.strip(), date_cache).dropna())
+    return sorted(found)
+
+
+def scan_file(path: str, columns: Dict[str, str], chunk_size: int = CHUNK_SIZE) -> Tuple[List[date], str]:
+    """The trading dates in `path` and its sha256, from one read of the file."""
+    if path.endswith(".zip"):
+        # zipfile seeks to the directory at the end first, so the bytes do not
+        # arrive in order; zips are the small old layout, hash them separately
+        return _scan_dates(path, columns, chunk_size), file_checksum(path)
+    with _HashingFile(path) as raw:
+        stream = io.BufferedReader(raw)
+        source = gzip.GzipFile(fileobj=stream) if path.endswith(".gz") else stream
+        trade_dates = _scan_dates(source, columns, chunk_size)
+        return trade_dates, raw.hexdigest()
+
+
+def _history_rows(chunk: pd.DataFrame) -> List[tuple]:
+    cols = [
+        chunk["TRADE_DATE"].map(date.isoformat),
+        chunk["SYMBOL"],
+        chunk["SERIES"],
+        *(chunk[c].round(2) for c in PRICE_COLUMNS[:3]),
+        chunk["CLOSE"].round(2),
+        chunk["PREV_CLOSE"].round(2),
+        chunk["VOLUME"],
+    ]
+    frame = pd.concat(cols, axis=1).astype(object)
+    frame = frame.where(frame.notna(), None)
+    return list(frame.itertuples(index=False, name=None))
+
+
+# ---------- loading ----------
+def load_file(
+    conn,
+    path: str,
+    series: Sequence[str] = DEFAULT_SERIES,
+    chunk_size: int = CHUNK_SIZE,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Replace every trading date in `path` (one transaction). Returns per-file
+    stats; bhavcopy_data is left to refresh_latest.
+    """
+    started = time.perf_counter()
+    name = os.path.basename(path)
+    columns = resolve_columns(path)
+    # the checksum is taken during the date scan, so a file is read twice
+    # (scan, load) rather than three times
+    trade_dates, checksum = scan_file(path, columns, chunk_size)
+
+    cur = conn.cursor()
+    if not force:
+        cur.execute(
+            "SELECT COUNT(*) FROM bhavcopy_loads WHERE source_checksum = %s", (checksum,)
+        )
+        if cur.fetchone()[0] > 0:
+            cur.close()
+            return {"file": name, "skipped": True, "rows": 0, "dates": 0, "seconds": 0.0}
+
+    if not trade_dates:
+        cur.close()
+        return {"file": name, "skipped": True, "rows": 0, "dates": 0, "seconds": 0.0}
+    ensure_partitions(conn, trade_dates)
+
+    iso_dates = [d.isoformat() for d in trade_dates]
+    in_dates = _placeholders(iso_dates)
+    rows_by_date: Dict[str, int] = dict.fromkeys(iso_dates, 0)
+    seen = set()
+    try:
+        cur.execute(
+            f"DELETE FROM bhavcopy_history WHERE trade_date IN ({in_dates})", tuple(iso_dates)
+        )
+        for chunk in iter_chunks(path, columns, series, chunk_size):
+            # a symbol listed twice for a date (several wanted series): keep the first
+            key = list(zip(chunk["TRADE_DATE"], chunk["SYMBOL"]))
+            keep = [k not in seen for k in key]
+            seen.update(key)
+            chunk = chunk[keep].drop_duplicates(subset=["TRADE_DATE", "SYMBOL"])
+            if chunk.empty:
+                continue
+            cur.executemany(HISTORY_INSERT_SQL, _history_rows(chunk))
+            for d, n in chunk["TRADE_DATE"].map(date.isoformat).value_counts().items():
+                rows_by_date[d] += int(n)
+
+        cur.execute(f"DELETE FROM bhavcopy_loads WHERE trade_date IN ({in_dates})", tuple(iso_dates))
+        loaded_at = datetime.utcnow()
+        cur.executemany(
+            """
+            INSERT INTO bhavcopy_loads
+            (trade_date, source_file, source_checksum, row_count, loaded_at)
+            VALUES (%s, %s, %s, %s, %s)
+            """,
+            [(d, name, checksum, n, loaded_at) for d, n in rows_by_date.items()],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    rows = sum(rows_by_date.values())
+    elapsed = time.perf_counter() - started
+    return {
+        "file": name,
+        "skipped": False,
+        "rows": rows,
+        "dates": len(trade_dates),
+        "trade_dates": iso_dates,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Files, directories (searched for FILE_PATTERNS) and glob patterns, sorted."""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for pattern in FILE_PATTERNS:
+                out.extend(glob.glob(os.path.join(p, "**", pattern), recursive=True))
+        elif any(ch in p for ch in "*?["):
+            out.extend(glob.glob(p, recursive=True))
+        else:
+            out.append(p)
+    return sorted(set(out))
+
+
+def run_ingest(
+    paths: Iterable[str],
+    series: Sequence[str] = DEFAULT_SERIES,
+    chunk_size: int = CHUNK_SIZE,
+    force: bool = False,
+    on_file: Optional[Callable[[Dict[str, Any]], None]] = None,
+    rebuild_latest: bool = False,
+) -> Dict[str, Any]:
+    """
+    Load every file, then refresh bhavcopy_data once for the dates loaded
+    (for every symbol with `rebuild_latest`).
+    """
+    started = time.perf_counter()
+    stats = {"files": 0, "skipped": 0, "failed": 0, "rows": 0, "dates": 0, "errors": []}
+    loaded_dates = set()
+
+    with db_session() as conn:
+        create_bhavcopy_tables(conn)
+        # checked before loading: a bhavcopy_data the refresh cannot fill fails the run now
+        latest = latest_columns(conn)
+        for path in expand_paths(paths):
+            stats["files"] += 1
+            try:
+                res = load_file(conn, path, series, chunk_size, force)
+            except Exception as e:
+                stats["failed"] += 1
+                stats["errors"].append(f"{os.path.basename(path)}: {e}")
+                continue
+            if res["skipped"]:
+                stats["skipped"] += 1
+            stats["rows"] += res["rows"]
+            stats["dates"] += res["dates"]
+            loaded_dates.update(res.get("trade_dates", ()))
+            if on_file is not None:
+                on_file(res)
+
+        stats["latest_symbols"] = refresh_latest(
+            conn, latest, None if rebuild_latest else sorted(loaded_dates)
+        )
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["rows"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load NSE bhavcopy files into bhavcopy_history / bhavcopy_data.")
+    parser.add_argument("paths", nargs="*", help="bhavcopy files, directories or glob patterns")
+    parser.add_argument("--series", default=",".join(DEFAULT_SERIES),
+                        help="comma-separated series to keep (default EQ)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows per read/insert batch")
+    parser.add_argument("--force", action="store_true", help="reload files that were already loaded")
+    parser.add_argument("--quiet", action="store_true", help="only print the totals")
+    parser.add_argument("--rebuild-latest", action="store_true",
+                        help="refresh bhavcopy_data for every symbol in bhavcopy_history, "
+                             "not only those traded on the loaded dates")
+    args = parser.parse_args()
+    if not args.paths and not args.rebuild_latest:
+        parser.error("give bhavcopy paths, --rebuild-latest, or both")
+
+    def report(res):
+        if args.quiet:
+            return
+        if res["skipped"]:
+            print(f"{res['file']}: already loaded, skipped")
+        else:
+            print(
+                f"{res['file']}: dates={res['dates']} rows={res['rows']} "
+                f"time={res['seconds']}s ({res['rows_per_second']} rows/s)"
+            )
+
+    stats = run_ingest(
+        args.paths,
+        series=[s.strip() for s in args.series.split(",") if s.strip()],
+        chunk_size=args.chunk_size,
+        force=args.force,
+        on_file=report,
+        rebuild_latest=args.rebuild_latest,
+    )
+    for err in stats.pop("errors"):
+        print("ERROR", err)
+    print(
+        f"files={stats['files']} skipped={stats['skipped']} failed={stats['failed']} "
+        f"dates={stats['dates']} rows={stats['rows']} latest_symbols={stats['latest_symbols']} "
+        f"time={stats['seconds']}s throughput={stats['rows_per_second']} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# bulk_rebalance.py
+"""
+Rebalance every portfolio that is past the 30-day window.
+
+Due portfolios are grouped by index_symbol; each index CSV is downloaded and
+parsed once, holdings and cash for the whole group are loaded with one
+query each, run_update_portfolio_logic runs across a process pool, and the
+writes are committed in chunks (the ledger is flushed once per chunk).
+
+A portfolio is due when any of its user_portfolios links is; its holdings
+are shared, so it is rebalanced once and every due link is marked.
+
+    python bulk_rebalance.py --dry-run
+    python bulk_rebalance.py --workers 4 --commit-every 50
+
+Suitable for cron, e.g. daily:  0 19 * * 1-5  cd /path/APIs && python bulk_rebalance.py
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+from fastapi import HTTPException
+
+from database_helper import db_session
+from migrate import check_schema
+from portfolio_summary import refresh_summaries
+from rebalance_api import (
+    REBALANCE_INTERVAL,
+    fetch_index_csv,
+    mark_portfolio_rebalanced,
+    run_update_portfolio_logic,
+    write_holdings_diff,
+)
+from trade_ledger import LedgerWriter
+
+HOLDING_COLUMNS = ["SYMBOL", "LTP", "QUANTITY", "INVESTED AMOUNT", "DATE OF PURCHASE"]
+
+
+# ---------- loading ----------
+def find_due_portfolios(conn, cutoff: datetime) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+    """
+    Portfolios with a link last rebalanced at or before cutoff, grouped by
+    (index_symbol, url). user_id is the first due subscriber, whom the trades
+    are recorded for; total_invested is the portfolio's capital, the largest
+    of its links' (all links are marked with the same value).
+    """
+    cur = conn.cursor(dictionary=True)
+    cur.execute(
+        """
+        SELECT up.portfolio_id, MIN(up.user_id) AS user_id,
+               p.index_symbol, i.url,
+               (SELECT MAX(a.total_invested) FROM user_portfolios a
+                WHERE a.portfolio_id = up.portfolio_id) AS total_invested
+        FROM user_portfolios up
+        JOIN portfolios p ON up.portfolio_id = p.portfolio_id
+        JOIN indices i ON p.index_symbol = i.symbol
+        WHERE up.last_rebalanced_at IS NULL OR up.last_rebalanced_at <= %s
+        GROUP BY up.portfolio_id, p.index_symbol, i.url
+        ORDER BY p.index_symbol, up.portfolio_id
+        """,
+        (cutoff,),
+    )
+    rows = cur.fetchall()
+    cur.close()
+
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault((row["index_symbol"], row["url"]), []).append(row)
+    return groups
+
+
+def load_group_holdings(conn, portfolio_ids: List[int]) -> Dict[int, pd.DataFrame]:
+    if not portfolio_ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(portfolio_ids))
+    cur = conn.cursor(dictionary=True)
+    cur.execute(
+        f"""
+        SELECT
+            portfolio_id,
+            symbol AS SYMBOL,
+            current_price AS LTP,
+            quantity AS QUANTITY,
+            invested_amount AS `INVESTED AMOUNT`,
+            date_of_purchase AS `DATE OF PURCHASE`
+        FROM portfolio_holdings
+        WHERE portfolio_id IN ({placeholders})
+        """,
+        tuple(portfolio_ids),
+    )
+    rows = cur.fetchall()
+    cur.close()
+
+    df = pd.DataFrame(rows, columns=["portfolio_id", *HOLDING_COLUMNS])
+    return {
+        int(pid): g[HOLDING_COLUMNS].reset_index(drop=True)
+        for pid, g in df.groupby("portfolio_id")
+    }
+
+
+# ---------- compute (runs in worker processes) ----------
+def rebalance_chunk(
+    df_index: pd.DataFrame, jobs: List[Tuple[int, pd.DataFrame, int, float]]
+) -> List[Tuple[int, Dict[str, Any] | None, str | None]]:
+    out = []
+    for portfolio_id, holdings, no_of_stocks, free_cash in jobs:
+        try:
+            res = run_update_portfolio_logic(df_index, holdings, no_of_stocks, free_cash)
+            out.append((portfolio_id, res, None))
+        except Exception as e:
+            out.append((portfolio_id, None, str(e)))
+    return out
+
+
+# ---------- job ----------
+def run_bulk_rebalance(
+    dry_run: bool = False,
+    workers: int = 0,
+    commit_every: int = 50,
+    chunk_size: int = 25,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    stats = {"indices": 0, "due": 0, "rebalanced": 0, "skipped": 0, "failed": 0, "errors": []}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+
+    try:
+        with db_session() as conn:
+            check_schema(conn)
+            cutoff = datetime.utcnow() - REBALANCE_INTERVAL
+            groups = find_due_portfolios(conn, cutoff)
+            for (index_symbol, url), links in groups.items():
+                stats["indices"] += 1
+                stats["due"] += len(links)
+
+                try:
+                    df_index = fetch_index_csv(index_symbol, url)
+                except HTTPException as e:
+                    stats["failed"] += len(links)
+                    stats["errors"].append(f"{index_symbol}: {e.detail}")
+                    continue
+
+                holdings = load_group_holdings(conn, [l["portfolio_id"] for l in links])
+                link_by_pid = {}
+                jobs = []
+                for link in links:
+                    pid = int(link["portfolio_id"])
+                    h = holdings.get(pid)
+                    if h is None or h.empty:
+                        stats["skipped"] += 1
+                        continue
+                    free_cash = float(link["total_invested"]) - float(h["INVESTED AMOUNT"].sum())
+                    link_by_pid[pid] = link
+                    # keep the portfolio at its current size
+                    jobs.append((pid, h, len(h), free_cash))
+
+                chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+                if pool is not None:
+                    results = pool.map(rebalance_chunk, [df_index] * len(chunks), chunks)
+                else:
+                    results = (rebalance_chunk(df_index, c) for c in chunks)
+
+                holdings_by_pid = dict((j[0], j[1]) for j in jobs)
+                cur = conn.cursor(dictionary=True)
+                ledger = LedgerWriter()
+                pending: List[int] = []
+                for chunk_result in results:
+                    for pid, res, error in chunk_result:
+                        if error is not None:
+                            stats["failed"] += 1
+                            stats["errors"].append(f"portfolio {pid}: {error}")
+                            continue
+                        stats["rebalanced"] += 1
+                        if dry_run:
+                            continue
+                        link = link_by_pid[pid]
+                        total_invested = write_holdings_diff(
+                            cur, pid, link["user_id"], holdings_by_pid[pid], res["portfolio_df"], res,
+                            ledger,
+                        )
+                        mark_portfolio_rebalanced(cur, pid, total_invested, cutoff)
+                        pending.append(pid)
+                        if len(pending) >= commit_every:
+                            ledger.flush(cur)
+                            refresh_summaries(cur, pending)
+                            conn.commit()
+                            pending = []
+                if not dry_run:
+                    ledger.flush(cur)
+                    refresh_summaries(cur, pending)
+                    conn.commit()
+                cur.close()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["portfolios_per_second"] = round(stats["rebalanced"] / elapsed, 2) if elapsed else 0.0
+    stats["dry_run"] = dry_run
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebalance all portfolios past the 30-day window.")
+    parser.add_argument("--dry-run", action="store_true", help="compute but do not write")
+    parser.add_argument("--workers", type=int, default=0, help="process pool size (0 = in-process)")
+    parser.add_argument("--commit-every", type=int, default=50, help="portfolios per commit")
+    parser.add_argument("--chunk-size", type=int, default=25, help="portfolios per worker task")
+    args = parser.parse_args()
+
+    stats = run_bulk_rebalance(
+        dry_run=args.dry_run,
+        workers=args.workers,
+        commit_every=args.commit_every,
+        chunk_size=args.chunk_size,
+    )
+    for err in stats.pop("errors"):
+        print("ERROR", err)
+    print(
+        f"indices={stats['indices']} due={stats['due']} rebalanced={stats['rebalanced']} "
+        f"skipped={stats['skipped']} failed={stats['failed']} "
+        f"time={stats['seconds']}s throughput={stats['portfolios_per_second']} portfolios/s"
+        + (" (dry run, nothing written)" if stats["dry_run"] else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
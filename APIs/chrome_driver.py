@@ -0,0 +1,146 @@
+# chrome_driver.py
+"""
+Chrome/chromedriver setup for the Selenium scrape, kept out of module import.
+
+selenium and webdriver_manager are imported on first use (selenium_api()),
+so importing portfolio_api, the benchmarks or the batch workers does not
+pay for them. The chromedriver binary is resolved once per process, without
+network access when possible:
+
+  1. PMS_CHROMEDRIVER_PATH
+  2. `chromedriver` on PATH
+  3. the newest chromedriver already in the webdriver_manager cache
+     (~/.wdm/drivers.json, or WDM_LOCAL's project cache)
+  4. ChromeDriverManager().install() (network), unless
+     PMS_DRIVER_ALLOW_DOWNLOAD=0
+"""
+import json
+import os
+import shutil
+import threading
+from types import SimpleNamespace
+from typing import Optional
+
+from metrics import stage
+
+CHROMEDRIVER_PATH = os.environ.get("PMS_CHROMEDRIVER_PATH", "")
+DRIVER_ALLOW_DOWNLOAD = os.environ.get("PMS_DRIVER_ALLOW_DOWNLOAD", "1") == "1"
+
+_api: Optional[SimpleNamespace] = None
+_driver_path: Optional[str] = None
+_lock = threading.Lock()
+
+
+def selenium_api() -> SimpleNamespace:
+    """The selenium names the scraper uses, imported on first call."""
+    global _api
+    if _api is None:
+        with stage("selenium_import"):
+            from selenium import webdriver
+            from selenium.common.exceptions import WebDriverException
+            from selenium.webdriver.chrome.options import Options
+            from selenium.webdriver.chrome.service import Service
+            from selenium.webdriver.common.by import By
+        _api = SimpleNamespace(
+            webdriver=webdriver,
+            By=By,
+            Options=Options,
+            Service=Service,
+            WebDriverException=WebDriverException,
+        )
+    return _api
+
+
+def is_webdriver_error(e: BaseException) -> bool:
+    # selenium is always loaded by the time a driver can raise
+    return _api is not None and isinstance(e, _api.WebDriverException)
+
+
+# ---------- driver binary ----------
+def _wdm_cache_roots():
+    roots = [os.path.join(os.path.expanduser("~"), ".wdm")]
+    if os.environ.get("WDM_LOCAL", "false").lower() in ("1", "true", "yes"):
+        roots.insert(0, os.path.join(os.getcwd(), ".wdm"))
+    return roots
+
+
+def cached_driver_path() -> Optional[str]:
+    """Newest chromedriver recorded in a webdriver_manager cache that still exists."""
+    found = []
+    for root in _wdm_cache_roots():
+        try:
+            with open(os.path.join(root, "drivers.json"), encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for key, info in entries.items():
+            path = info.get("binary_path", "")
+            if "chromedriver" in key and os.path.isfile(path) and os.access(path, os.X_OK):
+                found.append(path)
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def resolve_driver_path() -> str:
+    global _driver_path
+    with _lock:
+        if _driver_path is not None:
+            return _driver_path
+
+        with stage("driver_resolve"):
+            path = None
+            if CHROMEDRIVER_PATH:
+                if not os.path.isfile(CHROMEDRIVER_PATH):
+                    raise RuntimeError(f"PMS_CHROMEDRIVER_PATH does not exist: {CHROMEDRIVER_PATH}")
+                path = CHROMEDRIVER_PATH
+            path = path or shutil.which("chromedriver") or cached_driver_path()
+            if path is None:
+                if not DRIVER_ALLOW_DOWNLOAD:
+                    raise RuntimeError(
+                        "No local chromedriver found (set PMS_CHROMEDRIVER_PATH) "
+                        "and PMS_DRIVER_ALLOW_DOWNLOAD=0"
+                    )
+                with stage("driver_install"):
+                    from webdriver_manager.chrome import ChromeDriverManager
+
+                    path = ChromeDriverManager().install()
+        _driver_path = path
+        return path
+
+
+# ---------- browser ----------
+def create_chrome_options(download_dir: str):
+    chrome_options = selenium_api().Options()
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+    )
+    prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "safebrowsing.enabled": True,
+    }
+    chrome_options.add_experimental_option("prefs", prefs)
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    return chrome_options
+
+
+def create_driver(download_dir: str):
+    api = selenium_api()
+    driver_path = resolve_driver_path()
+    with stage("driver_launch"):
+        return api.webdriver.Chrome(
+            service=api.Service(driver_path),
+            options=create_chrome_options(download_dir),
+        )
+
+
+def set_download_dir(d, download_dir: str) -> None:
+    """Point this browser session's downloads at download_dir (Chrome CDP)."""
+    d.execute_cdp_cmd(
+        "Page.setDownloadBehavior",
+        {"behavior": "allow", "downloadPath": download_dir},
+    )
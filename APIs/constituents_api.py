@@ -0,0 +1,184 @@
+# constituents_api.py
+"""
+Index constituents joined with their latest close, for view_scripts.php.
+
+The constituents CSV (the `indices.url` of the index) is downloaded (through
+index_download, so it is revalidated rather than re-fetched) and the
+bhavcopy_data prices are looked up once per index per TTL; the encoded JSON
+body and its ETag are cached together, so a repeat request costs a dict
+lookup and a request carrying a matching If-None-Match gets an empty 304.
+
+    uvicorn constituents_api:app --port 8002
+
+    GET /index_constituents?symbol=NIFTY%2050
+    -> {"index_symbol": ..., "total_stocks": ..., "stocks": [
+           {"company_name": ..., "symbol": ..., "close_price": ...}, ...]}
+
+The ETag is a hash of the body, so a refresh that finds the same
+constituents and prices keeps the old ETag and clients keep getting 304s.
+"""
+import hashlib
+import io
+import json
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request, Response
+from requests.exceptions import RequestException, Timeout
+
+from database_helper import PoolTimeout, db_session
+import metrics
+from index_download import fetch_frame
+from metrics import stage
+from nse_csv import canonical_column
+from snapshot_store import SnapshotStore
+
+app = FastAPI(title="PMS Constituents API")
+metrics.install(app, "constituents_api")
+
+# Same fresh / stale-while-refreshing windows as the index snapshots in
+# portfolio_api; bhavcopy_data only changes once a day.
+CONSTITUENTS_TTL_SECONDS = float(os.environ.get("PMS_CONSTITUENTS_TTL_SECONDS", "300"))
+CONSTITUENTS_STALE_SECONDS = float(os.environ.get("PMS_CONSTITUENTS_STALE_SECONDS", "1800"))
+
+COMPANY_COLUMN = "Company Name"
+SYMBOL_COLUMN = "Symbol"
+
+
+class IndexPayload:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+# ---------- loading ----------
+def get_index_url(index_symbol: str, conn=None) -> str:
+    with db_session(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT url FROM indices WHERE symbol = %s", (index_symbol,))
+        row = cur.fetchone()
+        cur.close()
+    if not row:
+        raise HTTPException(status_code=400, detail="Invalid or unknown index selected.")
+    return row[0]
+
+
+def _find_column(columns, wanted: str) -> Optional[str]:
+    for col in columns:
+        if canonical_column(col).casefold() == wanted.casefold():
+            return col
+    return None
+
+
+def read_constituents(content: bytes) -> pd.DataFrame:
+    """(Company Name, Symbol) rows of a constituents CSV, headers matched case-insensitively."""
+    df = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False, skipinitialspace=True)
+    company = _find_column(df.columns, COMPANY_COLUMN)
+    symbol = _find_column(df.columns, SYMBOL_COLUMN)
+    if company is None or symbol is None:
+        raise HTTPException(
+            status_code=502,
+            detail="CSV headers do not contain required 'Company Name' or 'Symbol' fields.",
+        )
+    df = df[[company, symbol]].set_axis([COMPANY_COLUMN, SYMBOL_COLUMN], axis=1)
+    df = df[(df[COMPANY_COLUMN].str.strip() != "") & (df[SYMBOL_COLUMN].str.strip() != "")]
+    return df.reset_index(drop=True)
+
+
+def fetch_constituents(index_symbol: str, url: str) -> pd.DataFrame:
+    try:
+        return fetch_frame(url, read_constituents)
+    except Timeout:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Timed out while fetching constituents for {index_symbol}. Please try again later."
+        )
+    except RequestException as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error fetching constituents for {index_symbol}: {e}"
+        )
+
+
+def load_close_prices(symbols: List[str], conn=None) -> Dict[str, float]:
+    if not symbols:
+        return {}
+    placeholders = ", ".join(["%s"] * len(symbols))
+    with db_session(conn) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            f"SELECT SYMBOL, CLOSE_PRICE FROM bhavcopy_data WHERE SYMBOL IN ({placeholders})",
+            tuple(symbols),
+        )
+        rows = cur.fetchall()
+        cur.close()
+    return {sym: float(price) for sym, price in rows if price is not None}
+
+
+def build_payload(index_symbol: str) -> IndexPayload:
+    df = fetch_constituents(index_symbol, get_index_url(index_symbol))
+    if df.empty:
+        raise HTTPException(status_code=502, detail="No stocks found in selected index.")
+    prices = load_close_prices(df[SYMBOL_COLUMN].unique().tolist())
+
+    body = {
+        "index_symbol": index_symbol,
+        "total_stocks": len(df),
+        "stocks": [
+            {"company_name": company, "symbol": sym, "close_price": prices.get(sym)}
+            for company, sym in zip(df[COMPANY_COLUMN], df[SYMBOL_COLUMN])
+        ],
+    }
+    return IndexPayload(json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+index_payloads = SnapshotStore(
+    build_payload,
+    ttl_seconds=CONSTITUENTS_TTL_SECONDS,
+    stale_seconds=CONSTITUENTS_STALE_SECONDS,
+)
+
+
+# ---------- HTTP caching ----------
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+# ---------- Endpoint ----------
+@app.get("/index_constituents")
+def index_constituents(symbol: str, request: Request) -> Response:
+    index_symbol = symbol.strip()
+    if not index_symbol:
+        raise HTTPException(status_code=400, detail="No index specified.")
+
+    try:
+        with stage("constituents"):
+            payload = index_payloads.get(index_symbol)
+    except HTTPException:
+        raise
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": f"private, max-age={int(CONSTITUENTS_TTL_SECONDS)}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+
+@app.get("/constituents_stats")
+def constituents_stats() -> Dict:
+    return index_payloads.stats()
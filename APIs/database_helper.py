@@ -18,12 +18,346 @@
 #         conn.close()
 
 # database_helper.py
-import mysql.connector
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# "mysql" (default) or "sqlite" for a local stand-in without a MySQL server
+DB_BACKEND = os.environ.get("PMS_DB_BACKEND", "mysql")
+SQLITE_PATH = os.environ.get("PMS_SQLITE_PATH", "pms_standin.sqlite3")
+
+DB_CONFIG = {
+    "host": "localhost",
+    "user": "root",
+    "password": "password",
+    "database": "portfolio_db_2",
+}
+
+# Pool: max open connections, how long a checkout may wait, and how long a
+# connection may sit idle before it is pinged again on checkout.
+DB_POOL_SIZE = int(os.environ.get("PMS_DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.environ.get("PMS_DB_POOL_TIMEOUT", "10"))
+DB_VALIDATE_AFTER = float(os.environ.get("PMS_DB_VALIDATE_AFTER", "1.0"))
+
+
+class PoolTimeout(Exception):
+    """No database connection became free within DB_POOL_TIMEOUT."""
+
+
+# ---------- SQLite stand-in (mysql.connector-shaped) ----------
+class SQLiteCursor:
+    """Accepts %s placeholders and returns dict rows for cursor(dictionary=True)."""
+
+    def __init__(self, cur: sqlite3.Cursor, dictionary: bool):
+        self._cur = cur
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cur.execute(sql.replace("%s", "?"), tuple(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cur.executemany(sql.replace("%s", "?"), [tuple(p) for p in seq_of_params])
+        return self
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cur.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cur.lastrowid
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def close(self):
+        self._cur.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path: str = SQLITE_PATH):
+        self._conn = sqlite3.connect(
+            path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            timeout=30,
+        )
+
+    def cursor(self, dictionary: bool = False):
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def ping(self, reconnect: bool = False):
+        self._conn.execute("SELECT 1")
+
+    def executescript(self, script: str):
+        self._conn.executescript(script)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def _connect():
+    if DB_BACKEND == "sqlite":
+        return SQLiteConnection(SQLITE_PATH)
+    import mysql.connector
+
+    return mysql.connector.connect(**DB_CONFIG)
+
+
+def is_sqlite() -> bool:
+    return DB_BACKEND == "sqlite"
+
+
+def table_columns(conn, table: str) -> list:
+    """Column names of `table`, or [] if it does not exist."""
+    cur = conn.cursor()
+    if is_sqlite():
+        cur.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cur.fetchall()]
+    else:
+        cur.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s
+            """,
+            (table,),
+        )
+        columns = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return columns
+
+
+# ---------- Connection pool ----------
+class PooledConnection:
+    """
+    Proxy around a pooled connection. close() rolls back anything left
+    uncommitted and hands the connection back instead of disconnecting.
+    """
+
+    def __init__(self, pool: "ConnectionPool", raw):
+        self._pool = pool
+        self._raw = raw
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.release(self._raw)
+
+
+class ConnectionPool:
+    def __init__(self, factory, size: int, timeout: float, validate_after: float):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self.checkouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def acquire(self) -> PooledConnection:
+        deadline = time.time() + self.timeout
+        while True:
+            try:
+                raw, returned_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._open < self.size
+                    if can_open:
+                        self._open += 1
+                if can_open:
+                    return self._wrap(self._create())
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolTimeout("Database is busy, please try again later.")
+                try:
+                    raw, returned_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+
+            if time.time() - returned_at < self.validate_after or self._is_alive(raw):
+                return self._wrap(raw)
+            self._discard(raw)
+
+    def release(self, raw) -> None:
+        try:
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        self._idle.put((raw, time.time()))
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "open": self._open,
+            "idle": self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "created": self.created,
+            "discarded": self.discarded,
+        }
+
+    # ---------- internals ----------
+    def _create(self):
+        try:
+            raw = self.factory()
+        except BaseException:
+            with self._lock:
+                self._open -= 1
+            raise
+        with self._lock:
+            self.created += 1
+        return raw
+
+    def _wrap(self, raw) -> PooledConnection:
+        with self._lock:
+            self.checkouts += 1
+        return PooledConnection(self, raw)
+
+    def _discard(self, raw) -> None:
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self.discarded += 1
+
+    @staticmethod
+    def _is_alive(raw) -> bool:
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+
+pool = ConnectionPool(_connect, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_VALIDATE_AFTER)
+
 
 def get_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="password",
-        database="portfolio_db_2",
-    )
+    """Pooled connection; conn.close() returns it to the pool."""
+    return pool.acquire()
+
+
+@contextmanager
+def db_session(conn=None):
+    """
+    Request-scoped connection:
+
+        with db_session() as conn:
+            check_30d_rule(user_id, portfolio_id, conn)
+            ...
+            conn.commit()
+
+    Uncommitted work is rolled back on exit. Passing an existing `conn`
+    reuses it (and leaves it open), so helpers can be called either way.
+    """
+    if conn is not None:
+        yield conn
+        return
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# ---------- Stand-in schema (SQLite) ----------
+SQLITE_STANDIN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE,
+    email TEXT,
+    password TEXT
+);
+CREATE TABLE IF NOT EXISTS indices (
+    symbol TEXT PRIMARY KEY,
+    url TEXT
+);
+CREATE TABLE IF NOT EXISTS portfolios (
+    portfolio_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    portfolio_name TEXT,
+    description TEXT,
+    created_by INTEGER,
+    index_symbol TEXT
+);
+CREATE TABLE IF NOT EXISTS user_portfolios (
+    user_portfolio_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    portfolio_id INTEGER NOT NULL,
+    total_invested REAL DEFAULT 0,
+    last_rebalanced_at TIMESTAMP NULL
+);
+CREATE TABLE IF NOT EXISTS portfolio_holdings (
+    holding_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    portfolio_id INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    company_name TEXT,
+    date_of_purchase TEXT,
+    buy_price REAL,
+    current_price REAL,
+    quantity INTEGER,
+    invested_amount REAL,
+    current_value REAL,
+    pl_amount REAL,
+    pl_percent REAL
+);
+CREATE INDEX IF NOT EXISTS idx_holdings_portfolio ON portfolio_holdings (portfolio_id);
+CREATE TABLE IF NOT EXISTS portfolio_transactions (
+    txn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    portfolio_id INTEGER,
+    user_id INTEGER,
+    symbol TEXT,
+    txn_type TEXT,
+    quantity INTEGER,
+    price REAL,
+    amount REAL,
+    before_quantity INTEGER,
+    after_quantity INTEGER,
+    before_invested REAL,
+    after_invested REAL,
+    reason TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS bhavcopy_data (
+    SYMBOL TEXT PRIMARY KEY,
+    CLOSE_PRICE REAL
+);
+"""
+
+
+def create_standin_schema(conn=None) -> None:
+    """Create the tables the APIs use in the SQLite stand-in database."""
+    with db_session(conn) as conn:
+        conn.executescript(SQLITE_STANDIN_SCHEMA)
+        conn.commit()
@@ -0,0 +1,95 @@
+# download_watcher.py
+import os
+import threading
+import time
+from typing import Optional
+
+try:  # optional: inotify/FSEvents based detection
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - fallback below is used instead
+    Observer = None
+    FileSystemEventHandler = object
+
+# Chrome writes "<name>.crdownload" and renames it when the file is closed.
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".tmp")
+
+
+def _is_finished(path: str, suffix: str) -> bool:
+    name = os.path.basename(path).lower()
+    return name.endswith(suffix) and not name.endswith(PARTIAL_SUFFIXES)
+
+
+def _find_finished(directory: str, suffix: str) -> Optional[str]:
+    for f in os.listdir(directory):
+        if _is_finished(f, suffix):
+            return os.path.join(directory, f)
+    return None
+
+
+class _DownloadHandler(FileSystemEventHandler):
+    def __init__(self, suffix: str):
+        self.suffix = suffix
+        self.path: Optional[str] = None
+        self.done = threading.Event()
+
+    def _found(self, path: str):
+        if _is_finished(path, self.suffix):
+            self.path = path
+            self.done.set()
+
+    # rename .crdownload -> .csv is the normal completion signal
+    def on_moved(self, event):
+        self._found(event.dest_path)
+
+    # some writers create the final name directly and close it
+    def on_closed(self, event):
+        self._found(event.src_path)
+
+
+def _wait_with_events(directory: str, suffix: str, timeout: float) -> str:
+    handler = _DownloadHandler(suffix)
+    observer = Observer()
+    observer.schedule(handler, directory, recursive=False)
+    observer.start()
+    try:
+        # the download may have finished before the observer was running
+        path = _find_finished(directory, suffix)
+        if path:
+            return path
+        if handler.done.wait(timeout):
+            return handler.path or ""
+        return ""
+    finally:
+        observer.stop()
+        observer.join(timeout=1)
+
+
+def _wait_for_stable_size(
+    directory: str, suffix: str, timeout: float, interval: float = 0.05
+) -> str:
+    """Fallback: accept a finished file once its size stops changing."""
+    end = time.time() + timeout
+    last_path, last_size = None, -1
+    while time.time() < end:
+        path = _find_finished(directory, suffix)
+        if path:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = -1
+            if path == last_path and size == last_size and size > 0:
+                return path
+            last_path, last_size = path, size
+        time.sleep(interval)
+    return ""
+
+
+def wait_for_download(directory: str, suffix: str = ".csv", timeout: float = 20) -> str:
+    """
+    Block until a completed `suffix` file appears in `directory` (which should
+    belong to a single download) and return its path, or "" on timeout.
+    """
+    if Observer is not None:
+        return _wait_with_events(directory, suffix, timeout)
+    return _wait_for_stable_size(directory, suffix, timeout)
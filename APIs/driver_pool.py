@@ -0,0 +1,140 @@
+# driver_pool.py
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+
+class PoolExhausted(Exception):
+    """No driver became free within the checkout timeout."""
+
+
+class PooledDriver:
+    __slots__ = ("driver", "slot", "uses")
+
+    def __init__(self, driver: Any, slot: int):
+        self.driver = driver
+        self.slot = slot
+        self.uses = 0
+
+
+class DriverPool:
+    """
+    Bounded pool of browser drivers.
+
+    - Drivers are created lazily, at most `size` at a time; `factory(slot)`
+      builds one (slot is a stable 0..size-1 number, handy for per-driver dirs).
+    - checkout() health-checks the driver and replaces it if it is dead.
+    - checkin() recycles a driver after `max_uses` scrapes or when the caller
+      reports it broken (crash, WebDriverException, ...).
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[int], Any],
+        size: int = 2,
+        max_uses: int = 50,
+        health_check: Optional[Callable[[Any], bool]] = None,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self.health_check = health_check or _default_health_check
+        self._idle: List[PooledDriver] = []
+        self._free_slots = list(range(size))
+        self._cond = threading.Condition()
+        self.created = 0
+        self.recycled = 0
+
+    def checkout(self, timeout: Optional[float] = None) -> PooledDriver:
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._idle or self._free_slots, timeout=timeout
+            ):
+                raise PoolExhausted("No browser available, try again later")
+            if self._idle:
+                item = self._idle.pop()
+            else:
+                item = None
+                slot = self._free_slots.pop(0)
+
+        # slow work (launch / health check) outside the lock
+        if item is None:
+            return self._create(slot)
+
+        if self.health_check(item.driver):
+            return item
+        self._quit(item)
+        return self._create(item.slot)
+
+    def checkin(self, item: PooledDriver, broken: bool = False) -> None:
+        item.uses += 1
+        if broken or item.uses >= self.max_uses:
+            self._quit(item)
+            with self._cond:
+                self.recycled += 1
+                self._free_slots.append(item.slot)
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(item)
+            self._cond.notify()
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None, is_broken=None):
+        """
+        with pool.lease() as item: ...  — checks the driver back in afterwards;
+        `is_broken(exc)` decides whether an exception should recycle it.
+        """
+        item = self.checkout(timeout=timeout)
+        try:
+            yield item
+        except BaseException as e:
+            self.checkin(item, broken=is_broken(e) if is_broken else True)
+            raise
+        self.checkin(item)
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._quit(item)
+            with self._cond:
+                self._free_slots.append(item.slot)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self.size - len(self._idle) - len(self._free_slots),
+                "created": self.created,
+                "recycled": self.recycled,
+            }
+
+    # ---------- internals ----------
+    def _create(self, slot: int) -> PooledDriver:
+        try:
+            driver = self.factory(slot)
+        except BaseException:
+            with self._cond:
+                self._free_slots.append(slot)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created += 1
+        return PooledDriver(driver, slot)
+
+    @staticmethod
+    def _quit(item: PooledDriver) -> None:
+        try:
+            item.driver.quit()
+        except Exception:
+            pass
+
+
+def _default_health_check(driver: Any) -> bool:
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
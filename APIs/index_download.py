@@ -0,0 +1,264 @@
+# index_download.py
+"""
+Download layer for index CSVs (market-watch and constituents files).
+
+- One pooled requests.Session per process (keep-alive, gzip/deflate).
+- Connection errors, timeouts and 429/5xx replies are retried with
+  exponential backoff and full jitter.
+- Every body is kept on disk, content-addressed:
+
+      <PMS_DOWNLOAD_CACHE_DIR>/blobs/<sha256>.csv
+      <PMS_DOWNLOAD_CACHE_DIR>/meta/<sha256 of url>.json   (etag, last_modified, sha256)
+
+  and later downloads of the same URL send If-None-Match / If-Modified-Since;
+  a 304 is answered from the blob. When a URL's content changes, the blob it
+  pointed to is deleted unless another URL's meta still names it, so the
+  cache holds one blob per URL at most.
+- Parsed frames are kept in memory by (content hash, parser), so a file that
+  has not changed is not parsed again. The frames are shared between
+  callers: treat them as read-only.
+
+Errors are requests exceptions (Timeout, ConnectionError, HTTPError); callers
+map them to HTTP statuses as before.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+DOWNLOAD_CACHE_DIR = os.path.abspath(os.environ.get("PMS_DOWNLOAD_CACHE_DIR", "index_csv_cache"))
+DOWNLOAD_TIMEOUT = float(os.environ.get("PMS_DOWNLOAD_TIMEOUT", "20"))
+
+# attempts after the first one, and the backoff window (seconds) that
+# doubles per attempt; the actual sleep is uniform in [0, window]
+DOWNLOAD_RETRIES = int(os.environ.get("PMS_DOWNLOAD_RETRIES", "2"))
+DOWNLOAD_BACKOFF = float(os.environ.get("PMS_DOWNLOAD_BACKOFF", "0.5"))
+DOWNLOAD_BACKOFF_MAX = float(os.environ.get("PMS_DOWNLOAD_BACKOFF_MAX", "8"))
+DOWNLOAD_POOL_SIZE = int(os.environ.get("PMS_DOWNLOAD_POOL_SIZE", "10"))
+PARSED_FRAMES_MAX = int(os.environ.get("PMS_PARSED_FRAMES_MAX", "32"))
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+logger = logging.getLogger(__name__)
+
+
+class Download:
+    __slots__ = ("url", "content", "sha256", "status")
+
+    def __init__(self, url: str, content: bytes, sha256: str, status: int):
+        self.url = url
+        self.content = content
+        self.sha256 = sha256
+        # 200: new body from the server, 304: revalidated cached body
+        self.status = status
+
+
+_lock = threading.Lock()
+_stats = {"downloaded": 0, "not_modified": 0, "retries": 0, "parsed": 0, "reused": 0}
+
+
+def _count(name: str) -> None:
+    with _lock:
+        _stats[name] += 1
+
+
+# ---------- session ----------
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_POOL_SIZE, pool_maxsize=DOWNLOAD_POOL_SIZE)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["Accept-Encoding"] = "gzip, deflate"
+            _session = s
+        return _session
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(DOWNLOAD_BACKOFF_MAX, DOWNLOAD_BACKOFF * 2 ** attempt))
+
+
+def get_with_retries(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = DOWNLOAD_TIMEOUT,
+    retries: int = DOWNLOAD_RETRIES,
+) -> requests.Response:
+    """GET with retries; the last attempt's exception or response is what the caller sees."""
+    session = get_session()
+    for attempt in range(retries + 1):
+        try:
+            r = session.get(url, headers=headers, timeout=timeout)
+        except (ConnectionError, Timeout):
+            if attempt == retries:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUSES or attempt == retries:
+                return r
+            r.close()
+        _count("retries")
+        time.sleep(backoff_delay(attempt))
+    raise AssertionError("unreachable")
+
+
+# ---------- on-disk cache ----------
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class DownloadCache:
+    def __init__(self, root: str = DOWNLOAD_CACHE_DIR):
+        self.root = root
+
+    def _meta_path(self, url: str) -> str:
+        return os.path.join(self.root, "meta", _sha256(url.encode("utf-8")) + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest + ".csv")
+
+    def lookup(self, url: str) -> Optional[Dict[str, Any]]:
+        """Validators and hash of the cached body for url, if the body is still on disk."""
+        meta = self._read_meta(self._meta_path(url))
+        if meta is None:
+            return None
+        if not os.path.exists(self._blob_path(meta.get("sha256", ""))):
+            return None
+        return meta
+
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        return content if _sha256(content) == digest else None
+
+    def _read_meta(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, url: str, content: bytes, etag: Optional[str], last_modified: Optional[str]) -> str:
+        digest = _sha256(content)
+        blob = self._blob_path(digest)
+        if not os.path.exists(blob):
+            _write_atomic(blob, content)
+        previous = self._read_meta(self._meta_path(url))
+        meta = {"url": url, "sha256": digest, "etag": etag, "last_modified": last_modified}
+        _write_atomic(self._meta_path(url), json.dumps(meta).encode("utf-8"))
+        if previous and previous.get("sha256") not in (None, digest):
+            self._prune_blob(previous["sha256"])
+        return digest
+
+    def _prune_blob(self, digest: str) -> None:
+        """Delete a blob no meta points to any more (one meta file per cached URL)."""
+        meta_dir = os.path.join(self.root, "meta")
+        for name in os.listdir(meta_dir):
+            if name.endswith(".json"):
+                other = self._read_meta(os.path.join(meta_dir, name))
+                if other and other.get("sha256") == digest:
+                    return
+        try:
+            # a reader that loses the race gets None from read() and downloads again
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
+
+
+default_cache = DownloadCache()
+
+
+def download(url: str, cache: DownloadCache = None, timeout: float = DOWNLOAD_TIMEOUT) -> Download:
+    """Fetch url, revalidating against the on-disk copy when there is one."""
+    cache = cache or default_cache
+    meta = cache.lookup(url)
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = get_with_retries(url, headers=headers, timeout=timeout)
+    if r.status_code == 304 and meta is not None:
+        content = cache.read(meta["sha256"])
+        if content is not None:
+            _count("not_modified")
+            return Download(url, content, meta["sha256"], 304)
+        # blob vanished or is corrupt: fetch the body again
+        r = get_with_retries(url, timeout=timeout)
+
+    r.raise_for_status()
+    content = r.content
+    try:
+        digest = cache.store(url, content, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+    except OSError as e:
+        # the body is still returned; the next download just cannot revalidate
+        logger.warning("could not cache %s: %s", url, e)
+        digest = _sha256(content)
+    _count("downloaded")
+    return Download(url, content, digest, 200)
+
+
+# ---------- parsed frames ----------
+_frames: "OrderedDict[tuple, Any]" = OrderedDict()
+
+
+def fetch_frame(url: str, parse: Callable[[bytes], Any], cache: DownloadCache = None) -> Any:
+    """
+    download(url) then parse(content), reusing the frame parsed from the
+    same bytes (by hash) by the same parser when there is one.
+    """
+    dl = download(url, cache)
+    key = (dl.sha256, parse)
+    with _lock:
+        frame = _frames.get(key)
+        if frame is not None:
+            _frames.move_to_end(key)
+            _stats["reused"] += 1
+            return frame
+
+    frame = parse(dl.content)
+    with _lock:
+        _frames[key] = frame
+        _frames.move_to_end(key)
+        while len(_frames) > PARSED_FRAMES_MAX:
+            _frames.popitem(last=False)
+        _stats["parsed"] += 1
+    return frame
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {**_stats, "frames": len(_frames)}
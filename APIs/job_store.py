@@ -0,0 +1,271 @@
+# job_store.py
+"""
+Submit/poll jobs for work that is too slow to hold an HTTP request open
+(a cold index scrape can take a minute).
+
+    job, reused = jobs.submit(key, params, run)   # returns at once
+    jobs.get(job.job_id)                          # state, stage, progress, result
+
+run(params, report) executes on a small thread pool and calls
+report(stage, progress) as it goes. Jobs are deduplicated by key: a submit
+while the same key is queued or running, or within reuse_seconds of it
+finishing successfully, gets the existing job back instead of a new one.
+
+Finished jobs (done or failed) go to a bounded LRU result store, in memory
+(MemoryResults) or in a local SQLite file (SQLiteResults), so polls keep
+working after the job has left the pool and, with SQLite, across restarts.
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+Report = Callable[[str, float], None]
+
+
+class Job:
+    __slots__ = (
+        "job_id", "key", "params", "state", "stage", "progress",
+        "result", "error", "status_code", "submitted_at", "finished_at",
+    )
+
+    def __init__(self, key: str, params: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.state = QUEUED
+        self.stage = QUEUED
+        self.progress = 0.0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.submitted_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# ---------- result backends ----------
+class MemoryResults:
+    """LRU of finished job records (dicts), at most max_entries."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._latest_done: Dict[str, str] = {}  # key -> job_id
+        self._lock = threading.Lock()
+
+    def put(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records[record["job_id"]] = record
+            self._records.move_to_end(record["job_id"])
+            if record["state"] == DONE:
+                self._latest_done[record["key"]] = record["job_id"]
+            while len(self._records) > self.max_entries:
+                _, old = self._records.popitem(last=False)
+                if self._latest_done.get(old["key"]) == old["job_id"]:
+                    del self._latest_done[old["key"]]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is not None:
+                self._records.move_to_end(job_id)
+            return record
+
+    def latest_done(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job_id = self._latest_done.get(key)
+        return self.get(job_id) if job_id else None
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+
+class SQLiteResults:
+    """Same interface as MemoryResults, kept in a local SQLite file."""
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT PRIMARY KEY,
+            job_key TEXT NOT NULL,
+            state TEXT NOT NULL,
+            finished_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            record TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_job_results_key ON job_results (job_key, state, finished_at)",
+        "CREATE INDEX IF NOT EXISTS idx_job_results_used ON job_results (last_used)",
+    ]
+
+    def __init__(self, path: str, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in self.SCHEMA:
+            self._conn.execute(stmt)
+        self._lock = threading.Lock()
+
+    def put(self, record: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_results "
+                "(job_id, job_key, state, finished_at, last_used, record) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    record["job_id"], record["key"], record["state"],
+                    record["finished_at"] or now, now, json.dumps(record, default=str),
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM job_results WHERE job_id IN ("
+                " SELECT job_id FROM job_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.execute("COMMIT")
+
+    def _touch(self, row) -> Optional[Dict[str, Any]]:
+        # caller must hold self._lock
+        if row is None:
+            return None
+        self._conn.execute(
+            "UPDATE job_results SET last_used = ? WHERE job_id = ?", (time.time(), row[0])
+        )
+        return json.loads(row[1])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, record FROM job_results WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            return self._touch(row)
+
+    def latest_done(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, record FROM job_results WHERE job_key = ? AND state = ? "
+                "ORDER BY finished_at DESC LIMIT 1",
+                (key, DONE),
+            ).fetchone()
+            return self._touch(row)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM job_results").fetchone()[0]
+
+
+# ---------- job store ----------
+class JobStore:
+    def __init__(
+        self,
+        results,
+        workers: int = 4,
+        reuse_seconds: float = 300.0,
+    ):
+        self.results = results
+        self.reuse_seconds = reuse_seconds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._active: Dict[str, Job] = {}  # key -> queued/running job
+        self._active_ids: Dict[str, Job] = {}  # job_id -> same jobs
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.reused = 0
+        self.completed = 0
+        self.failed = 0
+
+    # ---------- public API ----------
+    def submit(
+        self,
+        key: str,
+        params: Dict[str, Any],
+        run: Callable[[Dict[str, Any], Report], Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """The job for key (new or reused) as a record, and whether it was reused."""
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                self.reused += 1
+                return job.to_dict(), True
+
+            done = self.results.latest_done(key)
+            if done is not None and time.time() - done["finished_at"] < self.reuse_seconds:
+                self.reused += 1
+                return done, True
+
+            job = Job(key, params)
+            self._active[key] = job
+            self._active_ids[job.job_id] = job
+            self.submitted += 1
+        self._pool.submit(self._run, job, run)
+        return job.to_dict(), False
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._active_ids.get(job_id)
+            if job is not None:
+                return job.to_dict()
+        return self.results.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = list(self._active.values())
+            counts = {
+                "submitted": self.submitted,
+                "reused": self.reused,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+        return {
+            **counts,
+            "queued": sum(j.state == QUEUED for j in active),
+            "running": sum(j.state == RUNNING for j in active),
+            "stored_results": len(self.results),
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- internals ----------
+    def _run(self, job: Job, run: Callable[[Dict[str, Any], Report], Dict[str, Any]]) -> None:
+        def report(stage: str, progress: float) -> None:
+            job.stage = stage
+            job.progress = round(progress, 3)
+
+        job.state = RUNNING
+        try:
+            job.result = run(job.params, report)
+        except BaseException as e:
+            # HTTPException-style errors keep their status and detail
+            job.state = FAILED
+            job.status_code = getattr(e, "status_code", 500)
+            job.error = str(getattr(e, "detail", None) or e)
+        else:
+            job.state = DONE
+            job.stage = DONE
+            job.progress = 1.0
+        job.finished_at = time.time()
+
+        # stored before it leaves _active, so a poll never misses it
+        self.results.put(job.to_dict())
+        with self._lock:
+            self._active.pop(job.key, None)
+            self._active_ids.pop(job.job_id, None)
+            if job.state == DONE:
+                self.completed += 1
+            else:
+                self.failed += 1
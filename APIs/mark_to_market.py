@@ -0,0 +1,315 @@
+# mark_to_market.py
+"""
+Revalue portfolio_holdings (current_price, current_value, pl_amount,
+pl_percent) from the latest prices.
+
+Prices come from bhavcopy_data (default) or from the NSE index CSVs of the
+indices that portfolios track. They are staged, and only symbols whose
+price actually changed are stamped in latest_prices. Holdings are then
+revalued with one set-based UPDATE ... JOIN. A watermark (time of the last
+run + highest holding_id seen) limits that UPDATE to holdings whose price
+changed since the previous run or that were inserted after it.
+
+    python mark_to_market.py
+    python mark_to_market.py --source index
+
+Suitable for cron after the bhavcopy load, e.g.:  30 19 * * 1-5  cd /path/APIs && python mark_to_market.py
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from fastapi import HTTPException
+
+from database_helper import db_session, is_sqlite
+from nse_csv import LTP, SYMBOL
+from migrate import check_schema
+from portfolio_summary import refresh_summaries
+
+JOB_NAME = "mark_to_market"
+EPOCH = datetime(1970, 1, 1)
+
+MTM_SCHEMA_MYSQL = [
+    """
+    CREATE TABLE IF NOT EXISTS latest_prices (
+        symbol VARCHAR(64) PRIMARY KEY,
+        close_price DECIMAL(14, 2) NOT NULL,
+        price_date DATE NULL,
+        updated_at DATETIME NOT NULL,
+        KEY idx_latest_prices_updated (updated_at)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS job_watermarks (
+        job_name VARCHAR(64) PRIMARY KEY,
+        last_run_at DATETIME NOT NULL,
+        last_holding_id BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TEMPORARY TABLE IF NOT EXISTS mtm_price_stage (
+        symbol VARCHAR(64) PRIMARY KEY,
+        close_price DECIMAL(14, 2) NOT NULL
+    )
+    """,
+]
+
+MTM_SCHEMA_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS latest_prices (
+        symbol TEXT PRIMARY KEY,
+        close_price REAL NOT NULL,
+        price_date TEXT NULL,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_latest_prices_updated ON latest_prices (updated_at)",
+    """
+    CREATE TABLE IF NOT EXISTS job_watermarks (
+        job_name TEXT PRIMARY KEY,
+        last_run_at TIMESTAMP NOT NULL,
+        last_holding_id INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TEMPORARY TABLE IF NOT EXISTS mtm_price_stage (
+        symbol TEXT PRIMARY KEY,
+        close_price REAL NOT NULL
+    )
+    """,
+]
+
+# ---------- set-based statements (MySQL UPDATE ... JOIN / SQLite UPDATE ... FROM) ----------
+# Every SET expression reads lp.close_price, never a column assigned in the
+# same statement, so MySQL's multi-table assignment order does not matter.
+REVALUE_SQL_MYSQL = """
+    UPDATE portfolio_holdings ph
+    JOIN latest_prices lp ON lp.symbol = ph.symbol
+    SET ph.current_price = lp.close_price,
+        ph.current_value = ROUND(ph.quantity * lp.close_price, 2),
+        ph.pl_amount = ROUND(ph.quantity * lp.close_price - ph.invested_amount, 2),
+        ph.pl_percent = CASE WHEN ph.invested_amount > 0
+            THEN ROUND((ph.quantity * lp.close_price - ph.invested_amount) / ph.invested_amount * 100, 2)
+            ELSE 0 END
+    WHERE lp.updated_at > %s OR ph.holding_id > %s
+"""
+
+REVALUE_SQL_SQLITE = """
+    UPDATE portfolio_holdings
+    SET current_price = lp.close_price,
+        current_value = ROUND(quantity * lp.close_price, 2),
+        pl_amount = ROUND(quantity * lp.close_price - invested_amount, 2),
+        pl_percent = CASE WHEN invested_amount > 0
+            THEN ROUND((quantity * lp.close_price - invested_amount) / invested_amount * 100, 2)
+            ELSE 0 END
+    FROM latest_prices lp
+    WHERE lp.symbol = portfolio_holdings.symbol
+      AND (lp.updated_at > %s OR portfolio_holdings.holding_id > %s)
+"""
+
+CHANGED_PRICES_SQL_MYSQL = """
+    UPDATE latest_prices lp
+    JOIN mtm_price_stage s ON s.symbol = lp.symbol
+    SET lp.close_price = s.close_price, lp.price_date = %s, lp.updated_at = %s
+    WHERE lp.close_price <> s.close_price
+"""
+
+CHANGED_PRICES_SQL_SQLITE = """
+    UPDATE latest_prices
+    SET close_price = s.close_price, price_date = %s, updated_at = %s
+    FROM mtm_price_stage s
+    WHERE s.symbol = latest_prices.symbol AND latest_prices.close_price <> s.close_price
+"""
+
+NEW_PRICES_SQL = """
+    INSERT INTO latest_prices (symbol, close_price, price_date, updated_at)
+    SELECT s.symbol, s.close_price, %s, %s
+    FROM mtm_price_stage s
+    LEFT JOIN latest_prices lp ON lp.symbol = s.symbol
+    WHERE lp.symbol IS NULL
+"""
+
+# portfolios the revaluation below is about to touch (for the summary tables)
+REVALUED_PORTFOLIOS_SQL = """
+    SELECT DISTINCT ph.portfolio_id
+    FROM portfolio_holdings ph
+    JOIN latest_prices lp ON lp.symbol = ph.symbol
+    WHERE lp.updated_at > %s OR ph.holding_id > %s
+"""
+
+
+def create_mtm_tables(conn) -> None:
+    cur = conn.cursor()
+    for stmt in MTM_SCHEMA_SQLITE if is_sqlite() else MTM_SCHEMA_MYSQL:
+        cur.execute(stmt)
+    cur.close()
+
+
+# ---------- price sources ----------
+def held_symbols(conn) -> set:
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT symbol FROM portfolio_holdings")
+    symbols = {row[0] for row in cur.fetchall()}
+    cur.close()
+    return symbols
+
+
+def prices_from_bhavcopy(conn) -> Dict[str, float]:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT SYMBOL, CLOSE_PRICE FROM bhavcopy_data
+        WHERE SYMBOL IN (SELECT DISTINCT symbol FROM portfolio_holdings)
+          AND CLOSE_PRICE > 0
+        """
+    )
+    prices = {sym: float(price) for sym, price in cur.fetchall()}
+    cur.close()
+    return prices
+
+
+def prices_from_index_csvs(conn) -> Dict[str, float]:
+    """LTP of every held symbol, one index CSV download per tracked index."""
+    from rebalance_api import fetch_index_csv
+
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT DISTINCT i.symbol, i.url
+        FROM portfolios p
+        JOIN indices i ON p.index_symbol = i.symbol
+        """
+    )
+    indices = cur.fetchall()
+    cur.close()
+
+    wanted = held_symbols(conn)
+    prices: Dict[str, float] = {}
+    for index_symbol, url in indices:
+        df = fetch_index_csv(index_symbol, url)
+        df = df[df[SYMBOL].isin(wanted) & (df[LTP] > 0)]
+        prices.update(zip(df[SYMBOL], df[LTP].astype(float)))
+    return prices
+
+
+PRICE_SOURCES = {
+    "bhavcopy": prices_from_bhavcopy,
+    "index": prices_from_index_csvs,
+}
+
+
+# ---------- job ----------
+def read_watermark(cur) -> Tuple[datetime, int]:
+    cur.execute(
+        "SELECT last_run_at, last_holding_id FROM job_watermarks WHERE job_name = %s",
+        (JOB_NAME,),
+    )
+    row = cur.fetchone()
+    if row is None:
+        return EPOCH, 0
+    last_run_at = row[0]
+    if isinstance(last_run_at, str):
+        last_run_at = datetime.fromisoformat(last_run_at)
+    return last_run_at, int(row[1])
+
+
+def write_watermark(cur, run_at: datetime, last_holding_id: int) -> None:
+    cur.execute("DELETE FROM job_watermarks WHERE job_name = %s", (JOB_NAME,))
+    cur.execute(
+        "INSERT INTO job_watermarks (job_name, last_run_at, last_holding_id) VALUES (%s, %s, %s)",
+        (JOB_NAME, run_at, last_holding_id),
+    )
+
+
+def stage_prices(cur, prices: Dict[str, float]) -> None:
+    cur.execute("DELETE FROM mtm_price_stage")
+    if prices:
+        cur.executemany(
+            "INSERT INTO mtm_price_stage (symbol, close_price) VALUES (%s, %s)",
+            [(sym, round(price, 2)) for sym, price in prices.items()],
+        )
+
+
+def run_mark_to_market(
+    source: str = "bhavcopy", full: bool = False, conn=None
+) -> Dict[str, Any]:
+    """
+    Revalue holdings whose price changed since the last run (or every
+    holding with `full`). Price refresh, revaluation and the watermark are
+    committed together, so a failed run is simply repeated next time.
+    """
+    started = time.perf_counter()
+    load_prices = PRICE_SOURCES[source]
+    sqlite = is_sqlite()
+
+    with db_session(conn) as conn:
+        check_schema(conn)
+        create_mtm_tables(conn)
+        prices = load_prices(conn)
+
+        run_at = datetime.utcnow()
+        price_date = run_at.date().isoformat()
+        cur = conn.cursor()
+        try:
+            since, since_holding_id = (EPOCH, 0) if full else read_watermark(cur)
+
+            stage_prices(cur, prices)
+            cur.execute(
+                CHANGED_PRICES_SQL_SQLITE if sqlite else CHANGED_PRICES_SQL_MYSQL,
+                (price_date, run_at),
+            )
+            changed = max(cur.rowcount, 0)
+            cur.execute(NEW_PRICES_SQL, (price_date, run_at))
+            changed += max(cur.rowcount, 0)
+
+            cur.execute(REVALUED_PORTFOLIOS_SQL, (since, since_holding_id))
+            portfolio_ids = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                REVALUE_SQL_SQLITE if sqlite else REVALUE_SQL_MYSQL,
+                (since, since_holding_id),
+            )
+            revalued = max(cur.rowcount, 0)
+            refresh_summaries(cur, portfolio_ids)
+
+            cur.execute("SELECT COALESCE(MAX(holding_id), 0) FROM portfolio_holdings")
+            last_holding_id = int(cur.fetchone()[0])
+            write_watermark(cur, run_at, max(last_holding_id, since_holding_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    return {
+        "source": source,
+        "prices": len(prices),
+        "prices_changed": changed,
+        "holdings_revalued": revalued,
+        "portfolios_revalued": len(portfolio_ids),
+        "since": since.isoformat(sep=" "),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Revalue portfolio holdings at the latest prices.")
+    parser.add_argument("--source", choices=sorted(PRICE_SOURCES), default="bhavcopy",
+                        help="where to read prices from")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the watermark and revalue every holding")
+    args = parser.parse_args()
+
+    try:
+        stats = run_mark_to_market(source=args.source, full=args.full)
+    except HTTPException as e:
+        raise SystemExit(f"ERROR {e.detail}")
+    print(
+        f"source={stats['source']} prices={stats['prices']} changed={stats['prices_changed']} "
+        f"revalued={stats['holdings_revalued']} portfolios={stats['portfolios_revalued']} since='{stats['since']}' time={stats['seconds']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# metrics.py
+"""
+In-process request and stage metrics for the FastAPI apps, exposed in the
+Prometheus text format.
+
+    with stage("page_load"):
+        d.get(url)
+
+records the duration in pms_stage_seconds{stage="page_load"} and, inside a
+request, adds "page_load;dur=812.4" to that response's Server-Timing header.
+install(app, "portfolio_api") adds the middleware (request histogram,
+counter and in-flight gauge) and GET /metrics.
+
+Values that other objects already keep (cache hits, driver restarts, queue
+depth) are read when /metrics is scraped, via register_collector(), instead
+of being counted twice. Recording is a perf_counter pair, a bisect and a
+short lock, so it stays on in production; PMS_METRICS_ENABLED=0 turns the
+stage timers into no-ops.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+
+METRICS_ENABLED = os.environ.get("PMS_METRICS_ENABLED", "1") == "1"
+
+logger = logging.getLogger(__name__)
+
+# seconds; stages range from sub-millisecond parses to 60 s browser waits
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (name, type, help, labels, value) as returned by collectors
+Sample = Tuple[str, str, str, Dict[str, Any], float]
+
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "pms_server_timing", default=None
+)
+
+
+def _label_str(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------- metric types ----------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count per bucket (non-cumulative, +Inf last), sum, count]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v[0]), v[1], v[2]) for k, v in self._values.items()]
+        out = []
+        for key, counts, total, n in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = f'le="{_fmt(float(bound))}"'
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+            labels = _label_str(self.labelnames, key)
+            out.append(f"{self.name}_sum{labels} {_fmt(total)}")
+            out.append(f"{self.name}_count{labels} {n}")
+        return out
+
+
+# ---------- registry ----------
+_metrics: List[Any] = []
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+
+def _register(metric):
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(fn: Callable[[], Iterable[Sample]]) -> None:
+    """fn() is called on every /metrics scrape and returns Sample tuples."""
+    _collectors.append(fn)
+
+
+def render() -> str:
+    lines = []
+    for m in _metrics:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        lines.extend(m.samples())
+
+    grouped: Dict[str, Tuple[str, str, List[str]]] = {}
+    for fn in _collectors:
+        try:
+            samples = list(fn())
+        except Exception:  # a broken collector must not break /metrics
+            logger.exception("collector %s failed", getattr(fn, "__name__", fn))
+            continue
+        for name, kind, help, labels, value in samples:
+            entry = grouped.setdefault(name, (kind, help, []))
+            entry[2].append(f"{name}{_label_str(list(labels), list(labels.values()))} {_fmt(value)}")
+    for name, (kind, help, samples) in grouped.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = _register(Histogram(
+    "pms_stage_seconds", "Time spent in a named stage of a request or job.", ["stage"]
+))
+REQUEST_SECONDS = _register(Histogram(
+    "pms_http_request_seconds", "HTTP request latency.", ["app", "route"]
+))
+REQUESTS_TOTAL = _register(Counter(
+    "pms_http_requests_total", "HTTP requests by status.", ["app", "route", "method", "status"]
+))
+REQUESTS_IN_FLIGHT = _register(Gauge(
+    "pms_http_requests_in_flight", "HTTP requests being served.", ["app"]
+))
+
+
+# ---------- stage timing ----------
+@contextmanager
+def stage(name: str):
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def timed(name: str, fn: Callable, *args, **kwargs):
+    """fn(*args, **kwargs) inside stage(name); handy for asyncio.to_thread."""
+    with stage(name):
+        return fn(*args, **kwargs)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# ---------- ASGI middleware + endpoint ----------
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task per request): times the
+    request, tracks in-flight requests and adds Server-Timing to the response.
+    """
+
+    def __init__(self, app, app_name: str):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = server_timing(timings, time.perf_counter() - started)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", header.encode("latin-1")),
+                ]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(app=self.app_name)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(app=self.app_name)
+            _timings.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, app=self.app_name, route=route)
+            REQUESTS_TOTAL.inc(
+                app=self.app_name, route=route, method=scope["method"], status=status[0]
+            )
+
+
+def install(app: FastAPI, app_name: str) -> None:
+    app.add_middleware(MetricsMiddleware, app_name=app_name)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics_endpoint():
+        return PlainTextResponse(render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,76 @@
+# migrate.py
+"""
+Schema migration for the tables the APIs and jobs add to the database:
+  - portfolio_summaries / user_summaries (portfolio_summary.py), backfilled
+    from portfolio_holdings;
+  - rebalance_ledger and portfolio_transactions.rebalance_id
+    (trade_ledger.py), backfilled from the older portfolio_transactions.
+
+DDL runs here, once per deploy, not when a service starts: it commits
+implicitly on MySQL and needs ALTER rights the services should not have.
+The services and jobs call check_schema() instead and refuse to run
+against a database this has not been run on.
+
+    python migrate.py            # create what is missing, then backfill (safe to re-run)
+    python migrate.py --check    # exit status 1 if anything is missing
+"""
+import argparse
+import sys
+from typing import Any, Dict, List
+
+from database_helper import db_session, table_columns
+from portfolio_summary import SUMMARY_COLUMNS, create_summary_tables, rebuild_all_summaries
+from trade_ledger import LEDGER_TABLE_COLUMNS, backfill_ledger, create_ledger_tables
+
+REQUIRED_COLUMNS = {**SUMMARY_COLUMNS, **LEDGER_TABLE_COLUMNS}
+
+
+def missing_schema(conn=None) -> List[str]:
+    """Tables, and columns of existing tables, that migrate() would add."""
+    missing = []
+    with db_session(conn) as conn:
+        for table, columns in REQUIRED_COLUMNS.items():
+            present = table_columns(conn, table)
+            if not present:
+                missing.append(table)
+            else:
+                missing += [f"{table}.{c}" for c in columns if c not in present]
+    return missing
+
+
+def check_schema(conn=None) -> None:
+    missing = missing_schema(conn)
+    if missing:
+        raise RuntimeError(
+            f"database schema is not migrated (missing {', '.join(missing)}); run `python migrate.py`"
+        )
+
+
+def migrate(conn=None) -> Dict[str, Any]:
+    with db_session(conn) as conn:
+        create_summary_tables(conn)
+        create_ledger_tables(conn)
+        ledger = backfill_ledger(conn)
+        summaries = rebuild_all_summaries(conn)
+    return {"ledger": ledger, "summaries": summaries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create and backfill the summary and ledger tables.")
+    parser.add_argument("--check", action="store_true", help="only report what is missing")
+    args = parser.parse_args()
+
+    if args.check:
+        missing = missing_schema()
+        print("schema up to date" if not missing else "missing: " + ", ".join(missing))
+        sys.exit(1 if missing else 0)
+
+    stats = migrate()
+    ledger, s = stats["ledger"], stats["summaries"]
+    print(f"ledger: rebalances={ledger['rebalances']} linked_trades={ledger['linked_trades']} "
+          f"time={ledger['seconds']}s")
+    print(f"summaries: portfolios={s['portfolios']} users={s['users']} time={s['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
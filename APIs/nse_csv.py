@@ -0,0 +1,132 @@
+# nse_csv.py
+"""
+Parser for the NSE market-watch CSV ("MW-<INDEX>-<date>.csv"), shared by
+portfolio_api and rebalance_api.
+
+Headers in the download carry trailing spaces and embedded newlines
+("30 D   %CHNG \\n", "VOLUME \\n(shares)"); every whitespace run is collapsed
+to one space, giving the names below. Numbers use "," separators
+(including Indian grouping, "14,95,26,948") and "-" for empty cells.
+"""
+import io
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+SYMBOL = "SYMBOL"
+LTP = "LTP"
+PCT_CHANGE = "%CHNG"
+CHANGE_30D = "30 D %CHNG"
+CHANGE_365D = "365 D % CHNG"
+
+NUMERIC_COLUMNS = [
+    "OPEN",
+    "HIGH",
+    "LOW",
+    "PREV. CLOSE",
+    LTP,
+    "INDICATIVE CLOSE",
+    "CHNG",
+    PCT_CHANGE,
+    "VOLUME (shares)",
+    "VALUE (₹ Crores)",
+    "52W H",
+    "52W L",
+    CHANGE_30D,
+    CHANGE_365D,
+]
+NA_VALUES = ["-", ""]
+
+Source = Union[str, bytes, io.IOBase]
+
+
+def canonical_column(name) -> str:
+    return " ".join(str(name).split())
+
+
+def _open(source: Source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return source
+
+
+def _rewind(src) -> None:
+    if hasattr(src, "seek"):
+        src.seek(0)
+
+
+def read_market_watch(
+    source: Source, usecols: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    """
+    Read a market-watch CSV (path, bytes or seekable file object) into a
+    frame with canonical column names, the known numeric columns as float64
+    and everything else (SYMBOL, ...) as str. `usecols` takes canonical names and skips the rest while
+    parsing.
+    """
+    src = _open(source)
+
+    raw_cols = list(pd.read_csv(src, nrows=0).columns)
+    _rewind(src)
+    names = {raw: canonical_column(raw) for raw in raw_cols}
+    if usecols is not None:
+        wanted = set(usecols)
+        raw_cols = [raw for raw in raw_cols if names[raw] in wanted]
+
+    dtype = {
+        raw: (np.float64 if names[raw] in NUMERIC_COLUMNS else str) for raw in raw_cols
+    }
+    try:
+        df = pd.read_csv(
+            src,
+            usecols=raw_cols,
+            dtype=dtype,
+            thousands=",",
+            na_values=NA_VALUES,
+            keep_default_na=False,
+            float_precision="round_trip",
+        )
+    except ValueError:
+        # repeated header row, "₹" or "%" inside cells, ...: read as text and
+        # let normalize_market_watch coerce what it can
+        _rewind(src)
+        df = pd.read_csv(src, usecols=raw_cols, dtype=str, keep_default_na=False)
+
+    return normalize_market_watch(df)
+
+
+def normalize_market_watch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Canonical column names, repeated header rows dropped, and the known
+    numeric columns coerced to float64 (unparseable cells become NaN). Columns that are
+    already numeric are left alone, so this is cheap on read_market_watch
+    output. Returns a new frame.
+    """
+    df = df.rename(columns=canonical_column)
+
+    if SYMBOL in df.columns and len(df) > 0:
+        header_rows = df[SYMBOL].astype(str).str.strip().str.upper() == SYMBOL
+        if header_rows.any():
+            df = df[~header_rows].copy()
+
+    for col in df.columns:
+        if col not in NUMERIC_COLUMNS or pd.api.types.is_float_dtype(df[col]):
+            continue
+        if pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(np.float64)
+            continue
+        df[col] = pd.to_numeric(
+            df[col]
+            .astype(str)
+            .str.replace(r"[,₹%]", "", regex=True)
+            .str.strip(),
+            errors="coerce",
+        ).astype(np.float64)
+    return df
+
+
+def require_columns(df: pd.DataFrame, columns: List[str]) -> None:
+    for col in columns:
+        if col not in df.columns:
+            raise RuntimeError(f"Expected column '{col}' not found in CSV")
@@ -0,0 +1,130 @@
+# nse_http.py
+"""
+Browserless download of the NSE market-watch CSV.
+
+The live-equity-market page gets its data from
+/api/equity-stockIndices?csv=true&index=<INDEX>, which only answers requests
+that carry the cookies the page itself sets. NSEClient keeps one pooled
+session: it loads the page once to collect those cookies (again when they
+are older than PMS_NSE_COOKIE_TTL_SECONDS, or after a 401/403) and reads
+the CSV straight into memory. That avoids the browser launch, the fixed
+sleep and the trip through the download directory.
+
+portfolio_api uses this first and falls back to Selenium when it fails
+(PMS_SCRAPE_MODE=selenium skips it).
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import stage
+from nse_csv import SYMBOL, read_market_watch, require_columns
+
+NSE_BASE_URL = os.environ.get("PMS_NSE_BASE_URL", "https://www.nseindia.com")
+BOOTSTRAP_PATH = "/market-data/live-equity-market"
+CSV_PATH = "/api/equity-stockIndices"
+NSE_TIMEOUT = float(os.environ.get("PMS_NSE_TIMEOUT", "15"))
+# NSE's session cookies are short-lived; refresh them before they lapse
+COOKIE_TTL_SECONDS = float(os.environ.get("PMS_NSE_COOKIE_TTL_SECONDS", "240"))
+
+# same browser identity as the Selenium path (chrome_driver.create_chrome_options)
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+
+class NSEFetchError(Exception):
+    """The CSV could not be fetched over HTTP (blocked, bad cookies, not a CSV...)."""
+
+
+class NSEClient:
+    def __init__(self, base_url: str = NSE_BASE_URL, timeout: float = NSE_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(BROWSER_HEADERS)
+        self._bootstrapped_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self.bootstraps = 0
+
+    def _page_url(self) -> str:
+        return self.base_url + BOOTSTRAP_PATH
+
+    def bootstrap(self, index_symbol: str = "NIFTY 50") -> None:
+        """Load the market-watch page once to pick up the session cookies."""
+        with stage("nse_bootstrap"):
+            try:
+                r = self.session.get(
+                    self._page_url(), params={"symbol": index_symbol}, timeout=self.timeout
+                )
+                r.raise_for_status()
+            except requests.RequestException as e:
+                raise NSEFetchError(f"cookie bootstrap failed: {e}") from e
+        self._bootstrapped_at = time.monotonic()
+        self.bootstraps += 1
+
+    def _ensure_cookies(self, index_symbol: str, force: bool = False) -> None:
+        with self._lock:
+            fresh = (
+                self._bootstrapped_at is not None
+                and time.monotonic() - self._bootstrapped_at < COOKIE_TTL_SECONDS
+            )
+            if force or not fresh:
+                self.bootstrap(index_symbol)
+
+    def _get_csv(self, index_symbol: str) -> requests.Response:
+        return self.session.get(
+            self.base_url + CSV_PATH,
+            params={"csv": "true", "index": index_symbol, "selectValFormat": "crores"},
+            headers={
+                "Accept": "text/csv,*/*;q=0.8",
+                "Referer": f"{self._page_url()}?symbol={requests.utils.quote(index_symbol)}",
+            },
+            timeout=self.timeout,
+        )
+
+    def fetch_csv(self, index_symbol: str) -> bytes:
+        self._ensure_cookies(index_symbol)
+        try:
+            with stage("nse_csv_download"):
+                r = self._get_csv(index_symbol)
+                if r.status_code in (401, 403):
+                    # cookies expired or were rotated: one fresh handshake
+                    self._ensure_cookies(index_symbol, force=True)
+                    r = self._get_csv(index_symbol)
+                r.raise_for_status()
+        except requests.RequestException as e:
+            raise NSEFetchError(f"CSV download failed: {e}") from e
+
+        content = r.content.lstrip(b"\xef\xbb\xbf")
+        head = content[:512].upper()
+        if b"SYMBOL" not in head or head.lstrip().startswith((b"<", b"{")):
+            raise NSEFetchError(
+                f"unexpected response for {index_symbol} "
+                f"({r.headers.get('Content-Type', 'no content type')})"
+            )
+        return content
+
+    def fetch_frame(self, index_symbol: str) -> pd.DataFrame:
+        content = self.fetch_csv(index_symbol)
+        with stage("csv_parse"):
+            df = read_market_watch(content)
+        try:
+            require_columns(df, [SYMBOL])
+        except RuntimeError as e:
+            raise NSEFetchError(str(e)) from e
+        return df
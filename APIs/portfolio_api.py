@@ -1,55 +1,165 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import asyncio
+import logging
 import os
+import shutil
+import tempfile
 import time
+import threading
 import urllib.parse
-from datetime import datetime
-
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 
 import pandas as pd
 
+from allocation import (
+    rank_index_by_one_year_return,
+    build_portfolio_from_ranked,
+    evaluate_scenarios,
+)
+from nse_csv import read_market_watch
+from response_formats import (
+    COLUMNAR,
+    COLUMNAR_JSON,
+    JSON,
+    MSGPACK,
+    NDJSON,
+    encode,
+    layout_for,
+    ndjson_response,
+    negotiate,
+    records_to_columnar,
+)
+from snapshot_archive import SOURCE_NSE, archive_snapshot
+from shared_snapshots import shared_snapshots, snapshot_key
+from snapshot_store import SnapshotStore
+import chrome_driver
+from chrome_driver import is_webdriver_error, selenium_api, set_download_dir
+from driver_pool import DriverPool, PoolExhausted
+from job_store import DONE, FAILED, JobStore, MemoryResults, SQLiteResults
+from nse_http import BOOTSTRAP_PATH, CSV_PATH, NSE_BASE_URL, NSEClient, NSEFetchError
+from download_watcher import wait_for_download
+import metrics
+from metrics import stage
+
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
+metrics.install(app, "portfolio_api")
 
 DOWNLOAD_DIR = os.path.abspath("nse_indices_downloads_api")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-# ---------- Chrome driver (reuse across requests) ----------
-driver: webdriver.Chrome | None = None
-
-def create_chrome_options():
-    chrome_options = Options()
-    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-    chrome_options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
-    )
-    prefs = {
-        "download.default_directory": DOWNLOAD_DIR,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True,
-    }
-    chrome_options.add_experimental_option("prefs", prefs)
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    return chrome_options
-
-def get_driver() -> webdriver.Chrome:
-    global driver
-    if driver is not None:
-        return driver
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()),
-        options=create_chrome_options(),
+# How long a scraped index stays fresh, and how much longer it may be served
+# (stale) while a background refresh runs.
+SNAPSHOT_TTL_SECONDS = float(os.environ.get("PMS_SNAPSHOT_TTL_SECONDS", "300"))
+SNAPSHOT_STALE_SECONDS = float(os.environ.get("PMS_SNAPSHOT_STALE_SECONDS", "1800"))
+
+# Browser pool: how many Chromes, how often to recycle them, how long a
+# request may wait for one, and how many scrapes may be queued at once
+# before we answer 503 instead of letting PHP hit its 180 s timeout.
+DRIVER_POOL_SIZE = int(os.environ.get("PMS_DRIVER_POOL_SIZE", "2"))
+DRIVER_MAX_USES = int(os.environ.get("PMS_DRIVER_MAX_USES", "50"))
+DRIVER_CHECKOUT_TIMEOUT = float(os.environ.get("PMS_DRIVER_CHECKOUT_TIMEOUT", "60"))
+SCRAPE_MAX_QUEUE = int(os.environ.get("PMS_SCRAPE_MAX_QUEUE", "8"))
+
+# "http": fetch the CSV with a cookie-bootstrapped HTTP session (nse_http)
+# and only fall back to Chrome when that fails; "selenium": always Chrome.
+SCRAPE_MODE = os.environ.get("PMS_SCRAPE_MODE", "http")
+
+# Startup warm-up: resolve chromedriver and launch this many browsers in the
+# background (each opens WARMUP_URL once), so the first scrape pays for
+# neither. /ready answers 503 until that is done.
+WARMUP_ENABLED = os.environ.get("PMS_WARMUP", "1") == "1"
+WARMUP_DRIVERS = int(os.environ.get("PMS_WARMUP_DRIVERS", str(DRIVER_POOL_SIZE)))
+WARMUP_URL = os.environ.get("PMS_WARMUP_URL", NSE_BASE_URL + BOOTSTRAP_PATH)
+
+# Submit/poll jobs (POST /scrape_index_csv/jobs): worker threads, how many
+# finished jobs to keep for polling (LRU), where ("memory" or "sqlite"), and
+# how long a finished result is handed to identical submits.
+JOB_WORKERS = int(os.environ.get("PMS_JOB_WORKERS", "4"))
+JOB_RESULTS_MAX = int(os.environ.get("PMS_JOB_RESULTS_MAX", "1000"))
+JOB_STORE = os.environ.get("PMS_JOB_STORE", "memory")
+JOB_DB_PATH = os.environ.get("PMS_JOB_DB_PATH", "job_results.sqlite3")
+JOB_REUSE_SECONDS = float(os.environ.get("PMS_JOB_REUSE_SECONDS", str(SNAPSHOT_TTL_SECONDS)))
+
+# What-if batches: hard cap on scenarios, and from how many scenarios on the
+# grid is spread over a process pool (in chunks) instead of one thread.
+BATCH_MAX_SCENARIOS = int(os.environ.get("PMS_BATCH_MAX_SCENARIOS", "5000"))
+BATCH_PROCESS_THRESHOLD = int(os.environ.get("PMS_BATCH_PROCESS_THRESHOLD", "200"))
+BATCH_CHUNK_SIZE = int(os.environ.get("PMS_BATCH_CHUNK_SIZE", "100"))
+BATCH_PROCESSES = int(os.environ.get("PMS_BATCH_PROCESSES", str(os.cpu_count() or 2)))
+
+# ---------- Chrome driver pool (reused across requests) ----------
+def create_driver(slot: int):
+    return chrome_driver.create_driver(DOWNLOAD_DIR)
+
+driver_pool = DriverPool(
+    create_driver, size=DRIVER_POOL_SIZE, max_uses=DRIVER_MAX_USES
+)
+
+# scrapes waiting for or holding a browser
+scrape_queue_lock = threading.Lock()
+scrape_queue_depth = 0
+
+nse_client = NSEClient()
+http_fallbacks = 0  # HTTP fetches that had to fall back to the browser
+
+# ---------- Warm-up / readiness ----------
+# state: starting -> warming -> ready | failed; "cold" when warm-up is off.
+# In http mode warming is one cookie handshake; browsers are only started
+# if that fails. A completed scrape also sets "ready".
+readiness: Dict[str, Any] = {"state": "starting", "detail": None, "warm_drivers": 0}
+readiness_lock = threading.Lock()
+
+def set_readiness(state: str, **fields) -> None:
+    with readiness_lock:
+        readiness.update(state=state, **fields)
+
+def warm_up() -> None:
+    started = time.perf_counter()
+    set_readiness("warming")
+    if SCRAPE_MODE == "http":
+        try:
+            nse_client.bootstrap()
+        except NSEFetchError as e:
+            logger.warning("NSE handshake failed, warming browsers instead: %s", e)
+        else:
+            set_readiness(
+                "ready",
+                detail=None,
+                warmup_seconds=round(time.perf_counter() - started, 2),
+            )
+            return
+
+    items = []
+    try:
+        with stage("warmup"):
+            chrome_driver.resolve_driver_path()
+            for _ in range(min(WARMUP_DRIVERS, DRIVER_POOL_SIZE)):
+                items.append(driver_pool.checkout(timeout=DRIVER_CHECKOUT_TIMEOUT))
+            for item in items:
+                try:
+                    item.driver.get(WARMUP_URL)
+                except Exception as e:
+                    # the browser is up, which is the expensive part
+                    logger.warning("warm-up page load failed: %s", e)
+    except Exception as e:
+        set_readiness("failed", detail=f"warm-up failed: {e}")
+        return
+    finally:
+        for item in items:
+            driver_pool.checkin(item)
+    set_readiness(
+        "ready",
+        detail=None,
+        warm_drivers=len(items),
+        warmup_seconds=round(time.perf_counter() - started, 2),
     )
-    return driver
 
 # ---------- Request model ----------
 class IndexRequest(BaseModel):
@@ -57,30 +167,12 @@ class IndexRequest(BaseModel):
     no_of_stocks: int      # user choice from view_scripts.php
     total_capital: float   # investment amount from Add Portfolio page
 
-# ---------- Helper: wait for latest CSV ----------
-def wait_for_latest_csv(timeout: int = 20) -> str:
-    """Return the most recently modified CSV in DOWNLOAD_DIR within timeout."""
-    end = time.time() + timeout
-    latest_file = ""
-    latest_mtime = 0.0
-
-    while time.time() < end:
-        for f in os.listdir(DOWNLOAD_DIR):
-            if not f.lower().endswith(".csv"):
-                continue
-            full = os.path.join(DOWNLOAD_DIR, f)
-            mtime = os.path.getmtime(full)
-            if mtime > latest_mtime:
-                latest_mtime = mtime
-                latest_file = full
-        if latest_file:
-            return latest_file
-        time.sleep(0.3)
-    return ""
+class BatchIndexRequest(BaseModel):
+    scenarios: List[IndexRequest]
 
 # ---------- Portfolio construction logic ----------
 def initialize_portfolio_from_index(
-    df: pd.DataFrame, total_capital: float, no_of_stocks: int
+    df: pd.DataFrame, total_capital: float, no_of_stocks: int, layout: str = "records"
 ) -> Dict[str, Any]:
     """
     Strategy:
@@ -89,222 +181,462 @@ def initialize_portfolio_from_index(
     3) Pass 2: for stocks with QUANTITY == 0, try to buy 1 share if free_cash >= LTP.
     4) Pass 3: greedy, for all N stocks in order, buy as many extra shares as
        possible with remaining free_cash to minimize leftover cash.
+
+    The passes run on NumPy arrays (see allocation.allocate_equal_budget).
+    Ranking and allocation are split so batch requests can rank an index once.
     """
-    portfolio = []
-    purchase_date = datetime.today().strftime("%Y-%m-%d")
+    ranked = rank_index_by_one_year_return(df)
+    return build_portfolio_from_ranked(ranked, total_capital, no_of_stocks, layout=layout)
 
-    # Normalize columns
-    df.columns = (
-        df.columns.astype(str)
-        .str.strip()
-        .str.replace("\n", " ")
-        .str.replace("  ", " ", regex=False)
-    )
+# ---------- Index scraping (cached per index) ----------
+def scrape_index_df(index_symbol: str) -> pd.DataFrame:
+    """
+    Market-watch frame for index_symbol: over plain HTTP first (nse_http),
+    through the browser if that fails or PMS_SCRAPE_MODE=selenium.
+    """
+    global http_fallbacks
+    if SCRAPE_MODE == "http":
+        try:
+            with stage("http_fetch"):
+                df = nse_client.fetch_frame(index_symbol)
+        except (NSEFetchError, ValueError) as e:
+            # ValueError: the body looked like a CSV but did not parse
+            logger.warning("HTTP fetch for %s failed, using the browser: %s", index_symbol, e)
+            with scrape_queue_lock:
+                http_fallbacks += 1
+        else:
+            with stage("archive"):
+                archive_snapshot(index_symbol, df, SOURCE_NSE)
+            if readiness["state"] != "ready":
+                set_readiness("ready", detail=None)
+            return df
+    return scrape_index_df_browser(index_symbol)
+
+
+def scrape_index_df_browser(index_symbol: str) -> pd.DataFrame:
+    """Download the NSE market-watch CSV for index_symbol with Chrome and return it raw."""
+    base = NSE_BASE_URL + BOOTSTRAP_PATH
+    query = urllib.parse.urlencode({"symbol": index_symbol})
+    url = f"{base}?{query}"
 
-    # Drop duplicate header row if present
-    if len(df) > 0 and str(df.iloc[0]["SYMBOL"]).upper() == "SYMBOL":
-        df = df.iloc[1:].copy()
-
-    # Clean LTP
-    df["LTP"] = (
-        df["LTP"]
-        .astype(str)
-        .str.replace(",", "")
-        .str.replace("₹", "")
-        .str.strip()
-    )
-    df["LTP"] = pd.to_numeric(df["LTP"], errors="coerce")
-
-    # 365‑day change column
-    change_col = "365 D % CHNG"
-    if change_col not in df.columns:
-        raise RuntimeError(f"Expected column '{change_col}' not found in CSV")
-
-    df[change_col] = (
-        df[change_col]
-        .astype(str)
-        .str.replace("%", "")
-        .str.strip()
+    global scrape_queue_depth
+    with scrape_queue_lock:
+        if scrape_queue_depth >= SCRAPE_MAX_QUEUE:
+            raise HTTPException(
+                status_code=503,
+                detail="Too many index downloads in progress, please retry shortly.",
+            )
+        scrape_queue_depth += 1
+
+    try:
+        with driver_pool.lease(
+            timeout=DRIVER_CHECKOUT_TIMEOUT,
+            is_broken=is_webdriver_error,
+        ) as item:
+            d = item.driver
+            # private directory per scrape: nothing else writes here, so the
+            # first completed CSV is ours
+            download_dir = tempfile.mkdtemp(prefix="scrape_", dir=DOWNLOAD_DIR)
+            try:
+                set_download_dir(d, download_dir)
+
+                with stage("page_load"):
+                    d.get(url)
+                with stage("page_settle"):
+                    time.sleep(3)
+
+                download_link = d.find_element(selenium_api().By.ID, "dnldEquityStock")
+                download_link.click()
+
+                with stage("download_wait"):
+                    csv_path = wait_for_download(download_dir, ".csv", timeout=20)
+                if not csv_path:
+                    raise HTTPException(status_code=500, detail="CSV download not found")
+
+                with stage("csv_parse"):
+                    df = read_market_watch(csv_path)
+                with stage("archive"):
+                    archive_snapshot(index_symbol, df, SOURCE_NSE)
+                if readiness["state"] != "ready":
+                    set_readiness("ready", detail=None)
+                return df
+            finally:
+                shutil.rmtree(download_dir, ignore_errors=True)
+    except PoolExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    finally:
+        with scrape_queue_lock:
+            scrape_queue_depth -= 1
+
+
+def load_index_df(index_symbol: str) -> pd.DataFrame:
+    """
+    A snapshot published by another worker within the TTL, else a scrape
+    (one per index across workers), published for the others.
+    """
+    return shared_snapshots.get_or_load(
+        snapshot_key(index_symbol, NSE_BASE_URL + CSV_PATH),
+        lambda _: scrape_index_df(index_symbol),
+        max_age=SNAPSHOT_TTL_SECONDS,
     )
-    df[change_col] = pd.to_numeric(df[change_col], errors="coerce")
 
-    # Rank by 1‑year return and pick top N
-    df = df.sort_values(by=change_col, ascending=False).head(no_of_stocks).copy()
 
-    # Filter out rows without valid price
-    df = df[pd.notna(df["LTP"]) & (df["LTP"] > 0)].copy()
-    if df.empty:
-        raise RuntimeError("No valid prices found to build portfolio")
+index_snapshots = SnapshotStore(
+    load_index_df,
+    ttl_seconds=SNAPSHOT_TTL_SECONDS,
+    stale_seconds=SNAPSHOT_STALE_SECONDS,
+)
 
-    investment_per_stock = total_capital // no_of_stocks
+# ---------- Endpoint ----------
+def validate_index_request(req: IndexRequest) -> str:
+    """The stripped index symbol; 400 for bad input."""
+    index_symbol = req.index_symbol.strip()
+    if not index_symbol:
+        raise HTTPException(status_code=400, detail="index_symbol is required")
+    if req.no_of_stocks <= 0:
+        raise HTTPException(status_code=400, detail="no_of_stocks must be > 0")
+    if req.total_capital <= 0:
+        raise HTTPException(status_code=400, detail="total_capital must be > 0")
+    return index_symbol
 
-    # ---------- PASS 1: equal-budget buy ----------
-    for _, row in df.iterrows():
-        ltp = float(row["LTP"])
-        qty = int(investment_per_stock // ltp)
-        invested = qty * ltp
 
-        portfolio.append(
-            {
-                "SYMBOL": row["SYMBOL"],
-                "LTP": round(ltp, 2),
-                "QUANTITY": qty,
-                "INVESTED_AMOUNT": round(invested, 2),
-                "ONE_YEAR_RETURN_PCT": round(
-                    float(row[change_col]) if pd.notna(row[change_col]) else 0.0, 2
-                ),
-                "DATE_OF_PURCHASE": purchase_date,
-            }
-        )
+# response encodings per endpoint, preferred first (see response_formats)
+PORTFOLIO_FORMATS = (JSON, COLUMNAR_JSON, MSGPACK)
+BATCH_FORMATS = (JSON, COLUMNAR_JSON, MSGPACK, NDJSON)
 
-    portfolio_df = pd.DataFrame(portfolio)
-
-    # Ensure all selected symbols exist (if some were missing)
-    selected_symbols = set(df["SYMBOL"])
-    existing_symbols = set(portfolio_df["SYMBOL"])
-    missing = selected_symbols - existing_symbols
-    for sym in missing:
-        row = df[df["SYMBOL"] == sym].iloc[0]
-        portfolio_df = pd.concat(
-            [
-                portfolio_df,
-                pd.DataFrame(
-                    [
-                        {
-                            "SYMBOL": sym,
-                            "LTP": round(float(row["LTP"]), 2),
-                            "QUANTITY": 0,
-                            "INVESTED_AMOUNT": 0.0,
-                            "ONE_YEAR_RETURN_PCT": round(
-                                float(row[change_col]) if pd.notna(row[change_col]) else 0.0,
-                                2,
-                            ),
-                            "DATE_OF_PURCHASE": purchase_date,
-                        }
-                    ]
-                ),
-            ],
-            ignore_index=True,
-        )
 
-    # Free cash after pass 1
-    total_invested = float(portfolio_df["INVESTED_AMOUNT"].sum())
-    free_cash = float(total_capital - total_invested)
+@app.post("/scrape_index_csv")
+async def scrape_index_csv(req: IndexRequest, request: Request) -> Response:
+    media_type = negotiate(request.headers.get("accept", ""), PORTFOLIO_FORMATS)
+    index_symbol = validate_index_request(req)
+    no_of_stocks = req.no_of_stocks
+    total_capital = req.total_capital
 
-    # Ranked view (top N) for further passes
-    df_ranked = df.sort_values(by=change_col, ascending=False).reset_index(drop=True)
-    ltp_map = {row["SYMBOL"]: float(row["LTP"]) for _, row in df_ranked.iterrows()}
+    try:
+        # blocking scrape runs in the threadpool so the event loop stays free
+        with stage("snapshot"):
+            df = await run_in_threadpool(index_snapshots.get, index_symbol)
+
+        with stage("allocation"):
+            portfolio_result = initialize_portfolio_from_index(
+                df,
+                total_capital=total_capital,
+                no_of_stocks=no_of_stocks,
+                layout=layout_for(media_type),
+            )
+
+        return encode(
+            {
+                "success": True,
+                "index_symbol": index_symbol,
+                "no_of_stocks": no_of_stocks,
+                "total_capital": total_capital,
+                **portfolio_result,
+            },
+            media_type,
+        )
 
-    # Quick symbol index for faster updates
-    symbol_index = {sym: i for i, sym in enumerate(portfolio_df["SYMBOL"])}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    # ---------- PASS 2: ensure each stock gets at least 1 share if possible ----------
-    for _, row in df_ranked.iterrows():
-        sym = row["SYMBOL"]
-        ltp = ltp_map[sym]
-        if ltp <= 0:
-            continue
 
-        i = symbol_index[sym]
-        current_qty = int(portfolio_df.at[i, "QUANTITY"])
+# ---------- Submit/poll jobs ----------
+if JOB_STORE == "sqlite":
+    job_results = SQLiteResults(JOB_DB_PATH, max_entries=JOB_RESULTS_MAX)
+else:
+    job_results = MemoryResults(max_entries=JOB_RESULTS_MAX)
 
-        if current_qty == 0 and free_cash >= ltp:
-            portfolio_df.at[i, "QUANTITY"] += 1
-            portfolio_df.at[i, "INVESTED_AMOUNT"] += ltp
-            free_cash -= ltp
+scrape_jobs = JobStore(job_results, workers=JOB_WORKERS, reuse_seconds=JOB_REUSE_SECONDS)
 
-    # ---------- PASS 3: greedy allocation across all N stocks ----------
-    while True:
-        bought_any = False
+def run_portfolio_job(params: Dict[str, Any], report) -> Dict[str, Any]:
+    """Same work and response as /scrape_index_csv, on a job worker thread."""
+    report("snapshot", 0.1)
+    with stage("snapshot"):
+        df = index_snapshots.get(params["index_symbol"])
+    report("allocation", 0.8)
+    with stage("allocation"):
+        portfolio_result = initialize_portfolio_from_index(
+            df, total_capital=params["total_capital"], no_of_stocks=params["no_of_stocks"]
+        )
+    return {"success": True, **params, **portfolio_result}
+
+def job_view(record: Dict[str, Any]) -> Dict[str, Any]:
+    body = {
+        "job_id": record["job_id"],
+        "state": record["state"],
+        "stage": record["stage"],
+        "progress": record["progress"],
+        "submitted_at": record["submitted_at"],
+        "finished_at": record["finished_at"],
+        "status_url": f"/jobs/{record['job_id']}",
+    }
+    if record["state"] == DONE:
+        body["result"] = record["result"]
+    elif record["state"] == FAILED:
+        body["status_code"] = record["status_code"]
+        body["detail"] = record["error"]
+    return body
+
+def job_response(record: Dict[str, Any], request: Request, status_code: int = 200, **extra) -> Response:
+    """job_view in the negotiated format; results are stored as records."""
+    media_type = negotiate(request.headers.get("accept", ""), PORTFOLIO_FORMATS)
+    body = {**job_view(record), **extra}
+    if "result" in body and layout_for(media_type) == COLUMNAR:
+        result = body["result"]
+        body["result"] = {**result, "portfolio": records_to_columnar(result["portfolio"])}
+    response = encode(body, media_type)
+    response.status_code = status_code
+    return response
+
+@app.post("/scrape_index_csv/jobs", status_code=202)
+def submit_scrape_job(req: IndexRequest, request: Request) -> Response:
+    """
+    Queue /scrape_index_csv work and return at once; poll status_url.
+    Identical requests share a queued/running job, or a result that
+    finished less than PMS_JOB_REUSE_SECONDS ago.
+    """
+    negotiate(request.headers.get("accept", ""), PORTFOLIO_FORMATS)  # 406 before queueing
+    params = {
+        "index_symbol": validate_index_request(req),
+        "no_of_stocks": req.no_of_stocks,
+        "total_capital": float(req.total_capital),
+    }
+    key = f"{params['index_symbol']}|{params['no_of_stocks']}|{params['total_capital']!r}"
+    record, reused = scrape_jobs.submit(key, params, run_portfolio_job)
+    return job_response(record, request, status_code=202, reused=reused)
 
-        for _, row in df_ranked.iterrows():
-            sym = row["SYMBOL"]
-            ltp = ltp_map[sym]
-            if ltp <= 0 or free_cash < ltp:
-                continue
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request) -> Response:
+    record = scrape_jobs.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id")
+    return job_response(record, request)
 
-            extra_qty = int(free_cash // ltp)
-            if extra_qty <= 0:
-                continue
 
-            i = symbol_index[sym]
-            portfolio_df.at[i, "QUANTITY"] += extra_qty
-            portfolio_df.at[i, "INVESTED_AMOUNT"] += extra_qty * ltp
-            free_cash -= extra_qty * ltp
-            bought_any = True
+# ---------- Batch "what-if" endpoint ----------
+batch_process_pool: ProcessPoolExecutor | None = None
 
-            if free_cash <= 0:
-                break
+def get_batch_process_pool() -> ProcessPoolExecutor:
+    global batch_process_pool
+    if batch_process_pool is None:
+        batch_process_pool = ProcessPoolExecutor(max_workers=BATCH_PROCESSES)
+    return batch_process_pool
 
-        if not bought_any:
-            break
+def fetch_ranked_index(index_symbol: str) -> pd.DataFrame:
+    return rank_index_by_one_year_return(index_snapshots.get(index_symbol))
 
-    portfolio_df["INVESTED_AMOUNT"] = portfolio_df["INVESTED_AMOUNT"].round(2)
+async def start_batch(
+    scenarios: List[IndexRequest], layout: str, chunk_size: int | None = None
+) -> Tuple[List[Dict[str, Any] | None], List[Tuple[List[int], Any]], int]:
+    """
+    Validate the scenarios, fetch and rank each distinct index once, and
+    start the allocation chunks. Returns the outcomes known so far (errors),
+    the running (positions, awaitable) chunks and how many indices were
+    fetched.
+    """
+    if not scenarios:
+        raise HTTPException(status_code=400, detail="scenarios must not be empty")
+    if len(scenarios) > BATCH_MAX_SCENARIOS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_SCENARIOS} scenarios per batch",
+        )
 
-    portfolio_df = portfolio_df.sort_values(
-        by="ONE_YEAR_RETURN_PCT", ascending=False
-    ).reset_index(drop=True)
+    outcomes: List[Dict[str, Any] | None] = [None] * len(scenarios)
+    by_index: Dict[str, List[int]] = {}
+    for pos, sc in enumerate(scenarios):
+        symbol = sc.index_symbol.strip()
+        error = None
+        if not symbol:
+            error = "index_symbol is required"
+        elif sc.no_of_stocks <= 0:
+            error = "no_of_stocks must be > 0"
+        elif sc.total_capital <= 0:
+            error = "total_capital must be > 0"
+        if error:
+            outcomes[pos] = {"success": False, "detail": error}
+        else:
+            by_index.setdefault(symbol, []).append(pos)
+
+    symbols = list(by_index)
+    with stage("snapshot"):
+        fetched = await asyncio.gather(
+            *(run_in_threadpool(fetch_ranked_index, sym) for sym in symbols),
+            return_exceptions=True,
+        )
 
+    purchase_date = datetime.today().strftime("%Y-%m-%d")
+    n_valid = sum(len(p) for p in by_index.values())
+    use_processes = n_valid >= BATCH_PROCESS_THRESHOLD
+    if chunk_size is None:
+        chunk_size = BATCH_CHUNK_SIZE if use_processes else max(n_valid, 1)
+    loop = asyncio.get_running_loop()
+
+    jobs = []  # (positions, awaitable)
+    for symbol, ranked in zip(symbols, fetched):
+        positions = by_index[symbol]
+        if isinstance(ranked, BaseException):
+            detail = ranked.detail if isinstance(ranked, HTTPException) else str(ranked)
+            for pos in positions:
+                outcomes[pos] = {"success": False, "detail": detail}
+            continue
+        for start in range(0, len(positions), chunk_size):
+            chunk = positions[start:start + chunk_size]
+            grid = [(scenarios[p].no_of_stocks, scenarios[p].total_capital) for p in chunk]
+            if use_processes:
+                fut = loop.run_in_executor(
+                    get_batch_process_pool(), evaluate_scenarios, ranked, grid, purchase_date, layout
+                )
+            else:
+                fut = run_in_threadpool(evaluate_scenarios, ranked, grid, purchase_date, layout)
+            jobs.append((chunk, fut))
+    return outcomes, jobs, len(symbols)
+
+def scenario_result(sc: IndexRequest, outcome: Dict[str, Any]) -> Dict[str, Any]:
     return {
-        "portfolio": portfolio_df.to_dict(orient="records"),
-        "total_invested": float(portfolio_df["INVESTED_AMOUNT"].sum()),
-        "free_cash": float(free_cash),
+        "index_symbol": sc.index_symbol.strip(),
+        "no_of_stocks": sc.no_of_stocks,
+        "total_capital": sc.total_capital,
+        **outcome,
     }
 
-# ---------- Endpoint ----------
-@app.post("/scrape_index_csv")
-async def scrape_index_csv(req: IndexRequest) -> Dict:
-    index_symbol = req.index_symbol.strip()
-    no_of_stocks = req.no_of_stocks
-    total_capital = req.total_capital
+@app.post("/scrape_index_csv/batch")
+async def scrape_index_csv_batch(req: BatchIndexRequest, request: Request) -> Response:
+    """
+    Evaluate many (index_symbol, no_of_stocks, total_capital) scenarios.
+    Each distinct index is fetched and ranked once; results come back in
+    request order, with per-scenario errors reported inline. With
+    Accept: application/x-ndjson they are streamed instead (see
+    stream_batch).
+    """
+    media_type = negotiate(request.headers.get("accept", ""), BATCH_FORMATS)
+    scenarios = req.scenarios
+    if media_type == NDJSON:
+        outcomes, jobs, indices_fetched = await start_batch(
+            scenarios, layout_for(media_type), chunk_size=BATCH_CHUNK_SIZE
+        )
+        return ndjson_response(stream_batch(scenarios, outcomes, jobs, indices_fetched))
 
-    if not index_symbol:
-        raise HTTPException(status_code=400, detail="index_symbol is required")
-    if no_of_stocks <= 0:
-        raise HTTPException(status_code=400, detail="no_of_stocks must be > 0")
-    if total_capital <= 0:
-        raise HTTPException(status_code=400, detail="total_capital must be > 0")
+    outcomes, jobs, indices_fetched = await start_batch(scenarios, layout_for(media_type))
+    try:
+        with stage("allocation"):
+            chunk_results = await asyncio.gather(*(fut for _, fut in jobs))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    base = "https://www.nseindia.com/market-data/live-equity-market"
-    query = urllib.parse.urlencode({"symbol": index_symbol})
-    url = f"{base}?{query}"
+    for (chunk, _), res in zip(jobs, chunk_results):
+        for pos, r in zip(chunk, res):
+            outcomes[pos] = r
 
-    try:
-        d = get_driver()
+    return encode(
+        {
+            "success": True,
+            "indices_fetched": indices_fetched,
+            "scenarios": len(scenarios),
+            "results": [scenario_result(sc, o) for sc, o in zip(scenarios, outcomes)],
+        },
+        media_type,
+    )
 
-        # Clear old CSVs so the next one is definitely from this request
-        for f in os.listdir(DOWNLOAD_DIR):
-            if f.lower().endswith(".csv"):
-                try:
-                    os.remove(os.path.join(DOWNLOAD_DIR, f))
-                except OSError:
-                    pass
+async def stream_batch(scenarios, outcomes, jobs, indices_fetched):
+    """
+    NDJSON lines: each scenario as its chunk finishes (with its request
+    "position"), errors known up front first, then a closing
+    {"done": true, ...} line. The response has started by then, so a
+    failing chunk is reported on its scenarios' lines, not as a 500.
+    """
+    for pos, outcome in enumerate(outcomes):
+        if outcome is not None:
+            yield {"position": pos, **scenario_result(scenarios[pos], outcome)}
 
-        d.get(url)
-        time.sleep(3)
+    async def tagged(chunk, fut):
+        try:
+            return chunk, await fut
+        except Exception as e:
+            return chunk, [{"success": False, "detail": str(e)}] * len(chunk)
 
-        download_link = d.find_element(By.ID, "dnldEquityStock")
-        download_link.click()
+    for done in asyncio.as_completed([tagged(chunk, fut) for chunk, fut in jobs]):
+        chunk, res = await done
+        for pos, r in zip(chunk, res):
+            yield {"position": pos, **scenario_result(scenarios[pos], r)}
 
-        csv_path = wait_for_latest_csv(timeout=20)
-        if not csv_path:
-            raise HTTPException(status_code=500, detail="CSV download not found")
+    yield {"done": True, "scenarios": len(scenarios), "indices_fetched": indices_fetched}
 
-        df = pd.read_csv(csv_path)
 
-        portfolio_result = initialize_portfolio_from_index(
-            df, total_capital=total_capital, no_of_stocks=no_of_stocks
-        )
+@app.get("/snapshot_stats")
+def snapshot_stats() -> Dict:
+    return {
+        **index_snapshots.stats(),
+        "driver_pool": driver_pool.stats(),
+        "scrape_queue_depth": scrape_queue_depth,
+        "scrape_mode": SCRAPE_MODE,
+        "nse_bootstraps": nse_client.bootstraps,
+        "http_fallbacks": http_fallbacks,
+        "jobs": scrape_jobs.stats(),
+        "shared_snapshots": shared_snapshots.stats(),
+    }
 
-        return {
-            "success": True,
-            "index_symbol": index_symbol,
-            "no_of_stocks": no_of_stocks,
-            "total_capital": total_capital,
-            **portfolio_result,
-        }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def scrape_samples():
+    snap = index_snapshots.stats()
+    pool = driver_pool.stats()
+    lookups = "Index snapshot lookups by outcome."
+    yield ("pms_snapshot_lookups_total", "counter", lookups, {"outcome": "hit"}, snap["hits"])
+    yield ("pms_snapshot_lookups_total", "counter", lookups, {"outcome": "stale"}, snap["stale_hits"])
+    yield ("pms_snapshot_lookups_total", "counter", lookups, {"outcome": "miss"}, snap["misses"])
+    yield ("pms_snapshot_loads_in_flight", "gauge", "Index scrapes being loaded.", {}, len(snap["inflight"]))
+    failures = "Index scrapes that failed, by whether a caller was waiting."
+    yield ("pms_snapshot_load_failures_total", "counter", failures, {"kind": "load"}, snap["load_failures"])
+    yield ("pms_snapshot_load_failures_total", "counter", failures,
+           {"kind": "background_refresh"}, snap["refresh_failures"])
+    yield ("pms_snapshot_evictions_total", "counter",
+           "Index snapshots dropped as expired or over the size cap.", {}, snap["evictions"])
+    yield ("pms_driver_launches_total", "counter", "Chrome drivers started.", {}, pool["created"])
+    yield ("pms_driver_restarts_total", "counter",
+           "Chrome drivers recycled (worn out or broken).", {}, pool["recycled"])
+    yield ("pms_drivers_in_use", "gauge", "Chrome drivers leased to a scrape.", {}, pool["in_use"])
+    yield ("pms_scrape_queue_depth", "gauge",
+           "Scrapes waiting for or holding a browser.", {}, scrape_queue_depth)
+    yield ("pms_nse_bootstraps_total", "counter",
+           "NSE cookie handshakes done by the HTTP fetcher.", {}, nse_client.bootstraps)
+    yield ("pms_http_fallbacks_total", "counter",
+           "HTTP fetches that fell back to the browser.", {}, http_fallbacks)
+    job_stats = scrape_jobs.stats()
+    submits = "Job submits, new or answered with an existing job."
+    yield ("pms_job_submits_total", "counter", submits, {"outcome": "new"}, job_stats["submitted"])
+    yield ("pms_job_submits_total", "counter", submits, {"outcome": "reused"}, job_stats["reused"])
+    yield ("pms_jobs_finished_total", "counter", "Jobs finished by state.",
+           {"state": "done"}, job_stats["completed"])
+    yield ("pms_jobs_finished_total", "counter", "Jobs finished by state.",
+           {"state": "failed"}, job_stats["failed"])
+    yield ("pms_jobs_active", "gauge", "Jobs queued or running.",
+           {}, job_stats["queued"] + job_stats["running"])
+
+
+metrics.register_collector(scrape_samples)
+
+
+@app.get("/ready")
+def ready():
+    with readiness_lock:
+        body = dict(readiness)
+    body["ready"] = body["state"] == "ready"
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.on_event("startup")
+def start_warm_up():
+    if not WARMUP_ENABLED:
+        set_readiness("cold")
+        return
+    threading.Thread(target=warm_up, name="driver-warmup", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def close_drivers():
+    scrape_jobs.shutdown()
+    driver_pool.close_all()
+    if batch_process_pool is not None:
+        batch_process_pool.shutdown(wait=False, cancel_futures=True)
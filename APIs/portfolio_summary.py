@@ -0,0 +1,266 @@
+# portfolio_summary.py
+"""
+Materialized dashboard totals.
+
+portfolio_summaries holds one row per portfolio (holdings count, invested,
+current value). user_summaries holds one row per user with the same
+numbers summed over that user's user_portfolios links, i.e. what
+dashboard.php / view_portfolio.php used to aggregate over
+user_portfolios JOIN portfolios JOIN portfolio_holdings on every view.
+
+Writers call refresh_summaries(cur, portfolio_ids) inside their own
+transaction after touching holdings. Only the listed portfolios are
+recomputed (from their own holdings rows), then the users linked to them
+are recomputed from portfolio_summaries, so the cost follows the size of
+the write, not of the database.
+
+The PHP pages do not run these statements: their write paths delete the
+rows they invalidate and ask the rebalance API to rebuild them
+(POST /refresh_summaries), and their reads fall back to the live aggregate
+for a row that is missing. get_user_summary does the same.
+
+The tables are created and backfilled by `python migrate.py`.
+
+    python portfolio_summary.py --rebuild     # repair all rows
+"""
+import argparse
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from database_helper import db_session, is_sqlite
+
+SUMMARY_SCHEMA_MYSQL = [
+    """
+    CREATE TABLE IF NOT EXISTS portfolio_summaries (
+        portfolio_id INT PRIMARY KEY,
+        holdings_count INT NOT NULL DEFAULT 0,
+        total_invested DECIMAL(16, 2) NOT NULL DEFAULT 0,
+        total_current DECIMAL(16, 2) NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_summaries (
+        user_id INT PRIMARY KEY,
+        portfolio_count INT NOT NULL DEFAULT 0,
+        total_invested DECIMAL(16, 2) NOT NULL DEFAULT 0,
+        total_current DECIMAL(16, 2) NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL
+    )
+    """,
+]
+
+SUMMARY_SCHEMA_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS portfolio_summaries (
+        portfolio_id INTEGER PRIMARY KEY,
+        holdings_count INTEGER NOT NULL DEFAULT 0,
+        total_invested REAL NOT NULL DEFAULT 0,
+        total_current REAL NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_summaries (
+        user_id INTEGER PRIMARY KEY,
+        portfolio_count INTEGER NOT NULL DEFAULT 0,
+        total_invested REAL NOT NULL DEFAULT 0,
+        total_current REAL NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL
+    )
+    """,
+]
+
+# checked by migrate.check_schema
+SUMMARY_COLUMNS = {
+    "portfolio_summaries": ("portfolio_id", "holdings_count", "total_invested", "total_current", "updated_at"),
+    "user_summaries": ("user_id", "portfolio_count", "total_invested", "total_current", "updated_at"),
+}
+
+# Portfolios without holdings still get a (zero) row, matching the LEFT JOIN
+# in view_portfolio.php.
+PORTFOLIO_SUMMARY_SQL = """
+    INSERT INTO portfolio_summaries
+    (portfolio_id, holdings_count, total_invested, total_current, updated_at)
+    SELECT p.portfolio_id,
+           COUNT(ph.holding_id),
+           COALESCE(SUM(ph.invested_amount), 0),
+           COALESCE(SUM(ph.current_value), 0),
+           %s
+    FROM portfolios p
+    LEFT JOIN portfolio_holdings ph ON ph.portfolio_id = p.portfolio_id
+    WHERE p.portfolio_id IN ({ids})
+    GROUP BY p.portfolio_id
+"""
+
+USER_SUMMARY_SQL = """
+    INSERT INTO user_summaries
+    (user_id, portfolio_count, total_invested, total_current, updated_at)
+    SELECT up.user_id,
+           COUNT(*),
+           COALESCE(SUM(ps.total_invested), 0),
+           COALESCE(SUM(ps.total_current), 0),
+           %s
+    FROM user_portfolios up
+    LEFT JOIN portfolio_summaries ps ON ps.portfolio_id = up.portfolio_id
+    WHERE up.user_id IN ({ids})
+    GROUP BY up.user_id
+"""
+
+
+def create_summary_tables(conn) -> None:
+    """Summary DDL, run by migrate.py (it commits implicitly on MySQL)."""
+    cur = conn.cursor()
+    for stmt in SUMMARY_SCHEMA_SQLITE if is_sqlite() else SUMMARY_SCHEMA_MYSQL:
+        cur.execute(stmt)
+    cur.close()
+
+
+def _placeholders(values: List[Any]) -> str:
+    return ", ".join(["%s"] * len(values))
+
+
+def refresh_portfolio_summaries(cur, portfolio_ids: Iterable[int]) -> None:
+    ids = sorted({int(pid) for pid in portfolio_ids})
+    if not ids:
+        return
+    cur.execute(
+        f"DELETE FROM portfolio_summaries WHERE portfolio_id IN ({_placeholders(ids)})",
+        tuple(ids),
+    )
+    cur.execute(
+        PORTFOLIO_SUMMARY_SQL.format(ids=_placeholders(ids)),
+        (datetime.utcnow(), *ids),
+    )
+
+
+def refresh_user_summaries(cur, portfolio_ids: Iterable[int]) -> None:
+    """Recompute every user linked to one of `portfolio_ids`."""
+    ids = sorted({int(pid) for pid in portfolio_ids})
+    if not ids:
+        return
+    users = f"SELECT user_id FROM user_portfolios WHERE portfolio_id IN ({_placeholders(ids)})"
+    cur.execute(f"DELETE FROM user_summaries WHERE user_id IN ({users})", tuple(ids))
+    cur.execute(
+        USER_SUMMARY_SQL.format(ids=users),
+        (datetime.utcnow(), *ids),
+    )
+
+
+def refresh_summaries(cur, portfolio_ids: Iterable[int]) -> None:
+    """Recompute the given portfolios and every user linked to them. Does not commit."""
+    refresh_portfolio_summaries(cur, portfolio_ids)
+    refresh_user_summaries(cur, portfolio_ids)
+
+
+def refresh_users(cur, user_ids: Iterable[int]) -> None:
+    """
+    Recompute the given users from portfolio_summaries, e.g. after one
+    unsubscribed from a portfolio. Does not commit.
+    """
+    ids = sorted({int(uid) for uid in user_ids})
+    if not ids:
+        return
+    cur.execute(f"DELETE FROM user_summaries WHERE user_id IN ({_placeholders(ids)})", tuple(ids))
+    cur.execute(
+        USER_SUMMARY_SQL.format(ids=_placeholders(ids)),
+        (datetime.utcnow(), *ids),
+    )
+
+
+def rebuild_all_summaries(conn=None) -> Dict[str, Any]:
+    """Backfill: recompute every portfolio and user summary in one transaction."""
+    started = time.perf_counter()
+    with db_session(conn) as conn:
+        cur = conn.cursor()
+        try:
+            now = datetime.utcnow()
+            cur.execute("DELETE FROM portfolio_summaries")
+            cur.execute(
+                PORTFOLIO_SUMMARY_SQL.format(ids="SELECT portfolio_id FROM portfolios"),
+                (now,),
+            )
+            portfolios = max(cur.rowcount, 0)
+            cur.execute("DELETE FROM user_summaries")
+            cur.execute(
+                USER_SUMMARY_SQL.format(ids="SELECT user_id FROM user_portfolios"),
+                (now,),
+            )
+            users = max(cur.rowcount, 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return {
+        "portfolios": portfolios,
+        "users": users,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+# ---------- reads (primary-key lookups) ----------
+# what dashboard.php aggregated before user_summaries; used for a missing row
+LIVE_USER_SUMMARY_SQL = """
+    SELECT COUNT(DISTINCT up.portfolio_id) AS portfolio_count,
+           COALESCE(SUM(ph.invested_amount), 0) AS total_invested,
+           COALESCE(SUM(ph.current_value), 0) AS total_current
+    FROM user_portfolios up
+    LEFT JOIN portfolio_holdings ph ON ph.portfolio_id = up.portfolio_id
+    WHERE up.user_id = %s
+"""
+
+
+def get_user_summary(user_id: int, conn=None) -> Dict[str, Any]:
+    """
+    Dashboard numbers for one user: the user_summaries row, or the live
+    aggregate while that row is missing (zeros if the user has no portfolios).
+    """
+    with db_session(conn) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT portfolio_count, total_invested, total_current
+            FROM user_summaries
+            WHERE user_id = %s
+            """,
+            (user_id,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            cur.execute(LIVE_USER_SUMMARY_SQL, (user_id,))
+            row = cur.fetchone() or {}
+        cur.close()
+
+    total_investment = float(row.get("total_invested") or 0)
+    total_current = float(row.get("total_current") or 0)
+    net_profit_loss = total_current - total_investment
+    return {
+        "user_id": user_id,
+        "total_portfolios": int(row.get("portfolio_count") or 0),
+        "total_investment": total_investment,
+        "total_current": total_current,
+        "net_profit_loss": net_profit_loss,
+        "net_returns_percent": (
+            net_profit_loss / total_investment * 100 if total_investment else 0.0
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain portfolio/user summary tables.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every summary row from portfolio_holdings")
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return
+    stats = rebuild_all_summaries()
+    print(f"portfolios={stats['portfolios']} users={stats['users']} time={stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
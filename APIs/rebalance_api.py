@@ -1,15 +1,45 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import math
+import numpy as np
 import pandas as pd
-import requests
-from requests.exceptions import ReadTimeout, RequestException
-from io import StringIO
-
-from database_helper import get_connection  # your existing helper
+from requests.exceptions import RequestException, Timeout
+
+try:  # optional: async HTTP client for the async rebalance endpoint
+    import httpx
+except ImportError:
+    httpx = None
+
+from database_helper import db_session, PoolTimeout
+import index_download
+import metrics
+from index_download import download, fetch_frame
+from metrics import stage, timed
+from nse_csv import (
+    CHANGE_30D,
+    LTP,
+    SYMBOL,
+    normalize_market_watch,
+    read_market_watch,
+    require_columns,
+)
+from migrate import check_schema
+from portfolio_summary import get_user_summary, refresh_summaries, refresh_users
+from shared_snapshots import shared_snapshots, snapshot_key
+from snapshot_archive import SOURCE_URL, archive_snapshot
+from trade_ledger import (
+    HISTORY_PAGE_SIZE,
+    LedgerWriter,
+    rebalance_history as read_rebalance_history,
+)
 
 app = FastAPI(title="PMS Rebalance API")
+metrics.install(app, "rebalance_api")
+
+REBALANCE_INTERVAL = timedelta(days=30)
 
 
 # ---------- MODELS ----------
@@ -20,22 +50,26 @@ class RebalanceRequest(BaseModel):
     no_of_stocks: int
 
 
+class SummaryRefreshRequest(BaseModel):
+    portfolio_ids: List[int] = []
+    user_ids: List[int] = []
+
+
 # ---------- CORE HELPERS ----------
 
-def check_30d_rule(user_id: int, portfolio_id: int):
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
-    cur.execute(
-        """
-        SELECT last_rebalanced_at
-        FROM user_portfolios
-        WHERE user_id = %s AND portfolio_id = %s
-        """,
-        (user_id, portfolio_id),
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+def check_30d_rule(user_id: int, portfolio_id: int, conn=None):
+    with db_session(conn) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT last_rebalanced_at
+            FROM user_portfolios
+            WHERE user_id = %s AND portfolio_id = %s
+            """,
+            (user_id, portfolio_id),
+        )
+        row = cur.fetchone()
+        cur.close()
 
     if not row:
         raise HTTPException(status_code=400, detail="User is not subscribed to this portfolio.")
@@ -43,39 +77,66 @@ def check_30d_rule(user_id: int, portfolio_id: int):
     last = row["last_rebalanced_at"]
     if last is None:
         return
-    if datetime.utcnow() - last < timedelta(days=30):
+    if datetime.utcnow() - last < REBALANCE_INTERVAL:
         raise HTTPException(
             status_code=400,
             detail="Portfolio can be updated only after 30 days since last rebalance.",
         )
 
 
-def get_index_csv_for_portfolio(portfolio_id: int) -> pd.DataFrame:
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
-    cur.execute(
-        """
-        SELECT p.index_symbol, i.url
-        FROM portfolios p
-        JOIN indices i ON p.index_symbol = i.symbol
-        WHERE p.portfolio_id = %s
-        """,
-        (portfolio_id,),
-    )
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+def get_index_info(portfolio_id: int, conn=None):
+    """(index_symbol, url) of the index this portfolio tracks."""
+    with db_session(conn) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT p.index_symbol, i.url
+            FROM portfolios p
+            JOIN indices i ON p.index_symbol = i.symbol
+            WHERE p.portfolio_id = %s
+            """,
+            (portfolio_id,),
+        )
+        row = cur.fetchone()
+        cur.close()
 
     if not row:
         raise HTTPException(status_code=400, detail="Index info not found for this portfolio.")
 
-    index_symbol = row["index_symbol"]
-    url = row["url"]
+    return row["index_symbol"], row["url"]
+
+
+def get_index_csv_for_portfolio(portfolio_id: int, conn=None) -> pd.DataFrame:
+    return fetch_index_csv(*get_index_info(portfolio_id, conn))
+
 
+def fetch_index_csv(index_symbol: str, url: str) -> pd.DataFrame:
+    """
+    Market-watch frame for the index, read-only. A snapshot another worker
+    published from the same url in the last PMS_SHARED_SNAPSHOT_MAX_AGE
+    seconds is used as is; otherwise one worker downloads and publishes it.
+    """
+    return shared_snapshots.get_or_load(
+        snapshot_key(index_symbol, url), lambda _: download_index_csv(index_symbol, url)
+    )
+
+
+def download_index_csv(index_symbol: str, url: str) -> pd.DataFrame:
+    """
+    Goes through index_download: pooled session with retries, and an
+    unchanged file (304) is read from the disk cache. With shared snapshots
+    off, an unchanged file also reuses the frame parsed last time.
+    """
     try:
-        r = requests.get(url, timeout=20)
-        r.raise_for_status()
-    except ReadTimeout:
+        if shared_snapshots.enabled:
+            # the shared snapshot holds the parsed frame; a second private
+            # copy in fetch_frame's LRU would defeat sharing it
+            content = download(url).content
+            with stage("csv_parse"):
+                df = read_market_watch(content)
+        else:
+            df = fetch_frame(url, read_market_watch)
+    except Timeout:
         raise HTTPException(
             status_code=503,
             detail=f"Timed out while fetching index data for {index_symbol}. Please try again later."
@@ -86,29 +147,28 @@ def get_index_csv_for_portfolio(portfolio_id: int) -> pd.DataFrame:
             detail=f"Error fetching index data for {index_symbol}: {e}"
         )
 
-    df = pd.read_csv(StringIO(r.text))
+    archive_snapshot(index_symbol, df, SOURCE_URL)
     return df
 
 
-def load_holdings_df(portfolio_id: int) -> pd.DataFrame:
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
-    cur.execute(
-        """
-        SELECT
-            symbol AS SYMBOL,
-            current_price AS LTP,
-            quantity AS QUANTITY,
-            invested_amount AS `INVESTED AMOUNT`,
-            date_of_purchase AS `DATE OF PURCHASE`
-        FROM portfolio_holdings
-        WHERE portfolio_id = %s
-        """,
-        (portfolio_id,),
-    )
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+def load_holdings_df(portfolio_id: int, conn=None) -> pd.DataFrame:
+    with db_session(conn) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(
+            """
+            SELECT
+                symbol AS SYMBOL,
+                current_price AS LTP,
+                quantity AS QUANTITY,
+                invested_amount AS `INVESTED AMOUNT`,
+                date_of_purchase AS `DATE OF PURCHASE`
+            FROM portfolio_holdings
+            WHERE portfolio_id = %s
+            """,
+            (portfolio_id,),
+        )
+        rows = cur.fetchall()
+        cur.close()
 
     if not rows:
         return pd.DataFrame(
@@ -117,133 +177,129 @@ def load_holdings_df(portfolio_id: int) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 
-def get_free_cash_and_total(portfolio_id: int, user_id: int):
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
+def get_free_cash_and_total(portfolio_id: int, user_id: int, conn=None):
+    with db_session(conn) as conn:
+        cur = conn.cursor(dictionary=True)
 
-    cur.execute(
-        """
-        SELECT total_invested
-        FROM user_portfolios
-        WHERE user_id = %s AND portfolio_id = %s
-        """,
-        (user_id, portfolio_id),
-    )
-    row = cur.fetchone()
-    if not row:
-        cur.close()
-        conn.close()
-        raise HTTPException(status_code=400, detail="User-portfolio link not found.")
-    total_capital = float(row["total_invested"])
+        cur.execute(
+            """
+            SELECT total_invested
+            FROM user_portfolios
+            WHERE user_id = %s AND portfolio_id = %s
+            """,
+            (user_id, portfolio_id),
+        )
+        row = cur.fetchone()
+        if not row:
+            cur.close()
+            raise HTTPException(status_code=400, detail="User-portfolio link not found.")
+        total_capital = float(row["total_invested"])
 
-    cur.execute(
-        """
-        SELECT COALESCE(SUM(invested_amount), 0) AS invested_sum
-        FROM portfolio_holdings
-        WHERE portfolio_id = %s
-        """,
-        (portfolio_id,),
-    )
-    row2 = cur.fetchone()
-    invested_sum = float(row2["invested_sum"] or 0.0)
+        cur.execute(
+            """
+            SELECT COALESCE(SUM(invested_amount), 0) AS invested_sum
+            FROM portfolio_holdings
+            WHERE portfolio_id = %s
+            """,
+            (portfolio_id,),
+        )
+        row2 = cur.fetchone()
+        invested_sum = float(row2["invested_sum"] or 0.0)
 
-    cur.close()
-    conn.close()
+        cur.close()
 
     free_cash = total_capital - invested_sum
     return free_cash, total_capital
 
 
+PORTFOLIO_COLUMNS = [
+    "SYMBOL", "LTP", "QUANTITY", "INVESTED AMOUNT", "1M RETURN (%)", "DATE OF PURCHASE"
+]
+
+
 def run_update_portfolio_logic(
     df_index: pd.DataFrame,
     portfolio_df: pd.DataFrame,
     no_of_stocks: int,
     free_cash: float
 ) -> Dict[str, Any]:
-    df = df_index.copy()
-    df.columns = (
-        df.columns.astype(str)
-        .str.strip()
-        .str.replace("\n", "")
-        .str.replace("  ", " ", regex=False)
-    )
+    """
+    Keep holdings that are still in the top N by 30 D %CHNG, sell the rest at
+    their last price, and split the cash equally across the new entries.
 
-    # some files have header row duplicated; drop if needed
-    if len(df) > 0 and str(df.iloc[0].get("SYMBOL", "")).upper() == "SYMBOL":
-        df = df.iloc[1:].copy()
+    Works on symbol-indexed columns (isin / reindex) instead of scanning the
+    holdings frame per symbol, so cost is linear in index + holdings size.
+    """
+    df = normalize_market_watch(df_index)
+    require_columns(df, [SYMBOL, LTP, CHANGE_30D])
 
-    df["LTP"] = (
-        df["LTP"].astype(str)
-        .str.replace(",", "")
-        .str.replace("₹", "")
-        .str.strip()
-    )
-    df["LTP"] = pd.to_numeric(df["LTP"], errors="coerce")
-
-    df["30 D %CHNG"] = (
-        df["30 D %CHNG"].astype(str)
-        .str.replace("%", "")
-        .str.strip()
-    )
-    df["30 D %CHNG"] = pd.to_numeric(df["30 D %CHNG"], errors="coerce")
+    new_top = df.sort_values(by=CHANGE_30D, ascending=False).head(no_of_stocks)
 
-    new_top = df.sort_values(by="30 D %CHNG", ascending=False).head(no_of_stocks)
-
-    new_portfolio: List[Dict[str, Any]] = []
-    old_symbols = set(portfolio_df["SYMBOL"])
-    new_symbols = set(new_top["SYMBOL"])
+    # first row per symbol, as the old per-symbol .iloc[0] lookups did
+    old = portfolio_df.drop_duplicates(subset="SYMBOL", keep="first").set_index("SYMBOL")
 
+    old_symbols = set(old.index)
+    new_symbols = set(new_top[SYMBOL])
     common = old_symbols & new_symbols
+    sold_symbols = old_symbols - new_symbols
+    new_entries = new_symbols - old_symbols
 
-    # keep common stocks
-    for _, row in new_top.iterrows():
-        if row["SYMBOL"] in common:
-            old_row = portfolio_df[portfolio_df["SYMBOL"] == row["SYMBOL"]].iloc[0]
-            new_portfolio.append(
-                {
-                    "SYMBOL": row["SYMBOL"],
-                    "LTP": float(row["LTP"]),
-                    "QUANTITY": int(old_row["QUANTITY"]),
-                    "INVESTED AMOUNT": float(old_row["INVESTED AMOUNT"]),
-                    "1M RETURN (%)": float(row["30 D %CHNG"]),
-                    "DATE OF PURCHASE": old_row["DATE OF PURCHASE"],
-                }
-            )
+    in_old = new_top[SYMBOL].isin(old.index).to_numpy()
+
+    # keep common stocks (new price and return, old quantity/cost/date)
+    kept = new_top[in_old]
+    kept_old = old.reindex(kept[SYMBOL])
+    kept_df = pd.DataFrame(
+        {
+            "SYMBOL": kept[SYMBOL].to_numpy(),
+            "LTP": kept[LTP].to_numpy(dtype=float),
+            "QUANTITY": kept_old["QUANTITY"].to_numpy().astype(int),
+            "INVESTED AMOUNT": kept_old["INVESTED AMOUNT"].to_numpy(dtype=float),
+            "1M RETURN (%)": kept[CHANGE_30D].to_numpy(dtype=float),
+            "DATE OF PURCHASE": kept_old["DATE OF PURCHASE"].to_numpy(),
+        }
+    )
 
     # sell removed stocks
-    sold_symbols = old_symbols - new_symbols
-    freed_cash = 0.0
-    for sym in sold_symbols:
-        r = portfolio_df[portfolio_df["SYMBOL"] == sym].iloc[0]
-        freed_cash += float(r["QUANTITY"]) * float(r["LTP"])
+    sold = old[~old.index.isin(new_symbols)]
+    # correctly rounded, so the result does not depend on the order of the sold rows
+    freed_cash = math.fsum(
+        (sold["QUANTITY"].to_numpy(dtype=float) * sold["LTP"].to_numpy(dtype=float)).tolist()
+    )
     free_cash += freed_cash
 
     # buy new entries
-    new_entries = new_symbols - old_symbols
+    buy_df = pd.DataFrame(columns=PORTFOLIO_COLUMNS)
     if new_entries:
         cash_per_new = free_cash // len(new_entries)
         purchase_date = datetime.today().strftime("%Y-%m-%d")
-        for _, row in new_top.iterrows():
-            if row["SYMBOL"] in new_entries:
-                ltp = float(row["LTP"])
-                if ltp > 0 and ltp <= cash_per_new:
-                    qty = int(cash_per_new // ltp)
-                    if qty <= 0:
-                        continue
-                    invested = qty * ltp
-                    free_cash -= invested
-                    new_portfolio.append(
-                        {
-                            "SYMBOL": row["SYMBOL"],
-                            "LTP": ltp,
-                            "QUANTITY": qty,
-                            "INVESTED AMOUNT": invested,
-                            "1M RETURN (%)": float(row["30 D %CHNG"]),
-                            "DATE OF PURCHASE": purchase_date,
-                        }
-                    )
-
-    new_df = pd.DataFrame(new_portfolio)
+
+        buys = new_top[~in_old]
+        ltp = buys[LTP].to_numpy(dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            affordable = (ltp > 0) & (ltp <= cash_per_new)
+            qty = np.where(affordable, np.floor_divide(cash_per_new, ltp), 0)
+        bought = affordable & (qty > 0)
+
+        ltp = ltp[bought]
+        qty = qty[bought].astype(int)
+        invested = qty * ltp
+        # subtract one purchase at a time, in rank order, like the old loop
+        free_cash = float(np.subtract.accumulate(np.concatenate(([free_cash], invested)))[-1])
+
+        buy_df = pd.DataFrame(
+            {
+                "SYMBOL": buys[SYMBOL].to_numpy()[bought],
+                "LTP": ltp,
+                "QUANTITY": qty,
+                "INVESTED AMOUNT": invested,
+                "1M RETURN (%)": buys[CHANGE_30D].to_numpy(dtype=float)[bought],
+                "DATE OF PURCHASE": purchase_date,
+            },
+            columns=PORTFOLIO_COLUMNS,
+        )
+
+    new_df = pd.concat([kept_df, buy_df], ignore_index=True) if len(buy_df) else kept_df
     return {
         "portfolio_df": new_df,
         "free_cash": free_cash,
@@ -253,121 +309,171 @@ def run_update_portfolio_logic(
     }
 
 
-# ---------- MAIN ENDPOINT ----------
-
-@app.post("/rebalance_portfolio")
-def rebalance_portfolio(req: RebalanceRequest):
-    portfolio_id = req.portfolio_id
-    user_id = req.user_id
-    no_of_stocks = req.no_of_stocks
-
-    check_30d_rule(user_id, portfolio_id)
+HOLDING_INSERT_SQL = """
+    INSERT INTO portfolio_holdings
+    (portfolio_id, symbol, company_name, date_of_purchase,
+     buy_price, current_price, quantity,
+     invested_amount, current_value, pl_amount, pl_percent)
+    VALUES (%s, %s, NULL, %s, %s, %s, %s, %s, %s, 0, 0)
+"""
+
+def write_holdings_diff(
+    cur,
+    portfolio_id: int,
+    user_id: int,
+    old_holdings: pd.DataFrame,
+    new_df: pd.DataFrame,
+    res: Dict[str, Any],
+    ledger: LedgerWriter,
+) -> float:
+    """
+    Apply a rebalance as a diff: delete sold symbols, insert new entries and
+    leave common holdings untouched. Holdings are written with executemany
+    (multi-row INSERTs on mysql.connector); the trades are recorded in
+    `ledger`, which the caller flushes before committing.
+    Returns the new total invested amount.
+    """
+    sold = list(res["sold_symbols"])
+    bought = set(res["new_entries"])
+
+    # sells
+    if sold:
+        placeholders = ", ".join(["%s"] * len(sold))
+        cur.execute(
+            f"DELETE FROM portfolio_holdings WHERE portfolio_id = %s AND symbol IN ({placeholders})",
+            (portfolio_id, *sold),
+        )
 
-    df_index = get_index_csv_for_portfolio(portfolio_id)
-    old_holdings = load_holdings_df(portfolio_id)
-    free_cash, _ = get_free_cash_and_total(portfolio_id, user_id)
+    trades = []
+    old_sold = old_holdings[old_holdings["SYMBOL"].isin(sold)]
+    for sym, qty, inv, price in zip(
+        old_sold["SYMBOL"],
+        old_sold["QUANTITY"],
+        old_sold["INVESTED AMOUNT"],
+        old_sold["LTP"],
+    ):
+        bq, bi, price = int(qty), float(inv), float(price)
+        trades.append((sym, "SELL", bq, price, bq, 0, bi, 0))
+
+    # buys
+    holding_rows = []
+    if not new_df.empty:
+        new_rows = new_df[new_df["SYMBOL"].isin(bought)]
+        for sym, qty, inv, price, purchased in zip(
+            new_rows["SYMBOL"],
+            new_rows["QUANTITY"],
+            new_rows["INVESTED AMOUNT"],
+            new_rows["LTP"],
+            new_rows["DATE OF PURCHASE"],
+        ):
+            aq, ai, price = int(qty), float(inv), float(price)
+            holding_rows.append(
+                (portfolio_id, sym, purchased, price, price, aq, ai, ai)
+            )
+            trades.append((sym, "BUY", aq, price, 0, aq, 0, ai))
 
-    if old_holdings.empty:
-        raise HTTPException(status_code=400, detail="No holdings to rebalance.")
+    if holding_rows:
+        cur.executemany(HOLDING_INSERT_SQL, holding_rows)
 
-    res = run_update_portfolio_logic(df_index, old_holdings, no_of_stocks, free_cash)
-    new_df = res["portfolio_df"]
-    new_free_cash = res["free_cash"]
+    total_invested = float(new_df["INVESTED AMOUNT"].sum()) if not new_df.empty else 0.0
+    ledger.record(
+        portfolio_id, user_id, trades,
+        float(old_holdings["INVESTED AMOUNT"].sum()), total_invested,
+    )
+    return total_invested
 
-    conn = get_connection()
-    cur = conn.cursor(dictionary=True)
 
-    try:
-        # clear holdings
-        cur.execute("DELETE FROM portfolio_holdings WHERE portfolio_id = %s", (portfolio_id,))
-
-        # insert new holdings
-        insert_sql = """
-            INSERT INTO portfolio_holdings
-            (portfolio_id, symbol, company_name, date_of_purchase,
-             buy_price, current_price, quantity,
-             invested_amount, current_value, pl_amount, pl_percent)
-            VALUES (%s, %s, NULL, %s, %s, %s, %s, %s, %s, 0, 0)
+def mark_rebalanced(cur, user_id: int, portfolio_id: int, total_invested: float):
+    cur.execute(
         """
-        total_invested = 0.0
-        for _, row in new_df.iterrows():
-            sym = row["SYMBOL"]
-            ltp = float(row["LTP"])
-            qty = int(row["QUANTITY"])
-            inv = float(row["INVESTED AMOUNT"])
-            total_invested += inv
-            cur.execute(
-                insert_sql,
-                (portfolio_id, sym, row["DATE OF_PURCHASE"] if "DATE_OF_PURCHASE" not in row else row["DATE_OF_PURCHASE"], ltp, ltp, qty, inv, inv),
-            )
+        UPDATE user_portfolios
+        SET last_rebalanced_at = %s,
+            total_invested     = %s
+        WHERE user_id = %s AND portfolio_id = %s
+        """,
+        (datetime.utcnow(), total_invested, user_id, portfolio_id),
+    )
+
 
-        # minimal transaction log (optional but created here)
-        txn_sql = """
-            INSERT INTO portfolio_transactions
-            (portfolio_id, user_id, symbol, txn_type,
-             quantity, price, amount,
-             before_quantity, after_quantity,
-             before_invested, after_invested, reason)
-            VALUES (%s, %s, %s, %s,
-                    %s, %s, %s,
-                    %s, %s,
-                    %s, %s, %s)
+def mark_portfolio_rebalanced(cur, portfolio_id: int, total_invested: float, cutoff: datetime):
+    """mark_rebalanced for every link of the portfolio that was due at cutoff."""
+    cur.execute(
         """
+        UPDATE user_portfolios
+        SET last_rebalanced_at = %s,
+            total_invested     = %s
+        WHERE portfolio_id = %s
+          AND (last_rebalanced_at IS NULL OR last_rebalanced_at <= %s)
+        """,
+        (datetime.utcnow(), total_invested, portfolio_id, cutoff),
+    )
 
-        old_map = {r["SYMBOL"]: r for _, r in old_holdings.iterrows()}
-        new_map = {r["SYMBOL"]: r for _, r in new_df.iterrows()}
-        reason = "30D rebalance"
-
-        # sells
-        for sym in res["sold_symbols"]:
-            o = old_map[sym]
-            bq = int(o["QUANTITY"])
-            bi = float(o["INVESTED AMOUNT"])
-            price = float(o["LTP"])
-            amt = bq * price
-            cur.execute(
-                txn_sql,
-                (portfolio_id, user_id, sym, "SELL",
-                 bq, price, amt,
-                 bq, 0,
-                 bi, 0, reason),
-            )
 
-        # buys
-        for sym in res["new_entries"]:
-            n = new_map[sym]
-            aq = int(n["QUANTITY"])
-            ai = float(n["INVESTED AMOUNT"])
-            price = float(n["LTP"])
-            amt = aq * price
-            cur.execute(
-                txn_sql,
-                (portfolio_id, user_id, sym, "BUY",
-                 aq, price, amt,
-                 0, aq,
-                 0, ai, reason),
-            )
+def apply_rebalance(
+    conn, portfolio_id: int, user_id: int, old_holdings: pd.DataFrame, res: Dict[str, Any]
+) -> float:
+    """Write the rebalance result in one transaction; returns total invested."""
+    cur = conn.cursor(dictionary=True)
+    ledger = LedgerWriter()
 
-        # update user_portfolios
-        cur.execute(
-            """
-            UPDATE user_portfolios
-            SET last_rebalanced_at = %s,
-                total_invested     = %s
-            WHERE user_id = %s AND portfolio_id = %s
-            """,
-            (datetime.utcnow(), total_invested, user_id, portfolio_id),
+    try:
+        total_invested = write_holdings_diff(
+            cur, portfolio_id, user_id, old_holdings, res["portfolio_df"], res, ledger
         )
+        ledger.flush(cur)
+        mark_rebalanced(cur, user_id, portfolio_id, total_invested)
+        refresh_summaries(cur, [portfolio_id])
 
         conn.commit()
     except Exception as e:
         conn.rollback()
         cur.close()
-        conn.close()
         raise HTTPException(status_code=500, detail=str(e))
 
     cur.close()
-    conn.close()
+    return total_invested
+
+
+def rebalance_with_connection(conn, portfolio_id: int, user_id: int, no_of_stocks: int):
+    """Run the whole rebalance (reads, logic, write) on one connection."""
+    with stage("db_check_30d"):
+        check_30d_rule(user_id, portfolio_id, conn)
+
+    with stage("index_fetch"):
+        df_index = get_index_csv_for_portfolio(portfolio_id, conn)
+    with stage("db_holdings"):
+        old_holdings = load_holdings_df(portfolio_id, conn)
+    with stage("db_cash"):
+        free_cash, _ = get_free_cash_and_total(portfolio_id, user_id, conn)
+
+    if old_holdings.empty:
+        raise HTTPException(status_code=400, detail="No holdings to rebalance.")
+
+    with stage("compute"):
+        res = run_update_portfolio_logic(df_index, old_holdings, no_of_stocks, free_cash)
+    new_free_cash = res["free_cash"]
+
+    with stage("db_write"):
+        total_invested = apply_rebalance(conn, portfolio_id, user_id, old_holdings, res)
+
+    return total_invested, new_free_cash
+
+
+# ---------- MAIN ENDPOINT ----------
+
+@app.post("/rebalance_portfolio")
+def rebalance_portfolio(req: RebalanceRequest):
+    portfolio_id = req.portfolio_id
+    user_id = req.user_id
+    no_of_stocks = req.no_of_stocks
+
+    try:
+        with db_session() as conn:
+            total_invested, new_free_cash = rebalance_with_connection(
+                conn, portfolio_id, user_id, no_of_stocks
+            )
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     return {
         "success": True,
@@ -375,3 +481,217 @@ def rebalance_portfolio(req: RebalanceRequest):
         "total_invested": total_invested,
         "free_cash": new_free_cash,
     }
+
+
+@app.get("/user_summary/{user_id}")
+def user_summary(user_id: int):
+    """Dashboard totals from user_summaries (one primary-key lookup)."""
+    try:
+        return get_user_summary(user_id)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.post("/refresh_summaries")
+def refresh_summary_rows(req: SummaryRefreshRequest):
+    """
+    Rebuild the summary rows of the given portfolios, the users linked to
+    them and the given users. The PHP write paths call this after their own
+    commit instead of repeating the refresh statements.
+    """
+    try:
+        with db_session() as conn:
+            cur = conn.cursor()
+            try:
+                refresh_summaries(cur, req.portfolio_ids)
+                refresh_users(cur, req.user_ids)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"success": True}
+
+
+@app.get("/rebalance_history/{user_id}/{portfolio_id}")
+def rebalance_history(
+    user_id: int,
+    portfolio_id: int,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    trades: bool = False,
+):
+    """
+    Rebalances of one portfolio, newest first, with turnover per rebalance.
+    Follow next_cursor for older pages; trades=true adds each rebalance's
+    transactions.
+    """
+    try:
+        return read_rebalance_history(user_id, portfolio_id, limit, cursor, trades)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+def download_samples():
+    counts = index_download.stats()
+    for outcome in ("downloaded", "not_modified"):
+        yield ("pms_index_downloads_total", "counter", "Index CSV downloads by outcome.",
+               {"outcome": outcome}, counts[outcome])
+    yield ("pms_index_download_retries_total", "counter",
+           "Index CSV download retries.", {}, counts["retries"])
+    for outcome in ("parsed", "reused"):
+        yield ("pms_index_frames_total", "counter", "Index frames parsed vs reused by content hash.",
+               {"outcome": outcome}, counts[outcome])
+
+
+metrics.register_collector(download_samples)
+
+
+@app.on_event("startup")
+def require_schema():
+    # the summary and ledger tables are created by `python migrate.py`; without
+    # them every rebalance would fail on its write, so refuse to start instead
+    check_schema()
+
+
+# ---------- ASYNC ENDPOINT ----------
+
+INDEX_FETCH_TIMEOUT = 20
+async_http: "httpx.AsyncClient | None" = None
+
+
+def get_async_http():
+    global async_http
+    if async_http is None:
+        async_http = httpx.AsyncClient(timeout=INDEX_FETCH_TIMEOUT)
+    return async_http
+
+
+async def download_index_csv_async(index_symbol: str, url: str) -> bytes:
+    try:
+        r = await get_async_http().get(url)
+        r.raise_for_status()
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Timed out while fetching index data for {index_symbol}. Please try again later."
+        )
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Error fetching index data for {index_symbol}: {e}"
+        )
+    return r.content
+
+
+async def fetch_index_csv_async(portfolio_id: int) -> pd.DataFrame:
+    """
+    fetch_index_csv with the download on the async client. A miss goes
+    through shared_snapshots.get_or_load, so concurrent requests for the same
+    index (in any worker) download it once: the loader runs on a worker
+    thread while it holds the per-index lock, and hands the download itself
+    back to the event loop.
+    """
+    index_symbol, url = await asyncio.to_thread(get_index_info, portfolio_id)
+    if httpx is None:
+        return await asyncio.to_thread(timed, "index_fetch", fetch_index_csv, index_symbol, url)
+    loop = asyncio.get_running_loop()
+
+    def load(_key: str) -> pd.DataFrame:
+        content = asyncio.run_coroutine_threadsafe(
+            download_index_csv_async(index_symbol, url), loop
+        ).result()
+        df = timed("csv_parse", read_market_watch, content)
+        archive_snapshot(index_symbol, df, SOURCE_URL)
+        return df
+
+    return await asyncio.to_thread(
+        timed, "index_fetch", shared_snapshots.get_or_load, snapshot_key(index_symbol, url), load
+    )
+
+
+async def first_failure(*aws):
+    """
+    Run aws concurrently and return their results in order. On the first
+    exception the others are cancelled and that exception is raised. A
+    cancelled to_thread stage stops being waited for; its thread finishes
+    the query and returns its connection to the pool on its own.
+    """
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for t in tasks:
+            if t.done() and not t.cancelled() and t.exception() is not None:
+                raise t.exception()
+        return [t.result() for t in tasks]
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+            elif not t.cancelled():
+                t.exception()  # mark later failures retrieved
+
+
+async def reads_and_fetch(portfolio_id: int, user_id: int):
+    """
+    The 30-day check, holdings read and cash read, each on its own pooled
+    connection and worker thread, alongside the index fetch.
+    """
+    _, old_holdings, (free_cash, _), df_index = await first_failure(
+        asyncio.to_thread(timed, "db_check_30d", check_30d_rule, user_id, portfolio_id),
+        asyncio.to_thread(timed, "db_holdings", load_holdings_df, portfolio_id),
+        asyncio.to_thread(timed, "db_cash", get_free_cash_and_total, portfolio_id, user_id),
+        fetch_index_csv_async(portfolio_id),
+    )
+    return old_holdings, free_cash, df_index
+
+
+@app.post("/rebalance_portfolio_async")
+async def rebalance_portfolio_async(req: RebalanceRequest):
+    """
+    Same result as /rebalance_portfolio, but the eligibility check, holdings
+    read, cash read and index fetch run concurrently, so latency is the
+    slowest stage rather than the sum, and the first failure cancels the
+    rest. The reads take three pooled connections, and the index lookup that
+    precedes the download a fourth for a moment.
+    """
+    portfolio_id = req.portfolio_id
+    user_id = req.user_id
+    no_of_stocks = req.no_of_stocks
+
+    try:
+        # the stages overlap, so their Server-Timing entries do not add up
+        old_holdings, free_cash, df_index = await reads_and_fetch(portfolio_id, user_id)
+
+        if old_holdings.empty:
+            raise HTTPException(status_code=400, detail="No holdings to rebalance.")
+
+        res = await asyncio.to_thread(
+            timed, "compute", run_update_portfolio_logic, df_index, old_holdings, no_of_stocks, free_cash
+        )
+
+        def write():
+            with db_session() as conn:
+                return apply_rebalance(conn, portfolio_id, user_id, old_holdings, res)
+
+        total_invested = await asyncio.to_thread(timed, "db_write", write)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "success": True,
+        "portfolio_id": portfolio_id,
+        "total_invested": total_invested,
+        "free_cash": res["free_cash"],
+    }
+
+
+@app.on_event("shutdown")
+async def close_async_http():
+    if async_http is not None:
+        await async_http.aclose()
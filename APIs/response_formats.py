@@ -0,0 +1,185 @@
+# response_formats.py
+"""
+Response layouts and encodings for the portfolio endpoints, chosen from the
+Accept header.
+
+    Accept                                 body
+    application/json (or none, */*)        JSON, portfolio as records (unchanged)
+    application/vnd.pms.columnar+json      JSON, portfolio as columns
+    application/msgpack                    MessagePack, portfolio as columns
+    application/x-ndjson                   one JSON object per line, portfolio
+                                           as columns, streamed (batch only)
+
+An Accept header that names none of these (text/html) still gets JSON;
+406 is only for a header that refuses JSON, e.g. "application/json;q=0".
+
+Records repeat every key on every row:
+
+    [{"SYMBOL": "TCS", "LTP": 3101.5, ..., "DATE_OF_PURCHASE": "2025-11-28"}, ...]
+
+The columnar layout sends each key once, one array per column, and a
+column whose values are all equal (DATE_OF_PURCHASE) once as a constant:
+
+    {"length": 2,
+     "columns": {"SYMBOL": ["TCS", "INFY"], "LTP": [3101.5, 1530.2], ...},
+     "constants": {"DATE_OF_PURCHASE": "2025-11-28"}}
+
+columnar_to_records() turns it back into the records list. msgpack is
+optional: without it, MessagePack is simply not offered.
+"""
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.pms.columnar+json"
+MSGPACK = "application/msgpack"
+NDJSON = "application/x-ndjson"
+
+# other names clients use for the same encodings
+ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+}
+
+RECORDS = "records"
+COLUMNAR = "columnar"
+
+
+# ---------- layouts ----------
+def frame_to_columnar(df: pd.DataFrame) -> Dict[str, Any]:
+    columns: Dict[str, List[Any]] = {}
+    constants: Dict[str, Any] = {}
+    for name in df.columns:
+        values = df[name].tolist()
+        if len(values) > 1 and df[name].dtype == object and values.count(values[0]) == len(values):
+            constants[name] = values[0]
+        else:
+            columns[name] = values
+    return {"length": len(df), "columns": columns, "constants": constants}
+
+
+def records_to_columnar(records: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    return frame_to_columnar(pd.DataFrame.from_records(list(records)))
+
+
+def columnar_to_records(block: Dict[str, Any]) -> List[Dict[str, Any]]:
+    n = block["length"]
+    columns = dict(block["columns"])
+    for name, value in block["constants"].items():
+        columns[name] = [value] * n
+    names = list(columns)
+    if not names:
+        return [{} for _ in range(n)]
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def layout_for(media_type: str) -> str:
+    return RECORDS if media_type == JSON else COLUMNAR
+
+
+# ---------- negotiation ----------
+def available(offers: Sequence[str]) -> List[str]:
+    return [m for m in offers if m != MSGPACK or msgpack is not None]
+
+
+def parse_accept(accept: str) -> List[Tuple[str, float, int]]:
+    """(media range, q, position) for each comma-separated part, aliases resolved."""
+    ranges = []
+    for i, part in enumerate(accept.split(",")):
+        media, *params = [p.strip() for p in part.split(";")]
+        if not media:
+            continue
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        ranges.append((ALIASES.get(media.lower(), media.lower()), q, i))
+    return ranges
+
+
+def match(media_type: str, ranges: Sequence[Tuple[str, float, int]]) -> Optional[Tuple[float, int, int]]:
+    """
+    (q, specificity, -position) of the most specific range covering
+    media_type, None when no range does. A more specific range wins
+    whatever its q, so "application/json;q=0, */*" excludes JSON.
+    """
+    kind = media_type.split("/")[0]
+    best = None
+    for media, q, i in ranges:
+        if media == media_type:
+            specificity = 2
+        elif media == kind + "/*":
+            specificity = 1
+        elif media == "*/*":
+            specificity = 0
+        else:
+            continue
+        if best is None or specificity > best[1]:
+            best = (q, specificity, -i)
+    return best
+
+
+def negotiate(accept: str, offers: Sequence[str]) -> str:
+    """
+    The best of offers for an Accept header: highest q, then the most
+    specific range, then the client's order, then the server's (offers is
+    in preference order, JSON first).
+
+    JSON when there is no header, and also when the header names nothing
+    this endpoint serves (text/html, application/xml): that is what these
+    endpoints answered before they read Accept, and clients rely on it.
+    406 only when the header rules out every offer, JSON included (e.g.
+    "application/json;q=0" or "*/*;q=0").
+    """
+    offers = available(offers)
+    if not accept:
+        return offers[0]
+    ranges = parse_accept(accept)
+    scored = []
+    for preference, media in enumerate(offers):
+        m = match(media, ranges)
+        if m is not None and m[0] > 0:
+            scored.append((m, -preference, media))
+    if scored:
+        return max(scored)[2]
+    if match(offers[0], ranges) is None:
+        return offers[0]
+    raise HTTPException(
+        status_code=406, detail=f"Not acceptable; this endpoint serves {', '.join(offers)}"
+    )
+
+
+# ---------- encoders ----------
+def dumps(body: Any) -> bytes:
+    return json.dumps(body, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+
+def encode(body: Dict[str, Any], media_type: str) -> Response:
+    headers = {"Vary": "Accept"}
+    if media_type == MSGPACK:
+        return Response(msgpack.packb(body, use_bin_type=True), media_type=MSGPACK, headers=headers)
+    if media_type == COLUMNAR_JSON:
+        return Response(dumps(body), media_type=COLUMNAR_JSON, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+
+def ndjson_response(lines: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    async def body():
+        async for obj in lines:
+            yield dumps(obj) + b"\n"
+
+    return StreamingResponse(body(), media_type=NDJSON, headers={"Vary": "Accept"})
@@ -0,0 +1,287 @@
+# shared_snapshots.py
+"""
+Parsed index frames shared between worker processes through memory-mapped
+Arrow files.
+
+    <PMS_SHARED_SNAPSHOT_DIR>/NIFTY_50_9f8e7d6c-1a2b3c4d.json                 <- pointer
+    <PMS_SHARED_SNAPSHOT_DIR>/NIFTY_50_9f8e7d6c-1a2b3c4d.1732791234567.arrow  <- version
+
+Keys come from snapshot_key(index_symbol, source): the same index scraped
+from NSE's market watch (portfolio_api) and downloaded from indices.url
+(rebalance_api) are different frames, so each source gets its own key.
+
+The directory defaults to /dev/shm, so the files are shared memory. A
+publisher writes a new version file and then atomically replaces the
+pointer ({"version", "file", "published_at"}). Readers check the pointer on
+every get (one stat) and memory-map the version it names. The numeric
+columns of the returned DataFrame are read-only views of the mapping, so N
+workers hold one copy in the page cache instead of N parsed copies. Only
+the string columns (SYMBOL etc.) are materialised per process. A reader
+never sees a half-written version: it has either the old pointer or the new
+one, and the last two versions are kept on disk.
+
+get_or_load() takes a per-index file lock (fcntl, where available) around
+the fetch, so when several workers miss at once only one of them fetches;
+the others wait and attach to what it published.
+
+pyarrow is optional: without it, or with PMS_SHARED_SNAPSHOTS=0, get()
+always misses and get_or_load() just calls the loader.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process single flight
+    fcntl = None
+
+import metrics
+
+SHARED_SNAPSHOTS_ENABLED = os.environ.get("PMS_SHARED_SNAPSHOTS", "1") == "1"
+SHARED_SNAPSHOT_DIR = os.environ.get(
+    "PMS_SHARED_SNAPSHOT_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "pms_snapshots"),
+)
+# how old a published snapshot may be and still be used instead of fetching
+SHARED_SNAPSHOT_MAX_AGE = float(os.environ.get("PMS_SHARED_SNAPSHOT_MAX_AGE", "300"))
+KEEP_VERSIONS = 2
+
+
+def _slug(key: str) -> str:
+    readable = re.sub(r"[^A-Za-z0-9]+", "_", key).strip("_")[:40]
+    return f"{readable}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+
+def snapshot_key(index_symbol: str, source: str) -> str:
+    """Key for index_symbol's frame as fetched from source (a URL)."""
+    return f"{index_symbol} {hashlib.sha1(source.encode('utf-8')).hexdigest()[:8]}"
+
+
+def frame_to_table(df: pd.DataFrame):
+    # NaN stays a float value (no validity bitmap), so float columns map back
+    # to pandas without a copy
+    arrays = [
+        pyarrow.array(df[c].to_numpy(), from_pandas=df[c].dtype == object) for c in df.columns
+    ]
+    return pyarrow.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+
+
+def table_to_frame(table) -> pd.DataFrame:
+    # split_blocks keeps one block per column, so nothing is consolidated
+    # (copied) into a 2-D block
+    df = table.to_pandas(split_blocks=True)
+    for c in df.columns:
+        if df[c].dtype == object:
+            # nulls come back as None; fixed in place, as assigning the
+            # column would consolidate the frame
+            values = df[c].to_numpy()
+            values[pd.isna(values)] = np.nan
+    return df
+
+
+class _Attached:
+    __slots__ = ("version", "published_at", "df", "pointer_stat")
+
+    def __init__(self, version: int, published_at: float, df: pd.DataFrame, pointer_stat):
+        self.version = version
+        self.published_at = published_at
+        self.df = df
+        self.pointer_stat = pointer_stat
+
+
+class SharedSnapshots:
+    def __init__(self, root: str = SHARED_SNAPSHOT_DIR, enabled: bool = SHARED_SNAPSHOTS_ENABLED):
+        self.root = root
+        self.enabled = enabled and pyarrow is not None
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+        self._attached: Dict[str, _Attached] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.attaches = 0
+        self.published = 0
+
+    # ---------- paths ----------
+    def _pointer_path(self, key: str) -> str:
+        return os.path.join(self.root, _slug(key) + ".json")
+
+    def _version_path(self, key: str, version: int) -> str:
+        return os.path.join(self.root, f"{_slug(key)}.{version}.arrow")
+
+    # ---------- readers ----------
+    def get(self, key: str, max_age: Optional[float] = SHARED_SNAPSHOT_MAX_AGE) -> Optional[pd.DataFrame]:
+        """The current published frame for key (read-only), or None if there is none or it is too old."""
+        if not self.enabled:
+            return None
+        for _ in range(2):  # the version file can be pruned between pointer read and open
+            try:
+                attached = self._attach(key)
+            except FileNotFoundError:
+                continue
+            break
+        else:
+            attached = None
+
+        if attached is None or (max_age is not None and time.time() - attached.published_at > max_age):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return attached.df
+
+    def _attach(self, key: str) -> Optional[_Attached]:
+        pointer = self._pointer_path(key)
+        try:
+            st = os.stat(pointer)
+        except FileNotFoundError:
+            return None
+        stat_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            current = self._attached.get(key)
+        if current is not None and current.pointer_stat == stat_key:
+            return current
+
+        with open(pointer, encoding="utf-8") as f:
+            info = json.load(f)
+        if current is not None and current.version == info["version"]:
+            current.pointer_stat = stat_key
+            return current
+
+        with metrics.stage("snapshot_attach"):
+            source = pyarrow.memory_map(os.path.join(self.root, info["file"]), "r")
+            df = table_to_frame(pyarrow.ipc.open_file(source).read_all())
+            # hand back the conversion's scratch buffers instead of keeping
+            # them in Arrow's allocator for the life of the worker
+            pyarrow.default_memory_pool().release_unused()
+        attached = _Attached(info["version"], info["published_at"], df, stat_key)
+        with self._lock:
+            self._attached[key] = attached
+            self.attaches += 1
+        return attached
+
+    # ---------- publishers ----------
+    def publish(self, key: str, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Write df as the new version for key and return the mapped copy
+        (callers should use it and drop their own). None when disabled.
+        """
+        if not self.enabled:
+            return None
+        version = time.time_ns()
+        path = self._version_path(key, version)
+        with metrics.stage("snapshot_publish"):
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+            os.close(fd)
+            try:
+                table = frame_to_table(df)
+                with pyarrow.OSFile(tmp, "wb") as sink:
+                    with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+                os.replace(tmp, path)
+
+                fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(
+                        {"version": version, "file": os.path.basename(path), "published_at": time.time()},
+                        f,
+                    )
+                os.replace(tmp, self._pointer_path(key))
+            finally:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+        with self._lock:
+            self.published += 1
+        self._prune(key)
+        return self.get(key, max_age=None)
+
+    def get_or_load(
+        self,
+        key: str,
+        load: Callable[[str], pd.DataFrame],
+        max_age: Optional[float] = SHARED_SNAPSHOT_MAX_AGE,
+    ) -> pd.DataFrame:
+        """A fresh shared frame for key, else load(key) once across processes and publish it."""
+        if not self.enabled:
+            return load(key)
+        df = self.get(key, max_age)
+        if df is not None:
+            return df
+        with self._file_lock(key):
+            df = self.get(key, max_age)  # published while we waited for the lock
+            if df is not None:
+                return df
+            df = load(key)
+            mapped = self.publish(key, df)
+            return mapped if mapped is not None else df
+
+    @contextmanager
+    def _file_lock(self, key: str):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.root, _slug(key) + ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _prune(self, key: str) -> None:
+        paths = sorted(
+            glob.glob(os.path.join(glob.escape(self.root), glob.escape(_slug(key)) + ".*.arrow")),
+            key=lambda p: int(p.rsplit(".", 2)[-2]),
+        )
+        for old in paths[:-KEEP_VERSIONS]:
+            try:
+                os.remove(old)  # mappings already open stay valid
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "root": self.root,
+                "hits": self.hits,
+                "misses": self.misses,
+                "attaches": self.attaches,
+                "published": self.published,
+                "versions": {k: a.version for k, a in self._attached.items()},
+            }
+
+
+shared_snapshots = SharedSnapshots()
+
+
+def shared_samples():
+    s = shared_snapshots.stats()
+    lookups = "Shared snapshot lookups by outcome."
+    yield ("pms_shared_snapshot_lookups_total", "counter", lookups, {"outcome": "hit"}, s["hits"])
+    yield ("pms_shared_snapshot_lookups_total", "counter", lookups, {"outcome": "miss"}, s["misses"])
+    yield ("pms_shared_snapshot_attaches_total", "counter",
+           "Snapshot versions memory-mapped by this process.", {}, s["attaches"])
+    yield ("pms_shared_snapshot_publishes_total", "counter",
+           "Snapshot versions published by this process.", {}, s["published"])
+
+
+metrics.register_collector(shared_samples)
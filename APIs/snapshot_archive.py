@@ -0,0 +1,143 @@
+# snapshot_archive.py
+"""
+Columnar archive of every index snapshot the services fetch.
+
+Snapshots are written as Parquet, partitioned by source, index and trading
+date:
+
+    <PMS_ARCHIVE_DIR>/source=nse/index=NIFTY 50/date=2025-11-28/snapshot.parquet
+
+source is where the frame came from: "nse" for the NSE market-watch CSV
+(portfolio_api), "url" for the file at indices.url (rebalance_api). The two
+are different files for the same index and day, so each keeps its own
+partition. A later fetch from the same source on the same day replaces that
+day's file, so each partition holds the last snapshot seen for the date.
+load_panel() reads a date range from one source back as one long frame
+(DATE, SYMBOL, LTP, 30 D %CHNG, 365 D % CHNG, ...) for the backtester.
+
+pyarrow is optional: without it archiving is a no-op and load_panel raises.
+"""
+import glob
+import logging
+import os
+import re
+import tempfile
+import threading
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Union
+
+import pandas as pd
+
+try:  # optional: Parquet engine
+    import pyarrow  # noqa: F401
+except ImportError:  # pragma: no cover - archiving is skipped instead
+    pyarrow = None
+
+from nse_csv import CHANGE_30D, CHANGE_365D, LTP, SYMBOL
+
+ARCHIVE_DIR = os.path.abspath(os.environ.get("PMS_ARCHIVE_DIR", "snapshot_archive"))
+ARCHIVE_ENABLED = os.environ.get("PMS_ARCHIVE_ENABLED", "1") == "1"
+
+PANEL_COLUMNS = [SYMBOL, LTP, CHANGE_30D, CHANGE_365D]
+
+SOURCE_NSE = "nse"  # NSE market-watch CSV
+SOURCE_URL = "url"  # indices.url download
+SOURCES = (SOURCE_NSE, SOURCE_URL)
+
+logger = logging.getLogger(__name__)
+_write_lock = threading.Lock()
+_UNSAFE = re.compile(r"[\\/:*?\"<>|]")
+
+DateLike = Union[str, date, datetime]
+
+
+def _as_date(value: DateLike) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def index_dir(index_symbol: str, source: str, root: str = ARCHIVE_DIR) -> str:
+    if source not in SOURCES:
+        raise ValueError(f"unknown snapshot source {source!r} (expected one of {', '.join(SOURCES)})")
+    return os.path.join(
+        root, f"source={source}", f"index={_UNSAFE.sub('_', index_symbol.strip())}"
+    )
+
+
+def partition_path(index_symbol: str, source: str, as_of: DateLike, root: str = ARCHIVE_DIR) -> str:
+    return os.path.join(
+        index_dir(index_symbol, source, root), f"date={_as_date(as_of).isoformat()}", "snapshot.parquet"
+    )
+
+
+def archive_snapshot(
+    index_symbol: str,
+    df: pd.DataFrame,
+    source: str,
+    as_of: Optional[DateLike] = None,
+    root: str = ARCHIVE_DIR,
+) -> Optional[str]:
+    """
+    Write one snapshot (a read_market_watch frame) for index_symbol, fetched
+    from `source` (SOURCE_NSE or SOURCE_URL). Never raises on I/O: archiving
+    must not fail the request that fetched the data. Returns the file
+    written, or None if skipped.
+    """
+    if not ARCHIVE_ENABLED or pyarrow is None or df is None or df.empty:
+        return None
+    path = partition_path(index_symbol, source, as_of or date.today(), root)
+    tmp = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write + rename so readers never see a half-written file
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        os.close(fd)
+        df.reset_index(drop=True).to_parquet(tmp, index=False, compression="zstd")
+        with _write_lock:
+            os.replace(tmp, path)
+        return path
+    except Exception:
+        logger.warning("could not archive %s (%s)", index_symbol, source, exc_info=True)
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+
+
+def archived_dates(index_symbol: str, source: str = SOURCE_NSE, root: str = ARCHIVE_DIR) -> List[date]:
+    pattern = os.path.join(index_dir(index_symbol, source, root), "date=*", "snapshot.parquet")
+    out = []
+    for path in glob.glob(pattern):
+        part = os.path.basename(os.path.dirname(path))
+        out.append(date.fromisoformat(part[len("date="):]))
+    return sorted(out)
+
+
+def load_panel(
+    index_symbol: str,
+    start: Optional[DateLike] = None,
+    end: Optional[DateLike] = None,
+    columns: Iterable[str] = PANEL_COLUMNS,
+    source: str = SOURCE_NSE,
+    root: str = ARCHIVE_DIR,
+) -> pd.DataFrame:
+    """Archived snapshots from one source for [start, end] as one frame with a DATE column."""
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required to read the snapshot archive")
+    lo = _as_date(start) if start else date.min
+    hi = _as_date(end) if end else date.max
+    columns = list(columns)
+
+    frames = []
+    for d in archived_dates(index_symbol, source, root):
+        if not lo <= d <= hi:
+            continue
+        part = pd.read_parquet(partition_path(index_symbol, source, d, root))
+        part = part[[c for c in columns if c in part.columns]]
+        part.insert(0, "DATE", pd.Timestamp(d))
+        frames.append(part)
+    if not frames:
+        return pd.DataFrame(columns=["DATE", *columns])
+    return pd.concat(frames, ignore_index=True)
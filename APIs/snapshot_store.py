@@ -0,0 +1,167 @@
+# snapshot_store.py
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("df", "fetched_at")
+
+    def __init__(self, df: pd.DataFrame, fetched_at: float):
+        self.df = df
+        self.fetched_at = fetched_at
+
+
+class SnapshotStore:
+    """
+    Keeps the last parsed DataFrame per index symbol.
+
+    - age < ttl_seconds: served straight from memory.
+    - ttl_seconds <= age < ttl_seconds + stale_seconds: the stale frame is
+      served immediately and a single background refresh is started.
+    - older (or missing): the caller waits for a load; concurrent misses for
+      the same key share one load instead of scraping once each.
+
+    Entries past ttl_seconds + stale_seconds are dropped when looked up or
+    when a load completes, and at most max_entries keys are kept (the oldest
+    fetch is evicted first), so memory follows the set of live keys, not
+    every key ever asked for. A failed background refresh is logged and
+    counted (refresh_failures); the stale frame keeps being served until it
+    expires.
+
+    The cached frames are shared between callers, so treat them as read-only
+    (take a .copy() before mutating). Nothing here depends on the value being
+    a DataFrame; constituents_api caches encoded response bodies the same way.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], pd.DataFrame],
+        ttl_seconds: float = 300.0,
+        stale_seconds: float = 1800.0,
+        max_entries: int = 256,
+    ):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, _Entry] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_failures = 0
+        self.refresh_failures = 0
+        self.last_error: Optional[str] = None
+
+    # ---------- public API ----------
+    def get(self, key: str) -> pd.DataFrame:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.fetched_at
+                if age < self.ttl_seconds:
+                    self.hits += 1
+                    return entry.df
+                if age < self.ttl_seconds + self.stale_seconds:
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        fut = self._start_load(key)
+                        threading.Thread(
+                            target=self._run_load, args=(key, fut, True), daemon=True
+                        ).start()
+                    return entry.df
+                del self._entries[key]
+                self.evictions += 1
+
+            self.misses += 1
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._start_load(key)
+
+        if leader:
+            self._run_load(key, fut)
+        return fut.result()
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._store(key, df)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_failures": self.load_failures,
+                "refresh_failures": self.refresh_failures,
+                "last_error": self.last_error,
+                "inflight": sorted(self._inflight),
+                "entries": {
+                    k: round(now - e.fetched_at, 1) for k, e in self._entries.items()
+                },
+            }
+
+    # ---------- internals ----------
+    def _start_load(self, key: str) -> Future:
+        # caller must hold self._lock
+        fut: Future = Future()
+        self._inflight[key] = fut
+        return fut
+
+    def _store(self, key: str, df: pd.DataFrame) -> None:
+        # caller must hold self._lock
+        now = time.time()
+        self._entries.pop(key, None)
+        self._entries[key] = _Entry(df, now)
+        max_age = self.ttl_seconds + self.stale_seconds
+        expired = [k for k, e in self._entries.items() if now - e.fetched_at >= max_age]
+        for k in expired:
+            del self._entries[k]
+        # dicts keep insertion order and _store re-inserts, so the first keys
+        # are the oldest fetches
+        overflow = max(len(self._entries) - self.max_entries, 0)
+        for k in list(self._entries)[:overflow]:
+            del self._entries[k]
+        self.evictions += len(expired) + overflow
+
+    def _run_load(self, key: str, fut: Future, background: bool = False) -> None:
+        try:
+            df = self.loader(key)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self.last_error = f"{key}: {e!r}"
+                if background:
+                    self.refresh_failures += 1
+                else:
+                    self.load_failures += 1
+            if background:
+                # nobody waits on this future; the stale entry stays in use
+                logger.warning("background refresh of %s failed", key, exc_info=True)
+            fut.set_exception(e)
+            return
+
+        with self._lock:
+            self._store(key, df)
+            self._inflight.pop(key, None)
+        fut.set_result(df)
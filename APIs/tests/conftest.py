@@ -0,0 +1,56 @@
+# conftest.py
+"""
+Tests run against the SQLite stand-in, with metrics, shared snapshots,
+the archive, the Chrome warm-up and the chromedriver download off. The environment is set here, before
+any API module is imported, because the modules read it at import time.
+
+    cd APIs && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ["PMS_DB_BACKEND"] = "sqlite"
+os.environ.setdefault("PMS_SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="pms_tests_"), "t.sqlite3"))
+os.environ.setdefault("PMS_METRICS_ENABLED", "0")
+os.environ.setdefault("PMS_SHARED_SNAPSHOTS", "0")
+os.environ.setdefault("PMS_ARCHIVE_ENABLED", "0")
+os.environ.setdefault("PMS_WARMUP", "0")
+os.environ.setdefault("PMS_DRIVER_ALLOW_DOWNLOAD", "0")
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+SAMPLE_CSV = os.path.join(API_DIR, "nse_indices_downloads_api", "MW-NIFTY-50-28-Nov-2025.csv")
+
+
+@pytest.fixture
+def sample_csv() -> bytes:
+    with open(SAMPLE_CSV, "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def standin_db():
+    """A fresh stand-in schema; every table is dropped afterwards."""
+    from database_helper import create_standin_schema, db_session
+
+    create_standin_schema()
+    yield
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        for (name,) in cur.fetchall():
+            cur.execute(f"DROP TABLE {name}")
+        conn.commit()
+        cur.close()
+
+
+@pytest.fixture
+def migrated_db(standin_db):
+    """The stand-in schema after `python migrate.py`."""
+    from migrate import migrate
+
+    migrate()
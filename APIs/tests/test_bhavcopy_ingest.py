@@ -0,0 +1,99 @@
+# test_bhavcopy_ingest.py
+import pytest
+
+import bhavcopy_ingest
+from bhavcopy_ingest import run_ingest
+from database_helper import db_session
+
+HEADER = "SYMBOL, SERIES, DATE1, PREV_CLOSE, OPEN_PRICE, HIGH_PRICE, LOW_PRICE, CLOSE_PRICE, TTL_TRD_QNTY\n"
+
+
+def write_day(tmp_path, day, closes):
+    path = tmp_path / f"sec_bhavdata_full_{day.replace('-', '')}.csv"
+    rows = [f"{sym}, EQ, {day}, 1, 1, 1, 1, {close}, 100\n" for sym, close in closes.items()]
+    path.write_text(HEADER + "".join(rows))
+    return str(path)
+
+
+def latest():
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT SYMBOL, CLOSE_PRICE FROM bhavcopy_data ORDER BY SYMBOL")
+        out = dict(cur.fetchall())
+        cur.close()
+    return out
+
+
+def recreate_bhavcopy_data(ddl):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("DROP TABLE bhavcopy_data")
+        cur.execute(ddl)
+        conn.commit()
+        cur.close()
+
+
+@pytest.fixture
+def days(tmp_path):
+    return [
+        write_day(tmp_path, "02-Jan-2025", {"SBIN": 780.0, "INFY": 1900.0}),
+        write_day(tmp_path, "03-Jan-2025", {"SBIN": 790.5}),
+        write_day(tmp_path, "06-Jan-2025", {"SBIN": 801.25, "TCS": 4100.0}),
+    ]
+
+
+def test_latest_close_is_refreshed_once_per_run(standin_db, days, monkeypatch):
+    calls = []
+    refresh = bhavcopy_ingest.refresh_latest
+    monkeypatch.setattr(bhavcopy_ingest, "refresh_latest",
+                        lambda conn, columns, dates=None: calls.append(dates) or refresh(conn, columns, dates))
+
+    stats = run_ingest(days)
+    assert stats["dates"] == 3 and stats["failed"] == 0
+    assert calls == [["2025-01-02", "2025-01-03", "2025-01-06"]]
+    assert stats["latest_symbols"] == 3
+    assert latest() == {"INFY": 1900.0, "SBIN": 801.25, "TCS": 4100.0}
+
+
+def test_backfilled_older_day_keeps_the_newer_close(standin_db, days):
+    run_ingest(days[1:])
+    run_ingest(days[:1])
+    assert latest() == {"INFY": 1900.0, "SBIN": 801.25, "TCS": 4100.0}
+
+
+def test_rebuild_latest_covers_every_symbol(standin_db, days):
+    run_ingest(days)
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM bhavcopy_data")
+        conn.commit()
+        cur.close()
+    assert run_ingest([])["latest_symbols"] == 0  # nothing loaded, nothing refreshed
+    assert run_ingest([], rebuild_latest=True)["latest_symbols"] == 3
+    assert latest()["SBIN"] == 801.25
+
+
+def test_extra_bhavcopy_columns_are_filled(standin_db, days):
+    recreate_bhavcopy_data(
+        "CREATE TABLE bhavcopy_data (SYMBOL TEXT PRIMARY KEY, SERIES TEXT NOT NULL, "
+        "DATE1 TEXT NOT NULL, CLOSE_PRICE REAL NOT NULL, NOTE TEXT NOT NULL DEFAULT '')"
+    )
+    run_ingest(days)
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT SERIES, DATE1, CLOSE_PRICE FROM bhavcopy_data WHERE SYMBOL = 'SBIN'")
+        assert cur.fetchone() == ("EQ", "2025-01-06", 801.25)
+        cur.close()
+
+
+def test_unfillable_not_null_column_stops_the_run_before_loading(standin_db, days):
+    recreate_bhavcopy_data(
+        "CREATE TABLE bhavcopy_data (SYMBOL TEXT PRIMARY KEY, CLOSE_PRICE REAL, SECTOR TEXT NOT NULL)"
+    )
+    with pytest.raises(RuntimeError, match="bhavcopy_data.SECTOR"):
+        run_ingest(days)
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COUNT(*) FROM bhavcopy_history")
+        assert cur.fetchone()[0] == 0
+        cur.close()
@@ -0,0 +1,94 @@
+# test_bulk_rebalance.py
+from datetime import datetime, timedelta
+
+import pytest
+
+import bulk_rebalance
+from database_helper import db_session
+from nse_csv import read_market_watch
+
+HOLDINGS = [("M&M", 3700.0, 5), ("SBIN", 980.0, 20), ("OLD1", 100.0, 50), ("OLD2", 50.0, 100)]
+
+
+@pytest.fixture
+def shared_portfolio(migrated_db, sample_csv, monkeypatch):
+    """One portfolio with two subscribers, both past the 30-day window."""
+    df_index = read_market_watch(sample_csv)
+    monkeypatch.setattr(bulk_rebalance, "fetch_index_csv", lambda symbol, url: df_index)
+    long_ago = datetime.utcnow() - timedelta(days=90)
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO indices (symbol, url) VALUES ('NIFTY 50', 'http://stand-in')")
+        cur.execute("INSERT INTO portfolios (portfolio_name, index_symbol) VALUES ('shared', 'NIFTY 50')")
+        pid = cur.lastrowid
+        cur.executemany(
+            "INSERT INTO user_portfolios (user_id, portfolio_id, total_invested, last_rebalanced_at) "
+            "VALUES (%s, %s, %s, %s)",
+            [(1, pid, 120_000.0, long_ago), (2, pid, 110_000.0, None)],
+        )
+        cur.executemany(
+            """
+            INSERT INTO portfolio_holdings
+            (portfolio_id, symbol, date_of_purchase, buy_price, current_price,
+             quantity, invested_amount, current_value, pl_amount, pl_percent)
+            VALUES (%s, %s, '2025-01-01', %s, %s, %s, %s, %s, 0, 0)
+            """,
+            [(pid, sym, price, price, qty, price * qty, price * qty) for sym, price, qty in HOLDINGS],
+        )
+        conn.commit()
+        cur.close()
+    return pid
+
+
+def snapshot(pid):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT symbol, quantity, invested_amount FROM portfolio_holdings "
+            "WHERE portfolio_id = %s ORDER BY symbol", (pid,)
+        )
+        holdings = cur.fetchall()
+        cur.execute("SELECT COUNT(*) FROM portfolio_transactions")
+        txns = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM rebalance_ledger")
+        ledger = cur.fetchone()[0]
+        cur.execute(
+            "SELECT user_id, total_invested, last_rebalanced_at FROM user_portfolios "
+            "WHERE portfolio_id = %s ORDER BY user_id", (pid,)
+        )
+        links = cur.fetchall()
+        cur.close()
+    return holdings, txns, ledger, links
+
+
+def test_due_portfolio_is_rebalanced_once_for_all_subscribers(shared_portfolio):
+    stats = bulk_rebalance.run_bulk_rebalance()
+    assert (stats["due"], stats["rebalanced"], stats["failed"]) == (1, 1, 0)
+
+    holdings, txns, ledger, links = snapshot(shared_portfolio)
+    assert txns > 0 and ledger == 1
+    assert all(at is not None for _, _, at in links)
+    # both subscribers are marked with the same capital
+    assert len({total for _, total, _ in links}) == 1
+
+
+def test_second_run_makes_no_changes(shared_portfolio):
+    bulk_rebalance.run_bulk_rebalance()
+    before = snapshot(shared_portfolio)
+
+    stats = bulk_rebalance.run_bulk_rebalance()
+    assert (stats["due"], stats["rebalanced"]) == (0, 0)
+    assert snapshot(shared_portfolio) == before
+
+
+def test_cash_comes_from_the_portfolio(shared_portfolio, monkeypatch):
+    seen = []
+
+    def record(df_index, jobs):
+        seen.extend(free_cash for _, _, _, free_cash in jobs)
+        return []
+
+    monkeypatch.setattr(bulk_rebalance, "rebalance_chunk", record)
+    bulk_rebalance.run_bulk_rebalance(dry_run=True)
+    invested = sum(price * qty for _, price, qty in HOLDINGS)
+    assert seen == [pytest.approx(120_000.0 - invested)]
@@ -0,0 +1,126 @@
+# test_index_download.py
+"""index_download against the local index-host stand-in (benchmarks/stand_ins.py)."""
+import os
+
+import pytest
+from requests.exceptions import HTTPError, Timeout
+
+import index_download
+from benchmarks.stand_ins import IndexFiles, start, stop
+from benchmarks.synthetic import make_market_watch_csv
+from index_download import DownloadCache, download, fetch_frame
+from nse_csv import read_market_watch
+
+BODY = make_market_watch_csv(50).encode()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(index_download, "DOWNLOAD_BACKOFF", 0.01)
+    server = start(IndexFiles, files={"/50.csv": BODY, "/copy.csv": BODY})
+    yield server
+    stop(server)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(str(tmp_path))
+
+
+def blobs(cache):
+    return sorted(os.listdir(os.path.join(cache.root, "blobs")))
+
+
+def test_first_download_is_stored(server, cache):
+    dl = download(server.base + "/50.csv", cache)
+    assert dl.status == 200 and dl.content == BODY
+    assert cache.read(dl.sha256) == BODY
+    assert cache.lookup(server.base + "/50.csv")["etag"]
+    assert server.state.hits["200"] == 1
+
+
+def test_unchanged_file_is_served_from_the_blob(server, cache):
+    first = download(server.base + "/50.csv", cache)
+    again = download(server.base + "/50.csv", cache)
+    assert again.status == 304 and again.sha256 == first.sha256 and again.content == BODY
+    assert (server.state.hits["200"], server.state.hits["304"]) == (1, 1)
+
+
+def test_gzip_is_decoded(server, cache):
+    # the session asks for gzip and the stand-in compresses; content is the CSV
+    assert download(server.base + "/50.csv", cache).content.startswith(b'"SYMBOL')
+
+
+def test_changed_file_replaces_and_prunes_the_old_blob(server, cache):
+    url = server.base + "/50.csv"
+    first = download(url, cache)
+    server.state.files["/50.csv"] = make_market_watch_csv(50, seed=1).encode()
+    changed = download(url, cache)
+    assert changed.status == 200 and changed.sha256 != first.sha256
+    assert blobs(cache) == [changed.sha256 + ".csv"]
+
+
+def test_blob_still_referenced_by_another_url_is_kept(server, cache):
+    first = download(server.base + "/50.csv", cache)
+    download(server.base + "/copy.csv", cache)
+    server.state.files["/50.csv"] = make_market_watch_csv(50, seed=1).encode()
+    changed = download(server.base + "/50.csv", cache)
+    assert blobs(cache) == sorted([first.sha256 + ".csv", changed.sha256 + ".csv"])
+    assert download(server.base + "/copy.csv", cache).status == 304
+
+
+def test_pruned_blob_is_downloaded_again(server, cache):
+    url = server.base + "/50.csv"
+    first = download(url, cache)
+    os.remove(os.path.join(cache.root, "blobs", first.sha256 + ".csv"))
+    assert cache.lookup(url) is None
+    again = download(url, cache)
+    assert again.status == 200 and again.content == BODY
+    assert server.state.hits["304"] == 0
+
+
+def test_corrupt_blob_after_304_is_downloaded_again(server, cache):
+    first = download(server.base + "/50.csv", cache)
+    with open(os.path.join(cache.root, "blobs", first.sha256 + ".csv"), "wb") as f:
+        f.write(b"truncated")
+    again = download(server.base + "/50.csv", cache)
+    assert again.status == 200 and again.content == BODY
+    assert server.state.hits["304"] == 1
+
+
+def test_503_is_retried(server, cache):
+    server.state.flaky_left = 2
+    retries = index_download.stats()["retries"]
+    dl = download(server.base + "/flaky", cache)
+    assert dl.status == 200 and dl.content == BODY
+    assert server.state.hits["503"] == 2
+    assert index_download.stats()["retries"] == retries + 2
+
+
+def test_503_after_the_last_retry_raises(server, cache):
+    server.state.flaky_left = index_download.DOWNLOAD_RETRIES + 1
+    with pytest.raises(HTTPError):
+        download(server.base + "/flaky", cache)
+
+
+def test_timeout_raises(server, cache, monkeypatch):
+    monkeypatch.setattr(index_download, "DOWNLOAD_RETRIES", 0)
+    with pytest.raises(Timeout):
+        download(server.base + "/slow", cache, timeout=0.2)
+
+
+def test_fetch_frame_reuses_the_parsed_frame(server, cache):
+    url = server.base + "/50.csv"
+    df = fetch_frame(url, read_market_watch, cache)
+    assert len(df) == 51  # index row + 50 stocks
+    assert fetch_frame(url, read_market_watch, cache) is df
+    server.state.files["/50.csv"] = make_market_watch_csv(50, seed=2).encode()
+    assert fetch_frame(url, read_market_watch, cache) is not df
+
+
+def test_unwritable_cache_still_returns_the_body(server, tmp_path, caplog):
+    root = tmp_path / "cache"
+    root.write_text("not a directory")
+    dl = download(server.base + "/50.csv", DownloadCache(str(root)))
+    assert dl.status == 200 and dl.content == BODY
+    assert "could not cache" in caplog.text
@@ -0,0 +1,79 @@
+# test_migrate.py
+import pytest
+
+import rebalance_api
+from database_helper import db_session
+from migrate import check_schema, migrate, missing_schema
+from portfolio_summary import get_user_summary
+
+
+def add_portfolio(cur, user_id, holdings):
+    cur.execute("INSERT INTO portfolios (portfolio_name, index_symbol) VALUES ('p', 'NIFTY 50')")
+    pid = cur.lastrowid
+    cur.execute("INSERT INTO user_portfolios (user_id, portfolio_id) VALUES (%s, %s)", (user_id, pid))
+    cur.executemany(
+        """
+        INSERT INTO portfolio_holdings
+        (portfolio_id, symbol, date_of_purchase, buy_price, current_price,
+         quantity, invested_amount, current_value, pl_amount, pl_percent)
+        VALUES (%s, %s, '2025-01-01', 0, 0, 1, %s, %s, 0, 0)
+        """,
+        [(pid, sym, invested, current) for sym, invested, current in holdings],
+    )
+
+
+def test_unmigrated_schema_is_refused(standin_db):
+    assert "portfolio_summaries" in missing_schema()
+    with pytest.raises(RuntimeError, match="python migrate.py"):
+        check_schema()
+    with pytest.raises(RuntimeError, match="python migrate.py"):
+        rebalance_api.require_schema()
+
+
+def test_migrate_creates_and_backfills(standin_db):
+    with db_session() as conn:
+        cur = conn.cursor()
+        add_portfolio(cur, 7, [("A", 100.0, 150.0), ("B", 200.0, 180.0)])
+        add_portfolio(cur, 7, [])
+        conn.commit()
+        cur.close()
+
+    stats = migrate()
+    assert stats["summaries"]["portfolios"] == 2 and stats["summaries"]["users"] == 1
+    assert missing_schema() == []
+    rebalance_api.require_schema()
+    summary = get_user_summary(7)
+    assert summary["total_portfolios"] == 2
+    assert (summary["total_investment"], summary["total_current"]) == (300.0, 330.0)
+
+
+def test_migrate_can_run_again(migrated_db):
+    migrate()
+    assert missing_schema() == []
+
+
+def test_missing_link_column_is_reported(migrated_db):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("DROP INDEX idx_txn_rebalance")
+        cur.execute("ALTER TABLE portfolio_transactions DROP COLUMN rebalance_id")
+        conn.commit()
+        cur.close()
+    assert missing_schema() == ["portfolio_transactions.rebalance_id"]
+    migrate()
+    assert missing_schema() == []
+
+
+def test_migrate_links_older_transactions(standin_db):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO portfolio_transactions (portfolio_id, user_id, symbol, txn_type, quantity, "
+            "price, amount, reason, created_at) VALUES (1, 7, %s, 'BUY', 1, 10, 10, 'r', '2025-01-01 10:00:00')",
+            [("A",), ("B",)],
+        )
+        conn.commit()
+        cur.close()
+
+    stats = migrate()
+    assert (stats["ledger"]["rebalances"], stats["ledger"]["linked_trades"]) == (1, 2)
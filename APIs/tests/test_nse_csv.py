@@ -0,0 +1,68 @@
+# test_nse_csv.py
+"""nse_csv.read_market_watch on the checked-in NSE download and edge cases of the format."""
+import io
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import SAMPLE_CSV
+from nse_csv import (
+    CHANGE_30D,
+    CHANGE_365D,
+    LTP,
+    NUMERIC_COLUMNS,
+    SYMBOL,
+    read_market_watch,
+    require_columns,
+)
+
+HEADER = '"SYMBOL \n","LTP \n","30 D   %CHNG \n","VOLUME \n(shares)"\n'
+
+
+def test_checked_in_file():
+    df = read_market_watch(SAMPLE_CSV)
+    assert df.shape == (51, 15)
+    assert df[SYMBOL].iloc[0] == "NIFTY 50" and df[SYMBOL].iloc[1] == "M&M"
+    assert df[LTP].iloc[1] == 3753.90
+    # Indian digit grouping, "14,95,26,948"
+    assert df["VOLUME (shares)"].iloc[0] == 149526948.0
+    assert df[CHANGE_30D].iloc[0] == 0.96 and df[CHANGE_365D].iloc[0] == 8.35
+    # "-" cells
+    assert df["INDICATIVE CLOSE"].isna().all()
+    for col in NUMERIC_COLUMNS:
+        assert df[col].dtype == np.float64, col
+    assert df[SYMBOL].map(type).eq(str).all()
+
+
+def test_path_bytes_and_file_object_agree(sample_csv):
+    from_path = read_market_watch(SAMPLE_CSV)
+    assert from_path.equals(read_market_watch(sample_csv))
+    assert from_path.equals(read_market_watch(io.BytesIO(sample_csv)))
+
+
+def test_usecols_takes_canonical_names(sample_csv):
+    df = read_market_watch(sample_csv, usecols=[SYMBOL, LTP, CHANGE_30D])
+    assert list(df.columns) == [SYMBOL, LTP, CHANGE_30D]
+    assert df[LTP].equals(read_market_watch(sample_csv)[LTP])
+
+
+def test_repeated_header_row_is_dropped():
+    data = (HEADER + '"SYMBOL","LTP","30 D %CHNG","VOLUME (shares)"\n'
+            '"TCS","3,101.50","-1.25","1,23,456"\n').encode()
+    df = read_market_watch(data)
+    assert list(df[SYMBOL]) == ["TCS"]
+    assert (df[LTP].iloc[0], df[CHANGE_30D].iloc[0], df["VOLUME (shares)"].iloc[0]) == (3101.5, -1.25, 123456.0)
+
+
+def test_currency_and_percent_signs_are_stripped():
+    data = (HEADER + '"TCS","₹3,101.50","4.5%","-"\n"INFY","n/a","-","10"\n').encode()
+    df = read_market_watch(data)
+    assert df[LTP].iloc[0] == 3101.5 and df[CHANGE_30D].iloc[0] == 4.5
+    assert np.isnan(df[LTP].iloc[1]) and np.isnan(df["VOLUME (shares)"].iloc[0])
+
+
+def test_require_columns():
+    df = read_market_watch(SAMPLE_CSV, usecols=[SYMBOL, LTP])
+    require_columns(df, [SYMBOL, LTP])
+    with pytest.raises(RuntimeError, match="365 D % CHNG"):
+        require_columns(df, [CHANGE_365D])
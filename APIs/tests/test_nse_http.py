@@ -0,0 +1,66 @@
+# test_nse_http.py
+"""NSEClient and portfolio_api's browser fallback against the NSE stand-in (benchmarks/stand_ins.py)."""
+import pytest
+
+from benchmarks.stand_ins import NSE, start, stop
+from benchmarks.synthetic import make_market_watch_csv
+from nse_http import NSEClient, NSEFetchError
+
+ROWS = 50
+
+
+@pytest.fixture
+def server():
+    server = start(NSE, csv=make_market_watch_csv(ROWS).encode())
+    yield server
+    stop(server)
+
+
+@pytest.fixture
+def client(server):
+    return NSEClient(base_url=server.base, timeout=5)
+
+
+def test_handshake_then_csv(server, client):
+    df = client.fetch_frame("NIFTY 50")
+    assert len(df) == ROWS + 1  # index row + stocks
+    assert client.bootstraps == 1
+    assert (server.state.hits["page"], server.state.hits["csv"]) == (1, 1)
+
+
+def test_cookies_are_reused(server, client):
+    client.fetch_frame("NIFTY 50")
+    client.fetch_frame("NIFTY 50")
+    assert client.bootstraps == 1 and server.state.hits["page"] == 1
+
+
+def test_rotated_cookie_gets_one_new_handshake(server, client):
+    client.fetch_frame("NIFTY 50")
+    server.state.cookie = "rotated"  # server-side expiry: the next call gets a 401
+    assert len(client.fetch_frame("NIFTY 50")) == ROWS + 1
+    assert client.bootstraps == 2 and server.state.hits["401"] == 1
+
+
+def test_html_body_is_rejected(client):
+    with pytest.raises(NSEFetchError, match="unexpected response"):
+        client.fetch_frame("BLOCKED")
+
+
+def test_failed_handshake_raises(server):
+    with pytest.raises(NSEFetchError, match="cookie bootstrap failed"):
+        NSEClient(base_url=server.base + "/nowhere", timeout=5).fetch_frame("NIFTY 50")
+
+
+def test_portfolio_api_falls_back_to_the_browser(server, monkeypatch, caplog):
+    import portfolio_api
+
+    calls = []
+    monkeypatch.setattr(portfolio_api, "scrape_index_df_browser",
+                        lambda symbol: calls.append(symbol) or "browser")
+    monkeypatch.setattr(portfolio_api, "nse_client", NSEClient(base_url=server.base, timeout=5))
+    monkeypatch.setattr(portfolio_api, "http_fallbacks", 0)
+
+    assert len(portfolio_api.scrape_index_df("NIFTY 50")) == ROWS + 1 and not calls
+    assert portfolio_api.scrape_index_df("BLOCKED") == "browser" and calls == ["BLOCKED"]
+    assert portfolio_api.http_fallbacks == 1
+    assert "HTTP fetch for BLOCKED failed, using the browser" in caplog.text
@@ -0,0 +1,70 @@
+# test_portfolio_summary.py
+from fastapi.testclient import TestClient
+
+import rebalance_api
+from database_helper import db_session
+from portfolio_summary import get_user_summary
+
+
+def add_holding(cur, portfolio_id, invested, current):
+    cur.execute(
+        """
+        INSERT INTO portfolio_holdings
+        (portfolio_id, symbol, date_of_purchase, buy_price, current_price,
+         quantity, invested_amount, current_value, pl_amount, pl_percent)
+        VALUES (%s, 'X', '2025-01-01', 0, 0, 1, %s, %s, 0, 0)
+        """,
+        (portfolio_id, invested, current),
+    )
+
+
+def rows(table):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute(f"SELECT * FROM {table}")
+        out = cur.fetchall()
+        cur.close()
+    return out
+
+
+def test_missing_row_falls_back_to_the_live_aggregate(migrated_db):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO portfolios (portfolio_name, index_symbol) VALUES ('p', 'NIFTY 50')")
+        pid = cur.lastrowid
+        cur.execute("INSERT INTO user_portfolios (user_id, portfolio_id) VALUES (3, %s)", (pid,))
+        add_holding(cur, pid, 100.0, 125.0)
+        conn.commit()
+        cur.close()
+
+    assert rows("user_summaries") == []  # written after the migration, not refreshed
+    summary = get_user_summary(3)
+    assert (summary["total_portfolios"], summary["total_investment"], summary["total_current"]) == (1, 100.0, 125.0)
+    assert get_user_summary(99)["total_portfolios"] == 0
+
+
+def test_refresh_endpoint_rebuilds_portfolios_and_users(migrated_db):
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO portfolios (portfolio_name, index_symbol) VALUES ('p', 'NIFTY 50')")
+        pid = cur.lastrowid
+        cur.executemany("INSERT INTO user_portfolios (user_id, portfolio_id) VALUES (%s, %s)", [(1, pid), (2, pid)])
+        add_holding(cur, pid, 100.0, 90.0)
+        conn.commit()
+        cur.close()
+
+    client = TestClient(rebalance_api.app)
+    assert client.post("/refresh_summaries", json={"portfolio_ids": [pid]}).json() == {"success": True}
+    assert [r[:4] for r in rows("portfolio_summaries")] == [(pid, 1, 100.0, 90.0)]
+    assert sorted(r[:4] for r in rows("user_summaries")) == [(1, 1, 100.0, 90.0), (2, 1, 100.0, 90.0)]
+
+    # user 2 unsubscribes: the portfolio no longer names them, the user id does
+    with db_session() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM user_portfolios WHERE user_id = 2")
+        cur.execute("DELETE FROM user_summaries WHERE user_id = 2")
+        conn.commit()
+        cur.close()
+    client.post("/refresh_summaries", json={"portfolio_ids": [pid], "user_ids": [2]})
+    assert [r[0] for r in rows("user_summaries")] == [1]
+    assert client.get("/user_summary/2").json()["total_portfolios"] == 0
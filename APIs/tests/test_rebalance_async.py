@@ -0,0 +1,91 @@
+# test_rebalance_async.py
+import asyncio
+import time
+
+import httpx
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+
+import rebalance_api
+from shared_snapshots import SharedSnapshots
+
+STAGE_SECONDS = 0.2
+HOLDINGS = pd.DataFrame({"SYMBOL": ["TCS"], "LTP": [3000.0], "QUANTITY": [1],
+                         "INVESTED AMOUNT": [3000.0], "DATE OF PURCHASE": ["2025-01-01"]})
+
+
+class FakeClient:
+    def __init__(self, content: bytes, delay: float = STAGE_SECONDS):
+        self.content = content
+        self.delay = delay
+        self.calls = 0
+        self.completed = 0
+
+    async def get(self, url):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        self.completed += 1
+        return httpx.Response(200, content=self.content, request=httpx.Request("GET", url))
+
+
+def slow(result=None, error=None):
+    def stage(*args, **kwargs):
+        time.sleep(STAGE_SECONDS)
+        if error is not None:
+            raise error
+        return result
+    return stage
+
+
+@pytest.fixture
+def stubbed(monkeypatch, sample_csv, tmp_path):
+    client = FakeClient(sample_csv)
+    monkeypatch.setattr(rebalance_api, "get_async_http", lambda: client)
+    monkeypatch.setattr(rebalance_api, "get_index_info", lambda pid, conn=None: ("NIFTY 50", "http://stand-in"))
+    monkeypatch.setattr(rebalance_api, "archive_snapshot", lambda *a: None)
+    monkeypatch.setattr(rebalance_api, "shared_snapshots", SharedSnapshots(root=str(tmp_path), enabled=True))
+    monkeypatch.setattr(rebalance_api, "check_30d_rule", slow())
+    monkeypatch.setattr(rebalance_api, "load_holdings_df", slow(HOLDINGS))
+    monkeypatch.setattr(rebalance_api, "get_free_cash_and_total", slow((500.0, 3500.0)))
+    return client
+
+
+def test_reads_and_fetch_overlap(stubbed):
+    t0 = time.perf_counter()
+    holdings, free_cash, df_index = asyncio.run(rebalance_api.reads_and_fetch(1, 1))
+    elapsed = time.perf_counter() - t0
+
+    assert holdings is HOLDINGS and free_cash == 500.0 and len(df_index) > 0
+    # four stages of STAGE_SECONDS each: the slowest, not the sum
+    assert elapsed < 3 * STAGE_SECONDS
+
+
+def test_first_failure_cancels_the_rest(stubbed, monkeypatch):
+    stubbed.delay = 5.0
+    refused = HTTPException(status_code=400, detail="Portfolio can be updated only after 30 days")
+    monkeypatch.setattr(rebalance_api, "check_30d_rule", slow(error=refused))
+
+    t0 = time.perf_counter()
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(rebalance_api.reads_and_fetch(1, 1))
+    assert e.value is refused
+    assert time.perf_counter() - t0 < 2 * STAGE_SECONDS + 1
+    assert stubbed.completed == 0
+
+
+def test_concurrent_misses_download_once(stubbed):
+    async def both():
+        return await asyncio.gather(*(rebalance_api.fetch_index_csv_async(1) for _ in range(4)))
+
+    frames = asyncio.run(both())
+    assert stubbed.calls == 1
+    assert all(f.equals(frames[0]) for f in frames)
+
+
+def test_first_failure_returns_results_in_order():
+    async def value(v, delay):
+        await asyncio.sleep(delay)
+        return v
+
+    assert asyncio.run(rebalance_api.first_failure(value(1, 0.05), value(2, 0))) == [1, 2]
@@ -0,0 +1,63 @@
+# test_rebalance_equivalence.py
+"""
+run_update_portfolio_logic against the row-by-row original
+(benchmarks/reference_impl.py) on seeded random portfolios: overlap with
+the new top N, holdings that left the index, duplicate symbols, prices too
+dear to buy and NaN prices. Each seed is its own case, so a failure names
+the seed that reproduces it.
+"""
+import math
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.reference_impl import run_update_portfolio_logic_reference
+from benchmarks.synthetic import make_holdings, make_market_watch_csv
+from nse_csv import read_market_watch
+from rebalance_api import run_update_portfolio_logic
+
+SEEDS = range(200)
+
+
+def assert_same(old, new):
+    a, b = old["portfolio_df"], new["portfolio_df"]
+    assert len(a) == len(b)
+    if len(a):
+        pd.testing.assert_frame_equal(
+            a.reset_index(drop=True), b[list(a.columns)].reset_index(drop=True),
+            check_dtype=False,
+        )
+    # both sum the sold positions exactly (math.fsum); the tolerance is for
+    # anything else that rounds differently, not for summation order
+    assert math.isclose(old["free_cash"], new["free_cash"], rel_tol=1e-9, abs_tol=1e-6)
+    for key in ("sold_symbols", "new_entries", "common_stocks"):
+        assert sorted(old[key]) == sorted(new[key]), key
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_matches_reference_on_random_portfolios(seed):
+    rng = random.Random(seed)
+    n_rows = rng.choice((5, 20, 50, 120))
+    df_index = read_market_watch(make_market_watch_csv(n_rows, seed=seed).encode())
+    if rng.random() < 0.2:
+        df_index.loc[df_index.sample(frac=0.1, random_state=seed).index, "LTP"] = np.nan
+    holdings = make_holdings(df_index, rng.randint(0, n_rows), rng)
+    no_of_stocks = rng.randint(1, n_rows)
+    free_cash = rng.choice((0.0, 1_000.0, rng.uniform(0, 5e6)))
+
+    assert_same(
+        run_update_portfolio_logic_reference(df_index, holdings, no_of_stocks, free_cash),
+        run_update_portfolio_logic(df_index, holdings, no_of_stocks, free_cash),
+    )
+
+
+@pytest.mark.parametrize("n", [50, 500, 5000])
+def test_matches_reference_at_benchmark_sizes(n):
+    df_index = read_market_watch(make_market_watch_csv(n, seed=n).encode())
+    holdings = make_holdings(df_index, n // 2, random.Random(n))
+    assert_same(
+        run_update_portfolio_logic_reference(df_index, holdings, n // 2, 1_000_000.0),
+        run_update_portfolio_logic(df_index, holdings, n // 2, 1_000_000.0),
+    )
@@ -0,0 +1,57 @@
+# test_snapshot_archive.py
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import snapshot_archive
+from nse_csv import LTP, SYMBOL
+from snapshot_archive import SOURCE_NSE, SOURCE_URL, archive_snapshot, archived_dates, load_panel
+
+pytest.importorskip("pyarrow")
+
+DAY = date(2025, 11, 28)
+
+
+@pytest.fixture(autouse=True)
+def archiving(monkeypatch):
+    monkeypatch.setattr(snapshot_archive, "ARCHIVE_ENABLED", True)
+
+
+def frame(price):
+    return pd.DataFrame({SYMBOL: ["NIFTY 50", "SBIN"], LTP: [26000.0, price]})
+
+
+def test_sources_keep_separate_partitions(tmp_path):
+    root = str(tmp_path)
+    nse = archive_snapshot("NIFTY 50", frame(980.0), SOURCE_NSE, as_of=DAY, root=root)
+    url = archive_snapshot("NIFTY 50", frame(975.5), SOURCE_URL, as_of=DAY, root=root)
+    assert nse != url
+    assert "source=nse" in nse and "source=url" in url
+
+    for source, price in ((SOURCE_NSE, 980.0), (SOURCE_URL, 975.5)):
+        panel = load_panel("NIFTY 50", columns=[SYMBOL, LTP], source=source, root=root)
+        assert panel[LTP].tolist() == [26000.0, price]
+        assert archived_dates("NIFTY 50", source, root) == [DAY]
+
+
+def test_same_source_same_day_replaces(tmp_path):
+    root = str(tmp_path)
+    archive_snapshot("NIFTY 50", frame(980.0), SOURCE_NSE, as_of=DAY, root=root)
+    archive_snapshot("NIFTY 50", frame(990.0), SOURCE_NSE, as_of=DAY, root=root)
+    panel = load_panel("NIFTY 50", columns=[SYMBOL, LTP], root=root)
+    assert panel[LTP].tolist() == [26000.0, 990.0]
+
+
+def test_unknown_source_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="unknown snapshot source"):
+        archive_snapshot("NIFTY 50", frame(980.0), "browser", as_of=DAY, root=str(tmp_path))
+    with pytest.raises(ValueError):
+        load_panel("NIFTY 50", source="browser", root=str(tmp_path))
+
+
+def test_write_failure_is_logged_not_raised(tmp_path, caplog):
+    blocker = tmp_path / "source=nse"
+    blocker.write_text("not a directory")
+    assert archive_snapshot("NIFTY 50", frame(980.0), SOURCE_NSE, as_of=DAY, root=str(tmp_path)) is None
+    assert "could not archive NIFTY 50 (nse)" in caplog.text
@@ -0,0 +1,491 @@
+# trade_ledger.py
+"""
+Append-only rebalance ledger and its history reads.
+
+Every rebalance writes:
+  - one row to rebalance_ledger: who, which portfolio, when, and the totals
+    of the rebalance (trades, bought / sold amount, invested before and
+    after);
+  - one row per trade to portfolio_transactions, as before, carrying the
+    rebalance_id of its ledger row (a nullable column migrate.py adds), so
+    trades are joined to their rebalance by id, not by time.
+
+Rows are never updated. LedgerWriter buffers the rebalances recorded during
+a transaction and writes them in flush(cur): one INSERT per ledger row, for
+its id, and multi-row INSERTs for the trades, so a rebalance costs two
+statements however many trades it has. bulk_rebalance flushes once per
+commit chunk, not once per portfolio.
+
+History is read newest first with keyset pagination. The page cursor is
+the (created_at, rebalance_id) of the last row, so a page is one range scan
+that starts where the previous page ended, not an OFFSET that re-reads
+every earlier row. The index on rebalance_ledger covers the whole query, so
+the table itself is never touched:
+
+    (user_id, portfolio_id, created_at, rebalance_id,
+     trades, buy_amount, sell_amount, invested_before, invested_after)
+
+The tables are created and backfilled by `python migrate.py`.
+
+    python trade_ledger.py --backfill    # ledger rows for older portfolio_transactions
+"""
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+from database_helper import db_session, is_sqlite
+
+REBALANCE_REASON = "30D rebalance"
+HISTORY_PAGE_SIZE = 24
+HISTORY_MAX_PAGE_SIZE = 500
+# rows per INSERT statement; SQLite is also capped by its bound-variable limit
+LEDGER_INSERT_ROWS = int(os.environ.get("PMS_LEDGER_INSERT_ROWS", "500"))
+SQLITE_MAX_VARIABLES = 32766
+
+LEDGER_SCHEMA_MYSQL = [
+    """
+    CREATE TABLE IF NOT EXISTS rebalance_ledger (
+        rebalance_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        portfolio_id INT NOT NULL,
+        created_at DATETIME NOT NULL,
+        trades INT NOT NULL,
+        buy_amount DECIMAL(16, 2) NOT NULL,
+        sell_amount DECIMAL(16, 2) NOT NULL,
+        invested_before DECIMAL(16, 2) NULL,
+        invested_after DECIMAL(16, 2) NULL,
+        reason VARCHAR(64) NULL,
+        INDEX idx_ledger_history (user_id, portfolio_id, created_at, rebalance_id,
+                                  trades, buy_amount, sell_amount,
+                                  invested_before, invested_after)
+    )
+    """,
+]
+
+LEDGER_SCHEMA_SQLITE = [
+    """
+    CREATE TABLE IF NOT EXISTS rebalance_ledger (
+        rebalance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        portfolio_id INTEGER NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        trades INTEGER NOT NULL,
+        buy_amount REAL NOT NULL,
+        sell_amount REAL NOT NULL,
+        invested_before REAL,
+        invested_after REAL,
+        reason TEXT
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_ledger_history ON rebalance_ledger
+    (user_id, portfolio_id, created_at, rebalance_id,
+     trades, buy_amount, sell_amount, invested_before, invested_after)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_txn_history ON portfolio_transactions
+    (user_id, portfolio_id, created_at)
+    """,
+]
+
+# MySQL has no CREATE INDEX IF NOT EXISTS
+TXN_INDEX_NAME = "idx_txn_history"
+TXN_INDEX_MYSQL = (
+    f"CREATE INDEX {TXN_INDEX_NAME} ON portfolio_transactions (user_id, portfolio_id, created_at)"
+)
+
+# portfolio_transactions predates the ledger: its link column is added in place
+TXN_REBALANCE_COLUMN_MYSQL = (
+    "ALTER TABLE portfolio_transactions ADD COLUMN rebalance_id BIGINT NULL, "
+    "ADD INDEX idx_txn_rebalance (rebalance_id)"
+)
+TXN_REBALANCE_COLUMN_SQLITE = [
+    "ALTER TABLE portfolio_transactions ADD COLUMN rebalance_id INTEGER",
+    "CREATE INDEX IF NOT EXISTS idx_txn_rebalance ON portfolio_transactions (rebalance_id)",
+]
+
+# checked by migrate.check_schema
+LEDGER_TABLE_COLUMNS = {
+    "rebalance_ledger": ("rebalance_id", "user_id", "portfolio_id", "created_at", "trades",
+                         "buy_amount", "sell_amount", "invested_before", "invested_after", "reason"),
+    "portfolio_transactions": ("rebalance_id",),
+}
+
+LEDGER_COLUMNS = (
+    "user_id", "portfolio_id", "created_at", "trades", "buy_amount", "sell_amount",
+    "invested_before", "invested_after", "reason",
+)
+
+TXN_COLUMNS = (
+    "portfolio_id", "user_id", "symbol", "txn_type",
+    "quantity", "price", "amount",
+    "before_quantity", "after_quantity",
+    "before_invested", "after_invested", "reason", "created_at", "rebalance_id",
+)
+
+_lock = threading.Lock()
+_stats = {"rebalances": 0, "trades": 0, "flushes": 0}
+
+
+def create_ledger_tables(conn) -> None:
+    """Ledger DDL, run by migrate.py (it commits implicitly on MySQL)."""
+    cur = conn.cursor()
+    if is_sqlite():
+        for stmt in LEDGER_SCHEMA_SQLITE:
+            cur.execute(stmt)
+        cur.execute("PRAGMA table_info(portfolio_transactions)")
+        if "rebalance_id" not in [row[1] for row in cur.fetchall()]:
+            for stmt in TXN_REBALANCE_COLUMN_SQLITE:
+                cur.execute(stmt)
+    else:
+        for stmt in LEDGER_SCHEMA_MYSQL:
+            cur.execute(stmt)
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+              AND table_name = 'portfolio_transactions'
+              AND index_name = %s
+            """,
+            (TXN_INDEX_NAME,),
+        )
+        if cur.fetchone()[0] == 0:
+            cur.execute(TXN_INDEX_MYSQL)
+        cur.execute(
+            """
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+              AND table_name = 'portfolio_transactions'
+              AND column_name = 'rebalance_id'
+            """
+        )
+        if cur.fetchone()[0] == 0:
+            cur.execute(TXN_REBALANCE_COLUMN_MYSQL)
+    cur.close()
+
+
+def _insert_many(cur, table: str, columns: Sequence[str], rows: List[tuple]) -> None:
+    per_insert = LEDGER_INSERT_ROWS
+    if is_sqlite():
+        per_insert = min(per_insert, SQLITE_MAX_VARIABLES // len(columns))
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    for i in range(0, len(rows), per_insert):
+        chunk = rows[i:i + per_insert]
+        cur.execute(
+            head + ", ".join([row_sql] * len(chunk)),
+            tuple(v for row in chunk for v in row),
+        )
+
+
+# ---------- writer ----------
+class LedgerWriter:
+    """
+    Collects rebalances for one transaction. record() only buffers; flush(cur)
+    writes everything recorded so far and does not commit.
+    """
+
+    def __init__(self):
+        self._headers: List[tuple] = []
+        # trades of each header, without their rebalance_id (known after the INSERT)
+        self._trades: List[List[tuple]] = []
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    def record(
+        self,
+        portfolio_id: int,
+        user_id: int,
+        trades: Sequence[Tuple[str, str, int, float, int, int, float, float]],
+        invested_before: Optional[float],
+        invested_after: Optional[float],
+        reason: str = REBALANCE_REASON,
+        created_at: Optional[datetime] = None,
+    ) -> None:
+        """
+        trades: (symbol, "BUY" | "SELL", quantity, price, before_quantity,
+        after_quantity, before_invested, after_invested) tuples.
+        """
+        # whole seconds, so MySQL DATETIME stores the value history cursors carry
+        created_at = (created_at or datetime.utcnow()).replace(microsecond=0)
+        buy_amount = sell_amount = 0.0
+        rows = []
+        for sym, side, qty, price, bq, aq, bi, ai in trades:
+            amount = qty * price
+            if side == "BUY":
+                buy_amount += amount
+            else:
+                sell_amount += amount
+            rows.append(
+                (portfolio_id, user_id, sym, side,
+                 qty, price, amount,
+                 bq, aq,
+                 bi, ai, reason, created_at)
+            )
+        self._trades.append(rows)
+        self._headers.append(
+            (user_id, portfolio_id, created_at, len(trades),
+             round(buy_amount, 2), round(sell_amount, 2),
+             invested_before, invested_after, reason)
+        )
+
+    def flush(self, cur) -> int:
+        """Write the buffered rebalances and trades; returns the number of rebalances."""
+        n = len(self._headers)
+        if not n:
+            return 0
+        header_sql = (
+            f"INSERT INTO rebalance_ledger ({', '.join(LEDGER_COLUMNS)}) "
+            f"VALUES ({', '.join(['%s'] * len(LEDGER_COLUMNS))})"
+        )
+        linked = []
+        for header, rows in zip(self._headers, self._trades):
+            # one row per INSERT: lastrowid of a multi-row INSERT does not
+            # identify every row (and MySQL may not allocate ids consecutively)
+            cur.execute(header_sql, header)
+            rebalance_id = cur.lastrowid
+            linked += [row + (rebalance_id,) for row in rows]
+        if linked:
+            _insert_many(cur, "portfolio_transactions", TXN_COLUMNS, linked)
+        trades = len(linked)
+        self._headers = []
+        self._trades = []
+        with _lock:
+            _stats["rebalances"] += n
+            _stats["trades"] += trades
+            _stats["flushes"] += 1
+        return n
+
+
+# ---------- history (keyset pagination) ----------
+def encode_cursor(created_at: datetime, rebalance_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(sep=" "), int(rebalance_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """ValueError for anything encode_cursor() did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, rebalance_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(rebalance_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+HISTORY_SQL = """
+    SELECT rebalance_id, created_at, trades, buy_amount, sell_amount,
+           invested_before, invested_after
+    FROM rebalance_ledger
+    WHERE user_id = %s AND portfolio_id = %s {after}
+    ORDER BY created_at DESC, rebalance_id DESC
+    LIMIT %s
+"""
+
+# created_at <= bounds the index range; the OR only filters rows at that instant
+AFTER_CURSOR_SQL = "AND created_at <= %s AND (created_at < %s OR rebalance_id < %s)"
+
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _rebalance_view(row: Dict[str, Any]) -> Dict[str, Any]:
+    buy = float(row["buy_amount"])
+    sell = float(row["sell_amount"])
+    before = float(row["invested_before"]) if row["invested_before"] is not None else None
+    return {
+        "rebalance_id": int(row["rebalance_id"]),
+        "created_at": _as_datetime(row["created_at"]).isoformat(sep=" "),
+        "trades": int(row["trades"]),
+        "buy_amount": buy,
+        "sell_amount": sell,
+        "turnover": round(buy + sell, 2),
+        # the share of the portfolio that was replaced
+        "turnover_percent": round(min(buy, sell) / before * 100, 4) if before else None,
+        "invested_before": before,
+        "invested_after": (
+            float(row["invested_after"]) if row["invested_after"] is not None else None
+        ),
+    }
+
+
+def load_trades(cur, rebalance_ids: Sequence[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Trades of the given rebalances, by rebalance_id, in the order they were written."""
+    trades: Dict[int, List[Dict[str, Any]]] = {int(r): [] for r in rebalance_ids}
+    if not trades:
+        return trades
+    cur.execute(
+        f"""
+        SELECT rebalance_id, symbol, txn_type, quantity, price, amount
+        FROM portfolio_transactions
+        WHERE rebalance_id IN ({', '.join(['%s'] * len(trades))})
+        ORDER BY txn_id
+        """,
+        tuple(trades),
+    )
+    for row in cur.fetchall():
+        trades[int(row["rebalance_id"])].append({
+            "symbol": row["symbol"],
+            "txn_type": row["txn_type"],
+            "quantity": int(row["quantity"]),
+            "price": float(row["price"]),
+            "amount": float(row["amount"]),
+        })
+    return trades
+
+
+def rebalance_history(
+    user_id: int,
+    portfolio_id: int,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    include_trades: bool = False,
+    conn=None,
+) -> Dict[str, Any]:
+    """
+    One page of a portfolio's rebalances, newest first, with turnover per
+    rebalance. Pass next_cursor back as cursor for the following page; it is
+    None on the last page. ValueError for a bad limit or cursor.
+    """
+    if not 1 <= limit <= HISTORY_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {HISTORY_MAX_PAGE_SIZE}")
+    params: List[Any] = [user_id, portfolio_id]
+    after = ""
+    if cursor:
+        created_at, rebalance_id = decode_cursor(cursor)
+        after = AFTER_CURSOR_SQL
+        params += [created_at, created_at, rebalance_id]
+    # one extra row tells whether there is a next page
+    params.append(limit + 1)
+
+    with db_session(conn) as conn:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(HISTORY_SQL.format(after=after), tuple(params))
+        rows = cur.fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        trades = None
+        if include_trades and rows:
+            trades = load_trades(cur, [row["rebalance_id"] for row in rows])
+        cur.close()
+
+    rebalances = []
+    for row in rows:
+        view = _rebalance_view(row)
+        if trades is not None:
+            view["transactions"] = trades.get(view["rebalance_id"], [])
+        rebalances.append(view)
+
+    last = rows[-1] if rows else None
+    return {
+        "user_id": user_id,
+        "portfolio_id": portfolio_id,
+        "rebalances": rebalances,
+        "next_cursor": (
+            encode_cursor(_as_datetime(last["created_at"]), last["rebalance_id"]) if more else None
+        ),
+    }
+
+
+# ---------- backfill ----------
+BACKFILL_SQL = """
+    INSERT INTO rebalance_ledger
+    (user_id, portfolio_id, created_at, trades, buy_amount, sell_amount,
+     invested_before, invested_after, reason)
+    SELECT t.user_id, t.portfolio_id, t.created_at, COUNT(*),
+           COALESCE(SUM(CASE WHEN t.txn_type = 'BUY' THEN t.amount END), 0),
+           COALESCE(SUM(CASE WHEN t.txn_type = 'SELL' THEN t.amount END), 0),
+           NULL, NULL, MAX(t.reason)
+    FROM portfolio_transactions t
+    WHERE t.user_id IS NOT NULL AND t.portfolio_id IS NOT NULL
+      AND NOT EXISTS (
+        SELECT 1 FROM rebalance_ledger l
+        WHERE l.user_id = t.user_id AND l.portfolio_id = t.portfolio_id
+          AND l.created_at = t.created_at
+      )
+    GROUP BY t.user_id, t.portfolio_id, t.created_at
+    ORDER BY t.created_at
+"""
+
+# MIN: rebalances of one portfolio in the same second (never two on the
+# request path, 30-day rule) cannot be told apart after the fact
+BACKFILL_LINK_SQL = """
+    UPDATE portfolio_transactions
+    SET rebalance_id = (
+        SELECT MIN(l.rebalance_id) FROM rebalance_ledger l
+        WHERE l.user_id = portfolio_transactions.user_id
+          AND l.portfolio_id = portfolio_transactions.portfolio_id
+          AND l.created_at = portfolio_transactions.created_at
+    )
+    WHERE rebalance_id IS NULL
+      AND user_id IS NOT NULL AND portfolio_id IS NOT NULL
+"""
+
+
+def backfill_ledger(conn=None) -> Dict[str, Any]:
+    """
+    Ledger rows for transactions written before the ledger existed, one per
+    (user, portfolio, created_at), and rebalance_id on every transaction
+    that lacks it. Invested amounts were not recorded then, so those rows
+    have no turnover_percent. Safe to run again.
+    """
+    started = time.perf_counter()
+    with db_session(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(BACKFILL_SQL)
+            rebalances = max(cur.rowcount, 0)
+            cur.execute(BACKFILL_LINK_SQL)
+            linked = max(cur.rowcount, 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+    return {
+        "rebalances": rebalances,
+        "linked_trades": linked,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def ledger_samples():
+    with _lock:
+        s = dict(_stats)
+    yield ("pms_ledger_rebalances_total", "counter",
+           "Rebalances written to the ledger.", {}, s["rebalances"])
+    yield ("pms_ledger_trades_total", "counter",
+           "Trades written to portfolio_transactions.", {}, s["trades"])
+    yield ("pms_ledger_flushes_total", "counter",
+           "Ledger flushes (multi-row INSERT batches).", {}, s["flushes"])
+
+
+metrics.register_collector(ledger_samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the rebalance ledger.")
+    parser.add_argument("--backfill", action="store_true",
+                        help="add ledger rows for portfolio_transactions written before it existed "
+                             "and link transactions to them")
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.print_help()
+        return
+    stats = backfill_ledger()
+    print(f"rebalances={stats['rebalances']} linked_trades={stats['linked_trades']} "
+          f"time={stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 <?php
 session_start();
 require_once './db_connect.php';
+require_once './summaries.php';
 
 // Ensure user is logged in
 if (!isset($_SESSION['user_id'])) {
@@ -11,37 +12,12 @@ if (!isset($_SESSION['user_id'])) {
 $user_id  = $_SESSION['user_id'];
 $username = $_SESSION['username'];
 
-// 1. Total portfolios for this user (distinct portfolios via user_portfolios)
-$sqlPortfolios = "
-    SELECT COUNT(*) AS total_portfolios
-    FROM user_portfolios
-    WHERE user_id = ?
-";
-$stmt = $conn->prepare($sqlPortfolios);
-$stmt->bind_param("i", $user_id);
-$stmt->execute();
-$result = $stmt->get_result()->fetch_assoc();
-$total_portfolios = $result['total_portfolios'] ?? 0;
-$stmt->close();
+// 1-3. Portfolio count, total invested and current value from user_summaries,
+//      or the live aggregate while the row is missing (see summaries.php)
+$sumRow = fetchUserSummary($conn, $user_id);
 
-// 2 & 3. Total invested and current value across all holdings
-//    join user_portfolios -> portfolios -> portfolio_holdings
-$sqlSummary = "
-    SELECT
-        COALESCE(SUM(ph.invested_amount), 0) AS total_investment,
-        COALESCE(SUM(ph.current_value), 0)    AS total_current
-    FROM user_portfolios up
-    JOIN portfolios p       ON up.portfolio_id = p.portfolio_id
-    JOIN portfolio_holdings ph ON p.portfolio_id = ph.portfolio_id
-    WHERE up.user_id = ?
-";
-$stmt = $conn->prepare($sqlSummary);
-$stmt->bind_param("i", $user_id);
-$stmt->execute();
-$sumRow = $stmt->get_result()->fetch_assoc();
-$stmt->close();
-
-$total_investment = (float)($sumRow['total_investment'] ?? 0);
+$total_portfolios = (int)($sumRow['portfolio_count'] ?? 0);
+$total_investment = (float)($sumRow['total_invested'] ?? 0);
 $total_current    = (float)($sumRow['total_current'] ?? 0);
 
 // Net P/L and returns
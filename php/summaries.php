@@ -0,0 +1,146 @@
+<?php
+// Dashboard totals from the summary tables (see APIs/portfolio_summary.py).
+//
+// The rows are computed by the Python side only. A PHP write deletes the rows
+// it makes stale, inside its own transaction, and after the commit asks the
+// rebalance API to rebuild them (POST /refresh_summaries). Until they are
+// back, and while the tables do not exist yet (before `python migrate.py`),
+// the reads below use the live aggregate over portfolio_holdings instead.
+
+$summaryApiUrl = "http://127.0.0.1:8001/refresh_summaries";
+
+const ER_NO_SUCH_TABLE = 1146;
+
+// Runs a prepared query; null if it touches a table that does not exist yet.
+function querySummaries($conn, $sql, $types, ...$params) {
+    try {
+        $stmt = $conn->prepare($sql);
+    } catch (mysqli_sql_exception $e) {
+        if ($e->getCode() !== ER_NO_SUCH_TABLE) {
+            throw $e;
+        }
+        return null;
+    }
+    if ($stmt === false) {
+        if ($conn->errno !== ER_NO_SUCH_TABLE) {
+            die("Query failed: " . $conn->error);
+        }
+        return null;
+    }
+    if ($types !== '') {
+        $stmt->bind_param($types, ...$params);
+    }
+    $stmt->execute();
+    $result = $stmt->get_result();
+    $stmt->close();
+    return $result;
+}
+
+// ['portfolio_count', 'total_invested', 'total_current'] for one user
+function fetchUserSummary($conn, $user_id) {
+    $result = querySummaries($conn, "
+        SELECT portfolio_count, total_invested, total_current
+        FROM user_summaries
+        WHERE user_id = ?
+    ", "i", $user_id);
+    $row = $result ? $result->fetch_assoc() : null;
+    if ($row) {
+        return $row;
+    }
+
+    // live aggregate, as dashboard.php computed it before user_summaries
+    $result = querySummaries($conn, "
+        SELECT COUNT(DISTINCT up.portfolio_id)      AS portfolio_count,
+               COALESCE(SUM(ph.invested_amount), 0) AS total_invested,
+               COALESCE(SUM(ph.current_value), 0)   AS total_current
+        FROM user_portfolios up
+        LEFT JOIN portfolio_holdings ph ON ph.portfolio_id = up.portfolio_id
+        WHERE up.user_id = ?
+    ", "i", $user_id);
+    return $result->fetch_assoc();
+}
+
+// One row per portfolio of the user, with totals and P/L, sorted.
+// $sort / $order must already be whitelisted by the caller.
+function fetchUserPortfolios($conn, $user_id, $sort, $order) {
+    $result = querySummaries($conn, userPortfoliosSql(true, $sort, $order), "i", $user_id);
+    if ($result === null) {
+        // no portfolio_summaries yet: every row from the holdings
+        $result = querySummaries($conn, userPortfoliosSql(false, $sort, $order), "i", $user_id);
+    }
+    return $result;
+}
+
+function userPortfoliosSql($withSummaries, $sort, $order) {
+    $invested = "(SELECT COALESCE(SUM(ph.invested_amount), 0)
+                  FROM portfolio_holdings ph WHERE ph.portfolio_id = p.portfolio_id)";
+    $current  = "(SELECT COALESCE(SUM(ph.current_value), 0)
+                  FROM portfolio_holdings ph WHERE ph.portfolio_id = p.portfolio_id)";
+    $join = "";
+    if ($withSummaries) {
+        // COALESCE stops at the first non-NULL argument, so the holdings are
+        // only summed for a portfolio without a summary row
+        $invested = "COALESCE(ps.total_invested, $invested)";
+        $current  = "COALESCE(ps.total_current, $current)";
+        $join = "LEFT JOIN portfolio_summaries ps ON ps.portfolio_id = p.portfolio_id";
+    }
+
+    return "
+        SELECT t.*,
+               t.total_current - t.total_invested AS pl_amount,
+               CASE
+                   WHEN t.total_invested > 0
+                   THEN (t.total_current - t.total_invested) / t.total_invested * 100
+                   ELSE 0
+               END AS pl_percent
+        FROM (
+            SELECT
+                p.portfolio_id,
+                p.portfolio_name,
+                p.description,
+                $invested AS total_invested,
+                $current  AS total_current
+            FROM user_portfolios up
+            JOIN portfolios p
+                ON up.portfolio_id = p.portfolio_id
+            $join
+            WHERE up.user_id = ?
+        ) t
+        ORDER BY `$sort` $order
+    ";
+}
+
+// Drop the rows a write made stale; call inside the write's transaction.
+function invalidateSummaries($conn, $portfolio_ids, $user_ids) {
+    foreach ($portfolio_ids as $pid) {
+        querySummaries($conn, "DELETE FROM portfolio_summaries WHERE portfolio_id = ?", "i", $pid);
+        // everyone subscribed to it
+        querySummaries($conn, "
+            DELETE FROM user_summaries
+            WHERE user_id IN (SELECT user_id FROM user_portfolios WHERE portfolio_id = ?)
+        ", "i", $pid);
+    }
+    foreach ($user_ids as $uid) {
+        querySummaries($conn, "DELETE FROM user_summaries WHERE user_id = ?", "i", $uid);
+    }
+}
+
+// Ask the rebalance API to rebuild the rows; call after the commit. Failure
+// is fine: the rows stay missing and the reads use the live aggregate.
+function requestSummaryRefresh($portfolio_ids, $user_ids) {
+    global $summaryApiUrl;
+    $opts = [
+        "http" => [
+            "method"        => "POST",
+            "header"        => "Content-Type: application/json\r\n",
+            "content"       => json_encode([
+                "portfolio_ids" => array_values($portfolio_ids),
+                "user_ids"      => array_values($user_ids)
+            ]),
+            "timeout"       => 5,
+            "ignore_errors" => true
+        ]
+    ];
+    @file_get_contents($summaryApiUrl, false, stream_context_create($opts));
+}
+?>
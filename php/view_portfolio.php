@@ -1,6 +1,7 @@
 <?php
 session_start();
 require_once 'db_connect.php';
+require_once 'summaries.php';
 
 if (!isset($_SESSION['user_id'])) {
     header("Location: login.html");
@@ -25,31 +26,44 @@ if ($_SERVER['REQUEST_METHOD'] === 'POST'
         $stmt->close();
 
         if ($hasAccess) {
-            // delete holdings
-            $stmt = $conn->prepare("DELETE FROM portfolio_holdings WHERE portfolio_id = ?");
-            $stmt->bind_param("i", $portfolio_id);
-            $stmt->execute();
-            $stmt->close();
-
-            // delete user-portfolio link for this user
-            $stmt = $conn->prepare("DELETE FROM user_portfolios WHERE user_id = ? AND portfolio_id = ?");
-            $stmt->bind_param("ii", $user_id, $portfolio_id);
-            $stmt->execute();
-            $stmt->close();
-
-            // if no other users subscribed, delete portfolio
-            $stmt = $conn->prepare("SELECT COUNT(*) AS cnt FROM user_portfolios WHERE portfolio_id = ?");
-            $stmt->bind_param("i", $portfolio_id);
-            $stmt->execute();
-            $cntRow = $stmt->get_result()->fetch_assoc();
-            $stmt->close();
-
-            if (($cntRow['cnt'] ?? 0) == 0) {
-                $stmt = $conn->prepare("DELETE FROM portfolios WHERE portfolio_id = ?");
+            $conn->begin_transaction();
+            try {
+                // delete holdings
+                $stmt = $conn->prepare("DELETE FROM portfolio_holdings WHERE portfolio_id = ?");
                 $stmt->bind_param("i", $portfolio_id);
                 $stmt->execute();
                 $stmt->close();
+
+                // delete user-portfolio link for this user
+                $stmt = $conn->prepare("DELETE FROM user_portfolios WHERE user_id = ? AND portfolio_id = ?");
+                $stmt->bind_param("ii", $user_id, $portfolio_id);
+                $stmt->execute();
+                $stmt->close();
+
+                // if no other users subscribed, delete portfolio
+                $stmt = $conn->prepare("SELECT COUNT(*) AS cnt FROM user_portfolios WHERE portfolio_id = ?");
+                $stmt->bind_param("i", $portfolio_id);
+                $stmt->execute();
+                $cntRow = $stmt->get_result()->fetch_assoc();
+                $stmt->close();
+
+                if (($cntRow['cnt'] ?? 0) == 0) {
+                    $stmt = $conn->prepare("DELETE FROM portfolios WHERE portfolio_id = ?");
+                    $stmt->bind_param("i", $portfolio_id);
+                    $stmt->execute();
+                    $stmt->close();
+                }
+
+                // the summary rows of the portfolio and of everyone it touched
+                // (see summaries.php); rebuilt by the API after the commit
+                invalidateSummaries($conn, [$portfolio_id], [$user_id]);
+
+                $conn->commit();
+            } catch (Throwable $e) {
+                $conn->rollback();
+                throw $e;
             }
+            requestSummaryRefresh([$portfolio_id], [$user_id]);
         }
     }
 
@@ -69,33 +83,9 @@ if (isset($_GET['order']) && in_array(strtolower($_GET['order']), ['asc', 'desc'
     $order = strtolower($_GET['order']);
 }
 
-$sql = "
-    SELECT
-        p.portfolio_id,
-        p.portfolio_name,
-        p.description,
-        COALESCE(SUM(ph.invested_amount), 0) AS total_invested,
-        COALESCE(SUM(ph.current_value), 0)    AS total_current,
-        COALESCE(SUM(ph.current_value) - SUM(ph.invested_amount), 0) AS pl_amount,
-        CASE
-            WHEN SUM(ph.invested_amount) > 0
-            THEN (SUM(ph.current_value) - SUM(ph.invested_amount)) / SUM(ph.invested_amount) * 100
-            ELSE 0
-        END AS pl_percent
-    FROM user_portfolios up
-    JOIN portfolios p
-        ON up.portfolio_id = p.portfolio_id
-    LEFT JOIN portfolio_holdings ph
-        ON p.portfolio_id = ph.portfolio_id
-    WHERE up.user_id = ?
-    GROUP BY p.portfolio_id, p.portfolio_name, p.description
-    ORDER BY `$sort` $order
-";
-
-$stmt = $conn->prepare($sql);
-$stmt->bind_param("i", $user_id);
-$stmt->execute();
-$result = $stmt->get_result();
+// totals from portfolio_summaries, or the live aggregate for a portfolio
+// without a row (see summaries.php)
+$result = fetchUserPortfolios($conn, $user_id, $sort, $order);
 
 function sortArrowsPortfolio($column, $currentSort, $currentOrder) {
     $baseUrl   = strtok($_SERVER['REQUEST_URI'], '?');
@@ -239,6 +229,6 @@ function confirmLogout() {
 </html>
 
 <?php
-$stmt->close();
+$result->free();
 $conn->close();
 ?>
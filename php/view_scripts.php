@@ -1,6 +1,5 @@
 <?php
 session_start();
-require_once './db_connect.php';
 
 if (!isset($_SESSION['user_id'])) {
     header("Location: login.html");
@@ -13,51 +12,62 @@ if (empty($selectedIndex)) {
     die("No index specified.");
 }
 
-$stmt = $conn->prepare("SELECT url FROM indices WHERE symbol = ?");
-$stmt->bind_param("s", $selectedIndex);
-$stmt->execute();
-$stmt->bind_result($csvUrl);
-if (!$stmt->fetch()) {
-    die("Invalid or unknown index selected.");
-}
-$stmt->close();
+// ---------- Constituents + latest close (Python API, ETag-revalidated) ----------
+// The API caches the index CSV and the bhavcopy prices per index; the last
+// body is kept in the session so an unchanged index comes back as an empty 304.
+$apiUrl = "http://127.0.0.1:8002/index_constituents?" . http_build_query(['symbol' => $selectedIndex]);
+$cached = $_SESSION['scripts_cache'][$selectedIndex] ?? null;
 
-$csvContent = @file_get_contents($csvUrl);
-if ($csvContent === false) {
-    die("Failed to fetch the CSV from URL: " . htmlspecialchars($csvUrl));
+$headers = "Accept: application/json\r\n";
+if ($cached) {
+    $headers .= "If-None-Match: " . $cached['etag'] . "\r\n";
 }
-
-// Parse CSV
-$rows = array_map('str_getcsv', explode("\n", $csvContent));
-$header = array_map('trim', array_shift($rows));
-
-// Find header keys (case-insensitive)
-function getHeaderKey(array $header, string $searchKey) {
-    foreach ($header as $key) {
-        if (strcasecmp($key, $searchKey) == 0) {
-            return $key;
-        }
+$opts = [
+    "http" => [
+        "method"        => "GET",
+        "header"        => $headers,
+        "timeout"       => 60,
+        "ignore_errors" => true
+    ]
+];
+$response = @file_get_contents($apiUrl, false, stream_context_create($opts));
+
+$statusCode = 0;
+$etag = null;
+foreach ($http_response_header ?? [] as $line) {
+    if (preg_match('#^HTTP/\S+\s+(\d{3})#', $line, $m)) {
+        $statusCode = (int)$m[1];
+    } elseif (stripos($line, 'ETag:') === 0) {
+        $etag = trim(substr($line, 5));
     }
-    return null;
 }
 
-$companyKey = getHeaderKey($header, 'Company Name');
-$symbolKey = getHeaderKey($header, 'Symbol');
-
-if (is_null($companyKey) || is_null($symbolKey)) {
-    die("Error: CSV headers do not contain required 'Company Name' or 'Symbol' fields.");
+if ($statusCode === 304 && $cached) {
+    $data = $cached['data'];
+} else {
+    if ($response === false) {
+        die("Error calling Python API.");
+    }
+    $data = json_decode($response, true);
+    if ($statusCode !== 200 || !$data || !isset($data['stocks'])) {
+        $err = $data['detail'] ?? 'Unknown error from API';
+        die(htmlspecialchars($err));
+    }
+    if ($etag) {
+        $_SESSION['scripts_cache'][$selectedIndex] = ['etag' => $etag, 'data' => $data];
+    }
 }
 
 $niftyStocks = [];
-foreach ($rows as $row) {
-    if (count($row) !== count($header)) continue;
-    $entry = array_combine($header, $row);
-    if (empty($entry[$companyKey]) || empty($entry[$symbolKey])) continue;
-    
+$dbPrices = [];
+foreach ($data['stocks'] as $stock) {
     $niftyStocks[] = [
-        'Company Name' => $entry[$companyKey],
-        'Symbol' => $entry[$symbolKey],
+        'Company Name' => $stock['company_name'],
+        'Symbol' => $stock['symbol'],
     ];
+    if ($stock['close_price'] !== null) {
+        $dbPrices[$stock['symbol']] = $stock['close_price'];
+    }
 }
 
 if (empty($niftyStocks)) {
@@ -66,23 +76,6 @@ if (empty($niftyStocks)) {
 
 $totalStocks = count($niftyStocks);
 $suggestedStocks = max(1, (int)ceil($totalStocks * 0.40)); // 20% of total stocks
-
-$symbols = array_column($niftyStocks, 'Symbol');
-
-// Fetch prices from database
-$inList = implode(',', array_fill(0, count($symbols), '?'));
-$sql = "SELECT SYMBOL, CLOSE_PRICE FROM bhavcopy_data WHERE SYMBOL IN ($inList)";
-$stmt = $conn->prepare($sql);
-$stmt->bind_param(str_repeat('s', count($symbols)), ...$symbols);
-$stmt->execute();
-$result = $stmt->get_result();
-
-$dbPrices = [];
-while ($row = $result->fetch_assoc()) {
-    $dbPrices[$row['SYMBOL']] = $row['CLOSE_PRICE'];
-}
-$stmt->close();
-$conn->close();
 ?>
 <!DOCTYPE html>
 <html lang="en">
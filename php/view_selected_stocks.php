@@ -1,6 +1,7 @@
 <?php
 session_start();
 require_once './db_connect.php';
+require_once './summaries.php';
 
 if (!isset($_SESSION['user_id'])) {
     header("Location: login.html");
@@ -66,52 +67,137 @@ function sortArrowsPortfolio($column, $currentSort, $currentOrder) {
         '</span>';
 }
 
-// ---------- Call FastAPI (cached in session) ----------
-$apiUrl = "http://127.0.0.1:8000/scrape_index_csv";
+// ---------- Portfolio from the FastAPI job API (cached in session) ----------
+// The API builds the portfolio on a worker thread: we submit a job, and while
+// it runs this page answers at once with a short "generating" page that
+// reloads itself, instead of holding a PHP worker for the whole scrape.
+$apiBase = "http://127.0.0.1:8000";
+$pfKey   = $indexSymbol . '|' . $numStocks . '|' . $investmentAmount;
 
-if ($method === 'POST' && (!isset($_POST['action']) || $_POST['action'] !== 'save_portfolio') ||
-    !isset($_SESSION['last_pf']) ||
-    $_SESSION['last_pf_index'] !== $indexSymbol ||
-    $_SESSION['last_pf_amount'] != $investmentAmount ||
-    $_SESSION['last_pf_n'] != $numStocks) {
+function callPortfolioApi($method, $url, $payload = null) {
+    $opts = [
+        "http" => [
+            "method"  => $method,
+            // columnar layout: each column once instead of every key on every row
+            "header"  => "Content-Type: application/json\r\n" .
+                         "Accept: application/vnd.pms.columnar+json\r\n",
+            "timeout" => 15,
+            // keep the JSON body of 4xx/5xx replies
+            "ignore_errors" => true
+        ]
+    ];
+    if ($payload !== null) {
+        $opts["http"]["content"] = json_encode($payload);
+    }
+    $response = @file_get_contents($url, false, stream_context_create($opts));
+    if ($response === false) {
+        die("Error calling Python API.");
+    }
+    return json_decode($response, true);
+}
 
-    $payload = json_encode([
+// Rows from the API's columnar layout (see APIs/response_formats.py)
+function columnarToRows($block) {
+    $n = (int)($block['length'] ?? 0);
+    $columns = $block['columns'] ?? [];
+    foreach (($block['constants'] ?? []) as $name => $value) {
+        $columns[$name] = array_fill(0, $n, $value);
+    }
+    $rows = [];
+    for ($i = 0; $i < $n; $i++) {
+        $row = [];
+        foreach ($columns as $name => $values) {
+            $row[$name] = $values[$i];
+        }
+        $rows[] = $row;
+    }
+    return $rows;
+}
+
+function submitPortfolioJob($apiBase, $pfKey, $indexSymbol, $numStocks, $investmentAmount) {
+    $job = callPortfolioApi("POST", "$apiBase/scrape_index_csv/jobs", [
         "index_symbol"  => $indexSymbol,
         "no_of_stocks"  => $numStocks,
         "total_capital" => $investmentAmount
     ]);
+    if (!$job || empty($job['job_id'])) {
+        $err = $job['detail'] ?? 'Unknown error from API';
+        die("Portfolio generation failed: " . htmlspecialchars(is_string($err) ? $err : json_encode($err)));
+    }
+    $_SESSION['pf_job_id']  = $job['job_id'];
+    $_SESSION['pf_job_key'] = $pfKey;
+    return $job;
+}
 
-    $opts = [
-        "http" => [
-            "method"  => "POST",
-            "header"  => "Content-Type: application/json\r\n",
-            "content" => $payload,
-            "timeout" => 180
-        ]
-    ];
+$regenerate = $method === 'POST' && (!isset($_POST['action']) || $_POST['action'] !== 'save_portfolio');
+
+if ($regenerate || !isset($_SESSION['last_pf']) || ($_SESSION['last_pf_key'] ?? null) !== $pfKey) {
+    if ($regenerate || ($_SESSION['pf_job_key'] ?? null) !== $pfKey) {
+        // identical requests (from anyone) share one job on the API side
+        $job = submitPortfolioJob($apiBase, $pfKey, $indexSymbol, $numStocks, $investmentAmount);
+    } else {
+        $job = callPortfolioApi("GET", "$apiBase/jobs/" . rawurlencode($_SESSION['pf_job_id']));
+        if (!$job || empty($job['state'])) {
+            // unknown job (API restarted or result evicted): start over
+            $job = submitPortfolioJob($apiBase, $pfKey, $indexSymbol, $numStocks, $investmentAmount);
+        }
+    }
 
-    $context  = stream_context_create($opts);
-    $response = @file_get_contents($apiUrl, false, $context);
+    if ($job['state'] === 'failed') {
+        unset($_SESSION['pf_job_id'], $_SESSION['pf_job_key']);
+        die("Portfolio generation failed: " . htmlspecialchars($job['detail'] ?? 'Unknown error from API'));
+    }
 
-    if ($response === false) {
-        die("Error calling Python API.");
+    if ($job['state'] !== 'done') {
+        $pollUrl  = strtok($_SERVER['REQUEST_URI'], '?') . '?' . http_build_query([
+            'symbol'        => $indexSymbol,
+            'num_stocks'    => $numStocks,
+            'total_capital' => $investmentAmount,
+            'sort'          => $sort,
+            'order'         => $order
+        ]);
+        $progress = (int)round(100 * ($job['progress'] ?? 0));
+        ?>
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8" />
+    <meta http-equiv="refresh" content="2;url=<?= htmlspecialchars($pollUrl) ?>" />
+    <title>Generating Portfolio - <?= htmlspecialchars($indexSymbol) ?></title>
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet" />
+</head>
+<body>
+<main class="container my-5 text-center">
+    <h3>Generating portfolio for <?= htmlspecialchars($indexSymbol) ?>&hellip;</h3>
+    <p class="text-muted">Fetching the latest index prices. This page refreshes by itself.</p>
+    <div class="progress mx-auto" style="max-width: 480px;">
+        <div class="progress-bar progress-bar-striped progress-bar-animated" role="progressbar"
+             style="width: <?= max($progress, 5) ?>%;"><?= htmlspecialchars($job['stage'] ?? '') ?></div>
+    </div>
+</main>
+</body>
+</html>
+        <?php
+        exit();
     }
 
-    $data = json_decode($response, true);
+    $data = $job['result'];
     if (!$data || empty($data['success'])) {
-        $err = $data['detail'] ?? 'Unknown error from API';
-        die("Portfolio generation failed: " . htmlspecialchars($err));
+        die("Portfolio generation failed: Unknown error from API");
     }
 
-    $_SESSION['last_pf']        = $data;
-    $_SESSION['last_pf_index']  = $indexSymbol;
-    $_SESSION['last_pf_amount'] = $investmentAmount;
-    $_SESSION['last_pf_n']      = $numStocks;
+    $_SESSION['last_pf']     = $data;
+    $_SESSION['last_pf_key'] = $pfKey;
+    unset($_SESSION['pf_job_id'], $_SESSION['pf_job_key']);
 } else {
     $data = $_SESSION['last_pf'];
 }
 
-$portfolio      = $data['portfolio']       ?? [];
+// the session keeps the compact columnar form; rows are rebuilt per request
+$portfolio      = isset($data['portfolio']['columns'])
+    ? columnarToRows($data['portfolio'])
+    : ($data['portfolio'] ?? []);
 $totalInvested  = $data['total_invested']  ?? 0;
 $freeCash       = $data['free_cash']       ?? 0;
 $noOfStocksUsed = $data['no_of_stocks']    ?? $numStocks;
@@ -132,6 +218,8 @@ if (isset($_POST['action']) && $_POST['action'] === 'save_portfolio') {
     $portfolio_name = $indexSymbol . " - " . date('Y-m-d H:i:s');
     $desc = "Auto-generated portfolio for index " . $indexSymbol;
 
+    $conn->begin_transaction();
+
     // 1. portfolios
     $stmt = $conn->prepare("INSERT INTO portfolios (portfolio_name, description, created_by) VALUES (?, ?, ?)");
     $stmt->bind_param("ssi", $portfolio_name, $desc, $user_id);
@@ -183,7 +271,14 @@ if (isset($_POST['action']) && $_POST['action'] === 'save_portfolio') {
         $stmt->execute();
     }
     $stmt->close();
+
+    // 4. the user's summary row is stale now (see summaries.php); the API
+    //    builds the new portfolio's row and the user's after the commit
+    invalidateSummaries($conn, [], [$user_id]);
+
+    $conn->commit();
     $conn->close();
+    requestSummaryRefresh([$new_portfolio_id], []);
 
     header("Location: dashboard.php");
     exit();